@@ -7,13 +7,26 @@ import time
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
 from datetime import timedelta
+from http import HTTPStatus
+from math import ceil
 from pathlib import Path
+from typing import Any
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from loguru import logger
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 
+from python_web_service_boilerplate.common.circuit_breaker import CircuitBreakerOpenError, CircuitBreakerState
 from python_web_service_boilerplate.common.common_function import get_module_name
-from python_web_service_boilerplate.common.middleware import TraceIDMiddleware
+from python_web_service_boilerplate.common.deadline import get_deadline_exceeded_counts
+from python_web_service_boilerplate.common.middleware import (
+    DeadlineMiddleware,
+    MetricsMiddleware,
+    RequestProfilerMiddleware,
+    TraceIDMiddleware,
+    UnitOfWorkMiddleware,
+)
 from python_web_service_boilerplate.common.router_loader import include_routers
 from python_web_service_boilerplate.configuration.application import (
     configure as configure_application,
@@ -31,15 +44,52 @@ from python_web_service_boilerplate.configuration.database import (
 from python_web_service_boilerplate.configuration.database import (
     configure as configure_database,
 )
+from python_web_service_boilerplate.configuration.database import db_circuit_breaker, get_pool_statistics
+from python_web_service_boilerplate.configuration.leak_detector import (
+    cleanup as leak_detector_cleanup,
+)
+from python_web_service_boilerplate.configuration.leak_detector import (
+    configure as configure_leak_detector,
+)
 from python_web_service_boilerplate.configuration.loguru import (
     configure as configure_loguru,
 )
+from python_web_service_boilerplate.configuration.loguru import get_log_sink_statistics, get_tail_buffer_statistics
+from python_web_service_boilerplate.configuration.loop_monitor import (
+    cleanup as loop_monitor_cleanup,
+)
+from python_web_service_boilerplate.configuration.loop_monitor import (
+    configure as configure_loop_monitor,
+)
+from python_web_service_boilerplate.configuration.metrics import (
+    cleanup as metrics_cleanup,
+)
+from python_web_service_boilerplate.configuration.metrics import (
+    configure as configure_metrics,
+)
+from python_web_service_boilerplate.configuration.metrics import render_metrics
+from python_web_service_boilerplate.configuration.resources import (
+    configure as configure_resources,
+)
+from python_web_service_boilerplate.configuration.stack_sampler import (
+    cleanup as stack_sampler_cleanup,
+)
+from python_web_service_boilerplate.configuration.stack_sampler import (
+    configure as configure_stack_sampler,
+)
 from python_web_service_boilerplate.configuration.thread_pool import (
     cleanup as thread_pool_cleanup,
 )
 from python_web_service_boilerplate.configuration.thread_pool import (
     configure as configure_thread_pool,
 )
+from python_web_service_boilerplate.configuration.tracing import (
+    cleanup as tracing_cleanup,
+)
+from python_web_service_boilerplate.configuration.tracing import (
+    configure as configure_tracing,
+)
+from python_web_service_boilerplate.configuration.tracing import get_span_statistics
 from python_web_service_boilerplate.core.auth.decorators import require_scopes
 from python_web_service_boilerplate.core.auth.middleware import AuthMiddleware
 from python_web_service_boilerplate.core.startup_log.models import StartupLog
@@ -64,9 +114,15 @@ async def startup(app: FastAPI) -> None:
     # Configuration
     configure_application()
     configure_loguru()
+    configure_tracing()
+    configure_metrics()
+    configure_loop_monitor()
     await configure_database()
     configure_thread_pool()
     configure_apscheduler()
+    configure_resources()
+    configure_leak_detector()
+    configure_stack_sampler()
 
     # Scanning routers
     include_routers(app, get_module_name())
@@ -86,11 +142,16 @@ async def shutdown() -> None:
     logger.warning(f"Stopping {get_module_name()}, releasing system resources")
 
     await retain_startup_log()
+    stack_sampler_cleanup()
+    leak_detector_cleanup()
+    loop_monitor_cleanup()
+    metrics_cleanup()
     thread_pool_cleanup()
     apscheduler_cleanup()
     # Update shutdown time in startup log if we have an ID
     await update_shutdown_time(__startup_log)
     await database_cleanup()
+    tracing_cleanup()
     end_elapsed = time.perf_counter() - __start_time
     logger.info(f"Stopped {get_module_name()}, running for {timedelta(seconds=end_elapsed)} in total")
 
@@ -106,9 +167,37 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
 
 
 app = FastAPI(lifespan=lifespan)
+# Share one database session across all repository calls of a request, the innermost middleware
+app.add_middleware(UnitOfWorkMiddleware)
+# Cancel handlers exceeding their deadline, the request-scoped session is rolled back by the inner middleware
+app.add_middleware(DeadlineMiddleware)
+# Profile the requests of admins sending `X-Profile: 1`, after authentication
+app.add_middleware(RequestProfilerMiddleware)
 # Add trace ID middleware to automatically handle request tracing
 app.add_middleware(AuthMiddleware)
 app.add_middleware(TraceIDMiddleware)
+# Record the per-route request metrics, the outermost middleware
+app.add_middleware(MetricsMiddleware)
+
+
+@app.exception_handler(CircuitBreakerOpenError)
+async def circuit_breaker_open_handler(_request: Request, exc: CircuitBreakerOpenError) -> JSONResponse:
+    return JSONResponse(
+        status_code=HTTPStatus.SERVICE_UNAVAILABLE.value,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(ceil(exc.retry_after))},
+    )
+
+
+@app.exception_handler(PoolTimeoutError)
+async def pool_timeout_handler(_request: Request, exc: PoolTimeoutError) -> JSONResponse:
+    # The connection pool (bulkhead) of the request is exhausted, the other pools are not affected
+    logger.warning(f"Connection pool exhausted: {exc!s}")
+    return JSONResponse(
+        status_code=HTTPStatus.SERVICE_UNAVAILABLE.value,
+        content={"detail": "Database connection pool exhausted"},
+        headers={"Retry-After": "1"},
+    )
 
 
 @app.get("/hello")
@@ -118,8 +207,22 @@ async def root() -> dict[str, str]:
 
 
 @app.get("/health")
-async def health() -> dict[str, str]:
-    return {"status": "UP"}
+async def health() -> dict[str, Any]:
+    database = db_circuit_breaker.snapshot()
+    status = "DOWN" if database["state"] == CircuitBreakerState.OPEN.value else "UP"
+    return {
+        "status": status,
+        "database": {"circuit_breaker": database, "pools": get_pool_statistics()},
+        "deadline_exceeded": get_deadline_exceeded_counts(),
+        "logging": {"sink": get_log_sink_statistics(), "tail_buffer": get_tail_buffer_statistics()},
+        "tracing": get_span_statistics(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics() -> PlainTextResponse:
+    """The request metrics and the counters of `/health`, in the Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 if __name__ == "__main__":
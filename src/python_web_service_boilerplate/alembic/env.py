@@ -66,6 +66,10 @@ def run_migrations_offline() -> None:
         context.run_migrations()
 
 
+# Revision scripts touching large tables should use the online migration helpers (batched backfills,
+# `CREATE INDEX CONCURRENTLY`, `lock_timeout` guards) of `python_web_service_boilerplate.common.migration`
+
+
 def do_run_migrations(connection: Connection) -> None:
     context.configure(connection=connection, target_metadata=target_metadata)
 
@@ -0,0 +1,50 @@
+"""
+Audit column server defaults.
+
+Bulk inserts leave `created_at`, `updated_at` and `deleted` to the database, so the columns need server-side defaults.
+
+Revision ID: 5b1f0c2e9a47
+Revises: 3057e681742b
+Create Date: 2026-10-18 10:02:11.482913
+
+"""
+from __future__ import annotations
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5b1f0c2e9a47"
+down_revision: str | Sequence[str] | None = "3057e681742b"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+_TABLES = ("user", "startup_log")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # ! WARNING: The SQL needs to be compatible with all supported databases: PostgreSQL and SQLite.
+    # `batch_alter_table()` recreates the table on SQLite, which cannot alter column defaults in place
+    inspector = sa.inspect(op.get_bind())
+    for table in _TABLES:
+        if not inspector.has_table(table):
+            continue
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column("created_at", server_default=sa.func.now())
+            batch_op.alter_column("updated_at", server_default=sa.func.now())
+            batch_op.alter_column("deleted", server_default="N")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    for table in _TABLES:
+        if not inspector.has_table(table):
+            continue
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column("created_at", server_default=None)
+            batch_op.alter_column("updated_at", server_default=None)
+            batch_op.alter_column("deleted", server_default=None)
@@ -0,0 +1,69 @@
+"""
+Partial indexes on live rows.
+
+Soft-deleted rows are excluded from all ORM selects, thus the indexes only need to cover the live rows
+(`deleted = 'N'`). The username is unique among live users only.
+
+Revision ID: 8d4e6a1f3c25
+Revises: 5b1f0c2e9a47
+Create Date: 2026-10-18 11:20:37.614205
+
+"""
+from __future__ import annotations
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8d4e6a1f3c25"
+down_revision: str | Sequence[str] | None = "5b1f0c2e9a47"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+_LIVE_ROWS = sa.text("deleted = 'N'")
+# (table, column, full index, unique, partial index)
+_INDEXES = (
+    ("user", "username", "ix_user_username", True, "ix_user_username_live"),
+    ("user", "email", "ix_user_email", False, "ix_user_email_live"),
+    ("startup_log", "startup_time", "ix_startup_logs_startup_time", False, "ix_startup_log_startup_time_live"),
+)
+
+
+def _index_names(inspector: sa.Inspector, table: str) -> set[str]:
+    return {index["name"] for index in inspector.get_indexes(table) if index["name"]}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # ! WARNING: The SQL needs to be compatible with all supported databases: PostgreSQL and SQLite.
+    inspector = sa.inspect(op.get_bind())
+    for table, column, full_index, unique, partial_index in _INDEXES:
+        if not inspector.has_table(table):
+            continue
+        index_names = _index_names(inspector, table)
+        if full_index in index_names:
+            op.drop_index(full_index, table_name=table)
+        if partial_index not in index_names:
+            op.create_index(
+                partial_index,
+                table,
+                [column],
+                unique=unique,
+                postgresql_where=_LIVE_ROWS,
+                sqlite_where=_LIVE_ROWS,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    for table, column, full_index, unique, partial_index in _INDEXES:
+        if not inspector.has_table(table):
+            continue
+        index_names = _index_names(inspector, table)
+        if partial_index in index_names:
+            op.drop_index(partial_index, table_name=table)
+        if full_index not in index_names:
+            op.create_index(full_index, table, [column], unique=unique)
@@ -0,0 +1,101 @@
+"""
+Create tables.
+
+The tables used to be created by `SQLModel.metadata.create_all()` on every startup, which is now kept for the
+offline environment only. Existing tables are left untouched, new databases get the latest schema.
+
+Revision ID: c71a9e3b5d02
+Revises: 8d4e6a1f3c25
+Create Date: 2026-10-18 13:05:48.207316
+
+"""
+from __future__ import annotations
+
+from collections.abc import Sequence
+from typing import Any
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "c71a9e3b5d02"
+down_revision: str | Sequence[str] | None = "8d4e6a1f3c25"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+_LIVE_ROWS = sa.text("deleted = 'N'")
+_DELETED_VALUES = ("Y", "N")
+
+
+def _primary_key() -> sa.Column[Any]:
+    return sa.Column("id", sa.BigInteger().with_variant(sa.Integer(), "sqlite"), primary_key=True)
+
+
+def _audit_columns() -> list[sa.Column[Any]]:
+    # Both tables share the enum type, which is created once, not by `create_table()`
+    deleted = sa.Enum(*_DELETED_VALUES, name="deleted").with_variant(
+        postgresql.ENUM(*_DELETED_VALUES, name="deleted", create_type=False), "postgresql"
+    )
+    return [
+        sa.Column("created_by", sa.String(length=64), nullable=False),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.Column("updated_by", sa.String(length=64), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.Column("deleted", deleted, server_default="N", nullable=False),
+    ]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # ! WARNING: The SQL needs to be compatible with all supported databases: PostgreSQL and SQLite.
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if bind.dialect.name == "postgresql":
+        postgresql.ENUM(*_DELETED_VALUES, name="deleted").create(bind, checkfirst=True)
+    if not inspector.has_table("user"):
+        op.create_table(
+            "user",
+            _primary_key(),
+            sa.Column("username", sa.String(length=64), nullable=False),
+            sa.Column("password", sa.String(length=512), nullable=False),
+            sa.Column("email", sa.String(length=256), nullable=False),
+            sa.Column("full_name", sa.String(length=128), nullable=False),
+            sa.Column("scopes", sa.Text(), nullable=False),
+            *_audit_columns(),
+        )
+        op.create_index(
+            "ix_user_username_live",
+            "user",
+            ["username"],
+            unique=True,
+            postgresql_where=_LIVE_ROWS,
+            sqlite_where=_LIVE_ROWS,
+        )
+        op.create_index("ix_user_email_live", "user", ["email"], postgresql_where=_LIVE_ROWS, sqlite_where=_LIVE_ROWS)
+    if not inspector.has_table("startup_log"):
+        op.create_table(
+            "startup_log",
+            _primary_key(),
+            sa.Column("current_user", sa.String(length=64), nullable=False),
+            sa.Column("hostname", sa.String(length=64), nullable=False),
+            sa.Column("command_line", sa.String(), nullable=False),
+            sa.Column("current_working_directory", sa.String(), nullable=False),
+            sa.Column("startup_time", sa.DateTime(), nullable=False),
+            sa.Column("shutdown_time", sa.DateTime(), nullable=True),
+            *_audit_columns(),
+        )
+        op.create_index("ix_startup_log_current_user", "startup_log", ["current_user"])
+        op.create_index("ix_startup_log_hostname", "startup_log", ["hostname"])
+        op.create_index(
+            "ix_startup_log_startup_time_live",
+            "startup_log",
+            ["startup_time"],
+            postgresql_where=_LIVE_ROWS,
+            sqlite_where=_LIVE_ROWS,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # The tables might predate this revision (created by `create_all()`), they are not dropped to keep the data
@@ -0,0 +1,58 @@
+"""
+Create resource sample.
+
+The resource usage of the worker processes, downsampled from the in-memory series, see `configuration.resources`.
+
+Revision ID: e3f8b2a6d914
+Revises: c71a9e3b5d02
+Create Date: 2026-10-18 16:42:09.531870
+
+"""
+from __future__ import annotations
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e3f8b2a6d914"
+down_revision: str | Sequence[str] | None = "c71a9e3b5d02"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+_METRIC_COLUMNS = (
+    "rss",
+    "cpu_time",
+    "open_fds",
+    "threads",
+    "thread_pool_queue",
+    "thread_pool_threads",
+    "db_pool_checked_out",
+    "db_pool_overflow",
+    "gc_collections",
+    "gc_collected",
+    "gc_uncollectable",
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # ! WARNING: The SQL needs to be compatible with all supported databases: PostgreSQL and SQLite.
+    if sa.inspect(op.get_bind()).has_table("resource_sample"):
+        return
+    op.create_table(
+        "resource_sample",
+        sa.Column("id", sa.BigInteger().with_variant(sa.Integer(), "sqlite"), primary_key=True),
+        sa.Column("hostname", sa.String(length=64), nullable=False),
+        sa.Column("pid", sa.Integer(), nullable=False),
+        sa.Column("sampled_at", sa.DateTime(), nullable=False),
+        *[sa.Column(column, sa.Float(), nullable=False) for column in _METRIC_COLUMNS],
+    )
+    op.create_index("ix_resource_sample_sampled_at", "resource_sample", ["sampled_at"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_resource_sample_sampled_at", table_name="resource_sample")
+    op.drop_table("resource_sample")
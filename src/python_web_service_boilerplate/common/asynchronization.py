@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import asyncio
+import contextvars
 import functools
 import inspect
 from asyncio import Task
@@ -9,6 +10,7 @@ from typing import Any, Callable, TypeVar
 
 from loguru import logger
 
+from python_web_service_boilerplate.common.tracing import is_sampled, start_span
 from python_web_service_boilerplate.configuration.thread_pool import executor
 
 
@@ -61,7 +63,11 @@ def async_function(func: Callable[..., R]) -> Callable[..., Future[R]]:
 
     @functools.wraps(func)
     def wrapper(*arg: Any, **kwarg: Any) -> Future[R]:
-        future = executor.submit(func, *arg, **kwarg)
+        if is_sampled():
+            # Run in a child span of the submitting request
+            future = executor.submit(contextvars.copy_context().run, _run_in_span, func, *arg, **kwarg)
+        else:
+            future = executor.submit(func, *arg, **kwarg)
         future.add_done_callback(done_callback)
         module = inspect.getmodule(func)
         logger.debug(f"Submitted future task to run function asynchronously: {future}, {module}.{func.__qualname__}")
@@ -70,6 +76,11 @@ def async_function(func: Callable[..., R]) -> Callable[..., Future[R]]:
     return wrapper
 
 
+def _run_in_span(func: Callable[..., R], *arg: Any, **kwarg: Any) -> R:
+    with start_span(f"thread_pool {func.__qualname__}"):
+        return func(*arg, **kwarg)
+
+
 def async_function_wrapper(func: Callable[..., Any]) -> Callable[..., Task[Any]]:
     """
     The decorator to add `add_done_callback` for async function.
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import enum
+import threading
+import time
+from typing import Any, Callable
+
+from loguru import logger
+
+
+class CircuitBreakerState(enum.Enum):
+    CLOSED = "CLOSED"
+    OPEN = "OPEN"
+    HALF_OPEN = "HALF_OPEN"
+
+
+class CircuitBreakerOpenError(RuntimeError):
+    """Raised when a call is rejected, because the circuit breaker is open."""
+
+    def __init__(self, name: str, retry_after: float) -> None:
+        """Create the error with the seconds until the breaker turns half-open."""
+        super().__init__(f"Circuit breaker [{name}] is open, retry after {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    A thread-safe circuit breaker.
+
+    * CLOSED: calls pass through, consecutive failures are counted. Once `failure_threshold` is reached, the breaker
+      opens.
+    * OPEN: calls fail fast with `CircuitBreakerOpenError`, until `recovery_timeout` seconds have elapsed.
+    * HALF_OPEN: up to `half_open_max_calls` probe calls pass through. A success closes the breaker, a failure opens
+      it again.
+
+    Usage:
+    >>> breaker = CircuitBreaker("database", failure_threshold=5, recovery_timeout=30)
+    >>> breaker.before_call()
+    >>> try:
+    >>>     do_something()
+    >>> except ConnectionError:
+    >>>     breaker.record_failure()
+    >>>     raise
+    >>> except asyncio.CancelledError:
+    >>>     breaker.release_probe()
+    >>>     raise
+    >>> breaker.record_success()
+
+    https://martinfowler.com/bliki/CircuitBreaker.html
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0,
+        half_open_max_calls: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Create a closed circuit breaker."""
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CircuitBreakerState.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        # Counters for health and metrics
+        self._failures_total = 0
+        self._rejected_total = 0
+        self._opened_total = 0
+
+    @property
+    def state(self) -> CircuitBreakerState:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> CircuitBreakerState:
+        if self._state is CircuitBreakerState.OPEN and self._clock() - self._opened_at >= self.recovery_timeout:
+            self._state = CircuitBreakerState.HALF_OPEN
+            self._half_open_calls = 0
+            logger.warning(f"Circuit breaker [{self.name}] is half-open, probing")
+        return self._state
+
+    def _open(self) -> None:
+        self._state = CircuitBreakerState.OPEN
+        self._opened_at = self._clock()
+        self._opened_total += 1
+        logger.error(
+            f"Circuit breaker [{self.name}] opened after {self._consecutive_failures} consecutive failures, "
+            f"failing fast for {self.recovery_timeout}s"
+        )
+
+    def before_call(self) -> None:
+        """
+        Check if a call is allowed.
+
+        :raise CircuitBreakerOpenError: if the breaker is open, or all half-open probe calls are in flight
+        """
+        with self._lock:
+            state = self._current_state()
+            if state is CircuitBreakerState.CLOSED:
+                return
+            if state is CircuitBreakerState.HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return
+            self._rejected_total += 1
+            retry_after = max(0.0, self.recovery_timeout - (self._clock() - self._opened_at))
+        raise CircuitBreakerOpenError(self.name, retry_after)
+
+    def record_success(self) -> None:
+        with self._lock:
+            state = self._current_state()
+            if state is CircuitBreakerState.OPEN:
+                # A late success of a call started before the breaker opened, keep failing fast
+                return
+            if state is CircuitBreakerState.HALF_OPEN:
+                logger.warning(f"Circuit breaker [{self.name}] closed, probe call succeeded")
+            self._state = CircuitBreakerState.CLOSED
+            self._consecutive_failures = 0
+            self._half_open_calls = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures_total += 1
+            self._consecutive_failures += 1
+            state = self._current_state()
+            if state is CircuitBreakerState.HALF_OPEN or (
+                state is CircuitBreakerState.CLOSED and self._consecutive_failures >= self.failure_threshold
+            ):
+                self._open()
+
+    def release_probe(self) -> None:
+        """
+        End a call without an outcome, e.g. cancelled, which is neither a success nor a failure.
+
+        The half-open probe slot taken by `before_call()` is given back, the state and failures are kept.
+        """
+        with self._lock:
+            if self._current_state() is CircuitBreakerState.HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def reset(self) -> None:
+        """Force the breaker to be closed, counters are kept."""
+        with self._lock:
+            self._state = CircuitBreakerState.CLOSED
+            self._consecutive_failures = 0
+            self._half_open_calls = 0
+
+    def snapshot(self) -> dict[str, Any]:
+        """Get the state and counters, for health checks and metrics."""
+        with self._lock:
+            return {
+                "state": self._current_state().value,
+                "consecutive_failures": self._consecutive_failures,
+                "failures_total": self._failures_total,
+                "rejected_total": self._rejected_total,
+                "opened_total": self._opened_total,
+            }
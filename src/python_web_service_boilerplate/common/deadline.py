@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import time
+from collections import Counter
+from collections.abc import Generator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Final, TypeVar
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# The attribute set on the endpoint function by `request_deadline()`, `functools.wraps()` of other decorators copies it
+DEADLINE_ATTRIBUTE: Final = "__request_deadline__"
+
+# Absolute deadline of the current request, in `time.monotonic()` seconds
+_deadline_context: ContextVar[float | None] = ContextVar("deadline", default=None)
+_deadline_exceeded_counter: Counter[str] = Counter()
+
+
+def request_deadline(seconds: float | None) -> Callable[[F], F]:
+    """
+    The decorator to override the default request deadline (`settings.request_timeout`) of a route.
+
+    Usage:
+    >>> @router.get("/reports")
+    >>> @request_deadline(120)
+    >>> async def generate_report() -> Report:
+    >>>     ...
+
+    :param seconds: the deadline in seconds, `None` to disable it (e.g. for streaming endpoints)
+    """
+
+    def decorator(func: F) -> F:
+        setattr(func, DEADLINE_ATTRIBUTE, seconds)
+        return func
+
+    return decorator
+
+
+@contextmanager
+def deadline_scope(seconds: float | None) -> Generator[float | None, None, None]:
+    """
+    Set the deadline of the current context, a nested scope can only shorten the deadline.
+
+    :param seconds: the budget in seconds, `None` to keep the current deadline
+    :return: the absolute deadline, in `time.monotonic()` seconds
+    """
+    deadline = _deadline_context.get()
+    if seconds is not None:
+        new_deadline = time.monotonic() + seconds
+        deadline = new_deadline if deadline is None else min(deadline, new_deadline)
+    token = _deadline_context.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline_context.reset(token)
+
+
+def get_deadline() -> float | None:
+    """Get the absolute deadline of the current context, in `time.monotonic()` seconds."""
+    return _deadline_context.get()
+
+
+def get_remaining_time() -> float | None:
+    """Get the remaining budget in seconds (can be negative), `None` if there is no deadline."""
+    deadline = _deadline_context.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def deadline_exceeded() -> bool:
+    remaining = get_remaining_time()
+    return remaining is not None and remaining <= 0
+
+
+def record_deadline_exceeded(route: str) -> None:
+    _deadline_exceeded_counter[route] += 1
+
+
+def get_deadline_exceeded_counts() -> dict[str, int]:
+    """Get the number of requests that exceeded their deadline, per route (e.g. `GET /api/v1/users/{id}`)."""
+    return dict(_deadline_exceeded_counter)
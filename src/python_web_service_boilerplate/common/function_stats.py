@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import math
+import threading
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from typing import Any, Final, Literal
+
+# The relative accuracy of the percentiles, 1%
+_RELATIVE_ACCURACY: Final = 0.01
+_GAMMA: Final = (1 + _RELATIVE_ACCURACY) / (1 - _RELATIVE_ACCURACY)
+_LOG_GAMMA: Final = math.log(_GAMMA)
+# Smaller values are counted as zero
+_MIN_VALUE: Final = 1e-9
+
+# The source lines of the allocations kept per function, trimmed to the top half once exceeded
+_MAX_ALLOCATION_LINES: Final = 100
+
+SortKey = Literal["total", "count", "mean", "max", "p99"]
+
+
+class QuantileSketch:
+    """
+    A percentile sketch of non-negative values with logarithmic buckets (DDSketch), in constant memory per magnitude.
+
+    Any percentile is within 1% of the exact value, e.g. 1 µs to 1000 s fits in about 1000 buckets.
+    """
+
+    __slots__ = ("_buckets", "_count", "_zero_count")
+
+    def __init__(self) -> None:
+        """Create an empty sketch."""
+        self._buckets: dict[int, int] = {}
+        self._zero_count = 0
+        self._count = 0
+
+    def add(self, value: float) -> None:
+        self._count += 1
+        if value <= _MIN_VALUE:
+            self._zero_count += 1
+            return
+        key = math.ceil(math.log(value) / _LOG_GAMMA)
+        self._buckets[key] = self._buckets.get(key, 0) + 1
+
+    def percentile(self, q: float) -> float:
+        """Estimate the `q` percentile, e.g. `0.99`, `0.0` if the sketch is empty."""
+        if self._count == 0:
+            return 0.0
+        rank = q * (self._count - 1)
+        seen = self._zero_count
+        if seen > rank:
+            return 0.0
+        for key in sorted(self._buckets):
+            seen += self._buckets[key]
+            if seen > rank:
+                # The middle of the bucket (gamma^(key-1), gamma^key] in relative terms
+                return 2 * _GAMMA**key / (_GAMMA + 1)
+        return 2 * _GAMMA ** max(self._buckets) / (_GAMMA + 1)
+
+
+@dataclass(slots=True)
+class FunctionStats:
+    """The count, errors, sum, min/max and percentiles of a metric (e.g. elapsed time) of a function."""
+
+    function: str
+    metric: str
+    count: int = 0
+    errors: int = 0
+    total: float = 0.0
+    min: float = math.inf
+    max: float = 0.0
+    sketch: QuantileSketch = field(default_factory=QuantileSketch)
+    # The net retained bytes per source line (`file:line`), see `@mem_profile(mode="tracemalloc")`
+    allocations: dict[str, int] = field(default_factory=dict)
+
+    def add(self, value: float, *, failed: bool) -> None:
+        self.count += 1
+        self.errors += failed
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.sketch.add(max(value, 0.0))
+
+    def add_allocations(self, allocations: Iterable[tuple[str, int]]) -> None:
+        for line, size in allocations:
+            self.allocations[line] = self.allocations.get(line, 0) + size
+        if len(self.allocations) > _MAX_ALLOCATION_LINES:
+            top = sorted(self.allocations.items(), key=lambda item: item[1], reverse=True)
+            self.allocations = dict(top[: _MAX_ALLOCATION_LINES // 2])
+
+    def top_allocations(self, limit: int = 10) -> list[tuple[str, int]]:
+        return sorted(self.allocations.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "function": self.function,
+            "metric": self.metric,
+            "count": self.count,
+            "errors": self.errors,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "min": self.min if self.count else 0.0,
+            "max": self.max,
+            "p50": self.sketch.percentile(0.5),
+            "p90": self.sketch.percentile(0.9),
+            "p99": self.sketch.percentile(0.99),
+            "allocations": [{"line": line, "size": size} for line, size in self.top_allocations()],
+        }
+
+
+class FunctionStatsRegistry:
+    """
+    The central registry of the function metrics recorded by `@elapsed_time`, `@mem_profile` and `@cpu_profile`.
+
+    Instead of a log line per call, every call is aggregated per function and metric. `enabled` switches the
+    instrumentation at runtime, once disabled the decorated functions are called without measuring anything.
+    `log_every` still logs 1 in N calls per function, 0 logs none.
+
+    Usage:
+    >>> registry = FunctionStatsRegistry(log_every=100)
+    >>> if registry.record("module.function", "elapsed", 0.042):
+    >>>     logger.info("module.function() -> elapsed time: 0.042s")
+    >>> registry.top(10, metric="elapsed", sort="total")
+    """
+
+    def __init__(self, *, enabled: bool = True, log_every: int = 0) -> None:
+        """Create an empty registry."""
+        self.enabled = enabled
+        self.log_every = log_every
+        self._stats: dict[tuple[str, str], FunctionStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, function: str, metric: str, value: float, *, failed: bool = False) -> bool:
+        """
+        Record a measurement of a function call.
+
+        :param function: the qualified name of the function, e.g. `module.Class.method`
+        :param metric: the metric, e.g. `elapsed` (seconds), `memory` (bytes)
+        :param value: the measurement, non-negative values for the percentiles
+        :param failed: whether the call raised an exception
+        :return: whether this call should be logged, see `log_every`
+        """
+        with self._lock:
+            stats = self._get(function, metric)
+            stats.add(value, failed=failed)
+            count = stats.count
+        return self.log_every > 0 and (count - 1) % self.log_every == 0
+
+    def record_allocations(self, function: str, allocations: Iterable[tuple[str, int]]) -> None:
+        """Add the net retained bytes per source line of a call, to the `memory` metric of the function."""
+        with self._lock:
+            self._get(function, "memory").add_allocations(allocations)
+
+    def top(self, limit: int = 20, *, metric: str = "elapsed", sort: SortKey = "total") -> list[dict[str, Any]]:
+        """Get the statistics of the top functions of a metric, by total, count, mean, max or p99 descending."""
+        with self._lock:
+            statistics = [
+                stats.to_dict() for (_function, stats_metric), stats in self._stats.items() if stats_metric == metric
+            ]
+        return sorted(statistics, key=lambda stats: stats[sort], reverse=True)[:limit]
+
+    def _get(self, function: str, metric: str) -> FunctionStats:
+        stats = self._stats.get((function, metric))
+        if stats is None:
+            stats = self._stats[function, metric] = FunctionStats(function, metric)
+        return stats
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
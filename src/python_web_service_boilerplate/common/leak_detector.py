@@ -0,0 +1,157 @@
+"""
+Hunt memory leaks of long-running workers: the object types and allocation sites growing at every interval.
+
+Each census counts the live objects tracked by the garbage collector per type, and the traced bytes per source line
+(tracemalloc). Over the last `intervals` intervals, the types and lines whose counts grew at every single interval are
+reported, most grown first. Noise (caches filling up, lazy imports) grows once or twice, then stalls; a leak keeps
+growing.
+
+A census walks all objects, e.g. about 0.1s per million objects, while holding the GIL; tracing the allocations slows
+down allocating by about 2x, thus the detector is meant to be run for a while, every few minutes, not always.
+"""
+
+from __future__ import annotations
+
+import gc
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass
+from typing import Any, Final, TypedDict
+
+from loguru import logger
+
+from python_web_service_boilerplate.common.profiling import acquire_tracemalloc, release_tracemalloc
+
+# The allocations of tracemalloc and this module are not reported
+_TRACEMALLOC_FILTERS: Final = (
+    tracemalloc.Filter(inclusive=False, filename_pattern=tracemalloc.__file__),
+    tracemalloc.Filter(inclusive=False, filename_pattern=__file__),
+)
+
+
+@dataclass(frozen=True, slots=True)
+class Census:
+    timestamp: float
+    # The live objects per type, e.g. `{"builtins.dict": 52130}`
+    types: Mapping[str, int]
+    # The traced bytes per source line, e.g. `{"core/auth/service.py:42": 1024}`, empty if not traced yet
+    allocations: Mapping[str, int]
+
+
+class Growth(TypedDict):
+    name: str
+    # The counts, oldest first
+    values: list[int]
+    # The last count minus the first one
+    growth: int
+
+
+def _type_census() -> dict[str, int]:
+    counts = Counter(map(type, gc.get_objects()))
+    return {f"{cls.__module__}.{cls.__qualname__}": count for cls, count in counts.items()}
+
+
+def _allocation_census() -> dict[str, int]:
+    snapshot = tracemalloc.take_snapshot().filter_traces(_TRACEMALLOC_FILTERS)
+    return {
+        f"{statistic.traceback[0].filename}:{statistic.traceback[0].lineno}": statistic.size
+        for statistic in snapshot.statistics("lineno")
+    }
+
+
+def growing(counts: Sequence[Mapping[str, int]], limit: int) -> list[Growth]:
+    """
+    Get the keys whose counts grew between every two consecutive counts, by the total growth descending.
+
+    :param counts: the counts per key, oldest first; a missing key counts as 0
+    :param limit: the maximum number of keys returned
+    """
+    if len(counts) < 2:
+        return []
+    growths: list[Growth] = []
+    for key, last in counts[-1].items():
+        values = [count.get(key, 0) for count in counts]
+        if all(previous < current for previous, current in zip(values, values[1:], strict=False)):
+            growths.append(Growth(name=key, values=values, growth=last - values[0]))
+    return sorted(growths, key=lambda growth: growth["growth"], reverse=True)[:limit]
+
+
+class LeakDetector:
+    """
+    Keep the last `intervals + 2` censuses and report what grew at every interval.
+
+    The census starting tracing has no allocations, thus one census more is kept, so that the allocations are compared
+    over `intervals` intervals as well.
+
+    Usage:
+    >>> detector = LeakDetector(intervals=5)
+    >>> detector.census()  # Every few minutes, e.g. by APScheduler
+    >>> detector.report()
+    >>> detector.stop_tracing()
+
+    :param intervals: the consecutive intervals a type or line must grow at to be reported
+    :param frames: the frames traced per allocation by tracemalloc, the innermost one is reported
+    :param limit: the maximum number of types and lines reported
+    """
+
+    def __init__(self, *, intervals: int = 5, frames: int = 1, limit: int = 20) -> None:
+        """Create a detector without any census."""
+        self.intervals = intervals
+        self.frames = frames
+        self.limit = limit
+        self._censuses: deque[Census] = deque(maxlen=intervals + 2)
+        self._lock = threading.Lock()
+        # Whether tracemalloc is acquired by the detector, see `acquire_tracemalloc()`
+        self._tracing = False
+
+    def census(self) -> Census:
+        """Take a census of the objects and the traced allocations, starting tracing the allocations on first call."""
+        started = time.perf_counter()
+        with self._lock:
+            started_tracing = not self._tracing and acquire_tracemalloc(self.frames)
+            self._tracing = True
+        # Once tracing is started, only the allocations from then on are traced, thus nothing to compare yet
+        allocations = {} if started_tracing else _allocation_census()
+        census = Census(time.time(), _type_census(), allocations)
+        with self._lock:
+            self._censuses.append(census)
+        logger.info(
+            f"Memory census taken in {time.perf_counter() - started:.3f}s, types: {len(census.types)}, "
+            f"allocation lines: {len(census.allocations)}"
+        )
+        return census
+
+    def report(self) -> dict[str, Any]:
+        """
+        Get the types and allocation lines grown at every interval, over the last `intervals + 1` censuses.
+
+        The first census starting tracing has no allocations, thus skipped; the report is ready once `intervals + 1`
+        censuses with allocations were taken.
+        """
+        with self._lock:
+            censuses = list(self._censuses)
+        types = [census.types for census in censuses][-(self.intervals + 1) :]
+        allocations = [census.allocations for census in censuses if census.allocations][-(self.intervals + 1) :]
+        if len(allocations) < self.intervals + 1:
+            return {"censuses": len(censuses), "intervals": self.intervals, "types": [], "allocations": []}
+        return {
+            "censuses": len(censuses),
+            "intervals": self.intervals,
+            "types": growing(types, self.limit),
+            "allocations": growing(allocations, self.limit),
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._censuses.clear()
+
+    def stop_tracing(self) -> None:
+        """Release tracemalloc, stopped unless used by others (e.g. `@mem_profile`), and forget the censuses."""
+        with self._lock:
+            if self._tracing:
+                release_tracemalloc()
+            self._tracing = False
+        self.reset()
@@ -0,0 +1,176 @@
+"""
+A sidecar index of the trace IDs in the compressed log files, to find the records of a request without scanning logs.
+
+The rotated log file is compressed into independent gzip members of about `CHUNK_SIZE` bytes each, which is still a
+valid gzip file (`zcat` reads all members). The index file (`<log>.gz.idx`) maps the hash of each trace ID to the
+members containing its records, thus only those members are read and decompressed.
+
+Index layout, little-endian:
+* header: magic `TIDX`, version (u16), member count (u32), entry count (u32)
+* members: offset (u64) and length (u32) in the gzip file, per member
+* entries: trace ID hash (u64) and member number (u32), sorted by hash, binary searched via mmap
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import mmap
+import re
+import struct
+from collections import defaultdict
+from pathlib import Path
+from typing import Final
+
+from loguru import logger
+
+CHUNK_SIZE: Final = 64 * 1024
+INDEX_SUFFIX: Final = ".idx"
+_MAGIC: Final = b"TIDX"
+_VERSION: Final = 1
+_HEADER = struct.Struct("<4sHII")
+_MEMBER = struct.Struct("<QI")
+_ENTRY = struct.Struct("<QI")
+# The trace ID in the text format of the log file, see `_message_format`
+_TRACE_ID_PATTERN: Final = re.compile(rb" \| Trace=([^ |]+) \| ")
+# The first line of a record starts with its time, other lines belong to the previous record (e.g. tracebacks)
+_RECORD_START_PATTERN: Final = re.compile(rb"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}")
+
+
+def _hash_trace_id(trace_id: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(trace_id, digest_size=8).digest(), "little")
+
+
+def _split_records(path: Path) -> list[bytes]:
+    """Split the log file into chunks of about `CHUNK_SIZE` bytes, only before the first line of a record."""
+    chunks: list[bytes] = []
+    chunk: list[bytes] = []
+    size = 0
+    with path.open("rb") as file:
+        for line in file:
+            if size >= CHUNK_SIZE and _RECORD_START_PATTERN.match(line):
+                chunks.append(b"".join(chunk))
+                chunk, size = [], 0
+            chunk.append(line)
+            size += len(line)
+    if chunk:
+        chunks.append(b"".join(chunk))
+    return chunks
+
+
+def compress_and_index(path: str) -> None:
+    """
+    Compress a rotated log file into `<path>.gz` and write its trace ID index `<path>.gz.idx`, the original is deleted.
+
+    Usage:
+    >>> logger.add("app.{time}.log", rotation="00:00", compression=compress_and_index)
+    """
+    log_path = Path(path)
+    gzip_path = log_path.with_name(f"{log_path.name}.gz")
+    members: list[tuple[int, int]] = []
+    entries: defaultdict[int, set[int]] = defaultdict(set)
+    offset = 0
+    with gzip_path.open("wb") as gzip_file:
+        for number, chunk in enumerate(_split_records(log_path)):
+            member = gzip.compress(chunk)
+            gzip_file.write(member)
+            members.append((offset, len(member)))
+            offset += len(member)
+            for match in _TRACE_ID_PATTERN.finditer(chunk):
+                entries[_hash_trace_id(match.group(1))].add(number)
+    sorted_entries = sorted((key, number) for key, numbers in entries.items() for number in numbers)
+    index = bytearray(_HEADER.pack(_MAGIC, _VERSION, len(members), len(sorted_entries)))
+    for member_offset, length in members:
+        index += _MEMBER.pack(member_offset, length)
+    for key, number in sorted_entries:
+        index += _ENTRY.pack(key, number)
+    gzip_path.with_name(f"{gzip_path.name}{INDEX_SUFFIX}").write_bytes(index)
+    log_path.unlink()
+    logger.debug(f"Compressed and indexed {log_path}, {len(members)} gzip members, {len(entries)} trace IDs")
+
+
+def _find_members(index: mmap.mmap, key: int) -> list[tuple[int, int]]:
+    """Binary search the entries of the hash, return the offset and length of their gzip members."""
+    magic, version, member_count, entry_count = _HEADER.unpack_from(index, 0)
+    if magic != _MAGIC or version != _VERSION:
+        return []
+    entries_offset = _HEADER.size + member_count * _MEMBER.size
+    low, high = 0, entry_count
+    while low < high:
+        middle = (low + high) // 2
+        if _ENTRY.unpack_from(index, entries_offset + middle * _ENTRY.size)[0] < key:
+            low = middle + 1
+        else:
+            high = middle
+    members: list[tuple[int, int]] = []
+    while low < entry_count:
+        entry_key, number = _ENTRY.unpack_from(index, entries_offset + low * _ENTRY.size)
+        if entry_key != key:
+            break
+        members.append(_MEMBER.unpack_from(index, _HEADER.size + number * _MEMBER.size))
+        low += 1
+    return members
+
+
+def _record_end(data: bytes | mmap.mmap, position: int) -> int:
+    """Find the end of the record at `position`, before the first line of the next record."""
+    end = data.find(b"\n", position)
+    while end != -1 and end + 1 < len(data) and not _RECORD_START_PATTERN.match(data[end + 1 : end + 20]):
+        next_end = data.find(b"\n", end + 1)
+        end = len(data) if next_end == -1 else next_end
+    return len(data) if end == -1 else end
+
+
+def _matching_records(data: bytes | mmap.mmap, needle: bytes) -> list[str]:
+    """Find the records containing `needle`, including their continuation lines."""
+    records: list[str] = []
+    position = data.find(needle)
+    while position != -1:
+        start = data.rfind(b"\n", 0, position) + 1
+        end = _record_end(data, position)
+        records.append(data[start:end].decode("utf-8", errors="replace"))
+        position = data.find(needle, end)
+    return records
+
+
+def _search_indexed(gzip_path: Path, index_path: Path, trace_id: bytes) -> list[str]:
+    with index_path.open("rb") as index_file, mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ) as index:
+        members = _find_members(index, _hash_trace_id(trace_id))
+    if not members:
+        return []
+    records: list[str] = []
+    needle = b" | Trace=" + trace_id + b" | "
+    with gzip_path.open("rb") as gzip_file, mmap.mmap(gzip_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        for offset, length in members:
+            records.extend(_matching_records(gzip.decompress(data[offset : offset + length]), needle))
+    return records
+
+
+def _search_active(log_path: Path, trace_id: bytes) -> list[str]:
+    if log_path.stat().st_size == 0:
+        return []
+    with log_path.open("rb") as log_file, mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return _matching_records(data, b" | Trace=" + trace_id + b" | ")
+
+
+def search_trace(directory: Path, trace_id: str) -> list[str]:
+    """
+    Find the log records of a trace in the indexed compressed log files and the active log files, oldest first.
+
+    Compressed log files without index (compressed before the index existed) are not searched.
+
+    :param directory: the directory of the log files
+    :param trace_id: the trace ID, e.g. the `X-Trace-ID` header of the response
+    :return: the log records, including the lines of their tracebacks
+    """
+    encoded_trace_id = trace_id.encode()
+    records: list[str] = []
+    # The time in the file names sorts them
+    for path in sorted(directory.glob("*.log*")):
+        if path.name.endswith(".log.gz"):
+            index_path = path.with_name(f"{path.name}{INDEX_SUFFIX}")
+            if index_path.exists():
+                records.extend(_search_indexed(path, index_path, encoded_trace_id))
+        elif path.suffix == ".log":
+            records.extend(_search_active(path, encoded_trace_id))
+    return records
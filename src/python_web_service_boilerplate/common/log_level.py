@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any
+
+from loguru import logger
+
+if TYPE_CHECKING:
+    from loguru import Record
+
+# Warnings and errors are never sampled
+_SAMPLING_MAX_LEVEL = logger.level("WARNING").no
+
+
+@dataclass(frozen=True)
+class LogSampling:
+    """
+    Sampling of the records of a module, per call site (module and line).
+
+    :param every: log 1 in `every` records
+    :param per_second: log at most `per_second` records per second
+    """
+
+    every: int | None = None
+    per_second: float | None = None
+
+
+@dataclass
+class _CallSite:
+    count: int = 0
+    tokens: float = 0.0
+    updated: float = field(default_factory=time.monotonic)
+
+
+class LogLevelController:
+    """
+    The global and per-module log levels and sampling, adjustable at runtime; used as the filter of the sinks.
+
+    A module level applies to the module and its submodules, the most specific one wins. Loguru drops records below
+    the level of all sinks before creating the record and formatting the message, thus the sinks are added at the
+    `floor`, the lowest level in effect, and re-added through the listeners when it changes.
+
+    Usage:
+    >>> log_levels = LogLevelController("INFO")
+    >>> logger.add(sys.stderr, level=log_levels.floor, filter=log_levels)
+    >>> log_levels.set_level("DEBUG", "python_web_service_boilerplate.core.auth")
+    >>> log_levels.set_sampling("python_web_service_boilerplate.core.auth", LogSampling(per_second=10))
+    """
+
+    def __init__(self, level: str) -> None:
+        """Create the controller with the global level."""
+        self._level = logger.level(level).name
+        self._module_levels: dict[str, str] = {}
+        self._samplings: dict[str, LogSampling] = {}
+        # Resolved per record name, cleared on every change
+        self._resolved_levels: dict[str, int] = {}
+        self._resolved_samplings: dict[str, LogSampling | None] = {}
+        self._call_sites: dict[tuple[str, int], _CallSite] = {}
+        self._sampled_out: Counter[str] = Counter()
+        self._lock = threading.Lock()
+        # Every sink calls the filter, the sampling decision is made once per record
+        self._last_decision = threading.local()
+        self._listeners: list[Callable[[str], None]] = []
+
+    @property
+    def floor(self) -> str:
+        """The lowest level in effect, globally or for any module."""
+        return min([self._level, *self._module_levels.values()], key=lambda level: logger.level(level).no)
+
+    def add_listener(self, listener: Callable[[str], None]) -> None:
+        """Call `listener` with the new floor, whenever it changes."""
+        self._listeners.append(listener)
+
+    def set_level(self, level: str, module: str | None = None) -> None:
+        """
+        Set the global level, or the level of a module.
+
+        :param level: the level name, e.g. `DEBUG`
+        :param module: the module name, e.g. `python_web_service_boilerplate.core.auth`, `None` for the global level
+        :raises ValueError: if the level does not exist
+        """
+        name = logger.level(level.upper()).name
+        floor = self.floor
+        with self._lock:
+            if module:
+                self._module_levels[module] = name
+            else:
+                self._level = name
+            self._resolved_levels.clear()
+        logger.warning(f"Log level of [{module or 'global'}] set to {name}")
+        self._notify(floor)
+
+    def reset_level(self, module: str) -> None:
+        """Remove the level of a module, it inherits the level of its parent module again."""
+        floor = self.floor
+        with self._lock:
+            self._module_levels.pop(module, None)
+            self._resolved_levels.clear()
+        logger.warning(f"Log level of [{module}] reset")
+        self._notify(floor)
+
+    def set_sampling(self, module: str, sampling: LogSampling | None) -> None:
+        """Sample the records below WARNING of a module and its submodules, `None` to log all records again."""
+        with self._lock:
+            if sampling is None:
+                self._samplings.pop(module, None)
+            else:
+                self._samplings[module] = sampling
+            self._resolved_samplings.clear()
+            self._call_sites.clear()
+        logger.warning(f"Log sampling of [{module}] set to {sampling}")
+
+    def levels(self) -> dict[str, str]:
+        """Get the global level and the module levels."""
+        with self._lock:
+            return {"": self._level, **self._module_levels}
+
+    def samplings(self) -> dict[str, LogSampling]:
+        with self._lock:
+            return dict(self._samplings)
+
+    def statistics(self) -> dict[str, int]:
+        """Get the number of sampled out records per module."""
+        with self._lock:
+            return dict(self._sampled_out)
+
+    def is_enabled(self, name: str | None, level_no: int) -> bool:
+        """Check whether a record of the level is logged in the module `name`."""
+        resolved = self._resolved_levels.get(name or "")
+        if resolved is None:
+            resolved = self._resolve_level(name or "")
+        return level_no >= resolved
+
+    def __call__(self, record: Record) -> bool:
+        """Filter a record by the level of its module, and sample it."""
+        if not self.is_enabled(record["name"], record["level"].no):
+            return False
+        if record["level"].no >= _SAMPLING_MAX_LEVEL or not self._samplings:
+            return True
+        last_decision = self._last_decision
+        if getattr(last_decision, "record", None) is record:
+            return bool(last_decision.sampled)
+        sampled = self._sample(record)
+        last_decision.record, last_decision.sampled = record, sampled
+        return sampled
+
+    def _resolve_level(self, name: str) -> int:
+        with self._lock:
+            module = _most_specific(self._module_levels, name)
+            level_no = logger.level(self._module_levels[module] if module else self._level).no
+            self._resolved_levels[name] = level_no
+            return level_no
+
+    def _sample(self, record: Record) -> bool:
+        name = record["name"] or ""
+        with self._lock:
+            if name not in self._resolved_samplings:
+                module = _most_specific(self._samplings, name)
+                self._resolved_samplings[name] = self._samplings[module] if module else None
+            sampling = self._resolved_samplings[name]
+            if sampling is None:
+                return True
+            call_site = self._call_sites.setdefault((name, record["line"]), _CallSite(tokens=sampling.per_second or 0))
+            sampled = _sample_call_site(sampling, call_site)
+            if not sampled:
+                self._sampled_out[name] += 1
+            return sampled
+
+    def _notify(self, previous_floor: str) -> None:
+        floor = self.floor
+        if floor == previous_floor:
+            return
+        for listener in self._listeners:
+            listener(floor)
+
+
+def _most_specific(modules: dict[str, Any], name: str) -> str | None:
+    """Find the most specific module of `name`, e.g. `a.b` for `a.b.c`, among `modules`."""
+    while name:
+        if name in modules:
+            return name
+        name = name.rpartition(".")[0]
+    return None
+
+
+def _sample_call_site(sampling: LogSampling, call_site: _CallSite) -> bool:
+    call_site.count += 1
+    if sampling.every is not None and (call_site.count - 1) % sampling.every != 0:
+        return False
+    if sampling.per_second is None:
+        return True
+    # Token bucket, refilled with `per_second` tokens per second, holding at most 1 second of tokens
+    now = time.monotonic()
+    call_site.tokens = min(
+        max(sampling.per_second, 1.0), call_site.tokens + (now - call_site.updated) * sampling.per_second
+    )
+    call_site.updated = now
+    if call_site.tokens < 1:
+        return False
+    call_site.tokens -= 1
+    return True
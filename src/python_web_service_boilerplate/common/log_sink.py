@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import threading
+import traceback
+from typing import IO, TYPE_CHECKING, Any, Final
+
+import orjson
+
+if TYPE_CHECKING:
+    from loguru import Message, Record
+
+DEFAULT_BUFFER_SIZE: Final = 10_000
+DEFAULT_BATCH_SIZE: Final = 1000
+DEFAULT_FLUSH_INTERVAL: Final = 0.2
+
+
+def json_format(_record: Record) -> str:
+    """
+    The format of the JSON sink, the sink serializes the record itself.
+
+    A callable format also stops loguru from formatting the exception into the message, which the sink does instead.
+    """
+    return "{message}"
+
+
+def serialize_record(record: Record) -> bytes:
+    """Serialize a loguru record as one JSON line."""
+    extra = record["extra"]
+    data: dict[str, Any] = {
+        "time": record["time"].isoformat(),
+        "level": record["level"].name,
+        "message": record["message"],
+        "trace_id": extra.get("trace_id", ""),
+        "logger": record["name"],
+        "function": record["function"],
+        "line": record["line"],
+        "process": record["process"].id,
+        "thread": record["thread"].name,
+    }
+    if len(extra) > 1 or "trace_id" not in extra:
+        data["extra"] = {key: value for key, value in extra.items() if key != "trace_id"}
+    exception = record["exception"]
+    if exception is not None:
+        data["exception"] = "".join(traceback.format_exception(exception.type, exception.value, exception.traceback))
+    return orjson.dumps(data, default=str, option=orjson.OPT_APPEND_NEWLINE)
+
+
+class BatchedJsonSink:
+    """
+    The loguru sink writing JSON lines in large batches from a background thread.
+
+    The logging call only appends the message to a bounded buffer, serialization and I/O happen in the writer thread,
+    thus never on the event loop. Once the buffer is full, new records are dropped and counted instead of blocking the
+    caller.
+
+    Usage:
+    >>> sink = BatchedJsonSink(sys.stderr)
+    >>> logger.add(sink, format=json_format, filter=trace_id_filter)
+    """
+
+    def __init__(
+        self,
+        stream: IO[Any],
+        *,
+        buffer_size: int = DEFAULT_BUFFER_SIZE,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+    ) -> None:
+        """Start the writer thread, text streams are written through their binary buffer."""
+        self._stream = getattr(stream, "buffer", stream)
+        self._buffer_size = buffer_size
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._buffer: list[Message] = []
+        self._lock = threading.Lock()
+        self._batch_ready = threading.Condition(self._lock)
+        # Serializes the writes of the writer thread and `write_buffered()`, keeping the order of the records
+        self._write_lock = threading.Lock()
+        self._stopped = False
+        self._written = 0
+        self._dropped = 0
+        self._batches = 0
+        self._thread = threading.Thread(target=self._run, name="json-log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, message: Message) -> None:
+        with self._lock:
+            if len(self._buffer) >= self._buffer_size:
+                self._dropped += 1
+                return
+            self._buffer.append(message)
+            if len(self._buffer) >= self._batch_size:
+                self._batch_ready.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if not self._stopped and len(self._buffer) < self._batch_size:
+                    self._batch_ready.wait(self._flush_interval)
+                if self._stopped:
+                    return
+            self.write_buffered()
+
+    def write_buffered(self) -> None:
+        """
+        Write all buffered records.
+
+        Deliberately not named `flush()`, loguru calls the `flush()` of a sink after every single record.
+        """
+        with self._write_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return
+            self._stream.write(b"".join([serialize_record(message.record) for message in batch]))
+            self._stream.flush()
+            with self._lock:
+                self._written += len(batch)
+                self._batches += 1
+
+    def stop(self) -> None:
+        """Stop the writer thread and write the remaining records, called by loguru when the sink is removed."""
+        with self._lock:
+            if self._stopped:
+                return
+            self._stopped = True
+            self._batch_ready.notify()
+        self._thread.join()
+        self.write_buffered()
+
+    def statistics(self) -> dict[str, int]:
+        """Get the counters of the sink, for health checks and metrics."""
+        with self._lock:
+            return {
+                "buffered": len(self._buffer),
+                "written": self._written,
+                "dropped": self._dropped,
+                "batches": self._batches,
+            }
@@ -0,0 +1,188 @@
+"""
+Measure the scheduling lag of the event loop, and name the code blocking it.
+
+A task on the loop sleeps `interval` seconds in a loop, its wake-up delay is the lag, counted in a histogram. A
+watchdog thread checks the expected wake-up time of the task; once the loop is late by `threshold` seconds, the
+watchdog captures the stack of the loop thread while it is still blocked, logs it and counts the blocking location,
+e.g. `core/auth/service.py:42 login`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import bisect
+import sys
+import threading
+import time
+import traceback
+from collections.abc import Iterable
+from pathlib import Path
+from types import FrameType
+from typing import Any, Final
+
+from loguru import logger
+
+# The blocking locations counted beyond the limit
+OTHER_LOCATION: Final = "[other]"
+_PACKAGE_DIRECTORY: Final = str(Path(__file__).parent.parent)
+
+
+class BlockingCallError(RuntimeError):
+    """A blocking call, e.g. a synchronous database session, on the event loop thread, see `check_not_on_loop()`."""
+
+
+def check_not_on_loop(operation: str) -> None:
+    """
+    Raise `BlockingCallError` if called by a coroutine, on the thread of a running event loop.
+
+    :param operation: the blocking operation, for the error message
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    msg = f"{operation} blocks the event loop, run it in a thread pool or use its async counterpart"
+    raise BlockingCallError(msg)
+
+
+def _is_application_frame(frame: FrameType) -> bool:
+    filename = frame.f_code.co_filename
+    return filename.startswith(_PACKAGE_DIRECTORY) and not filename.endswith("loop_monitor.py")
+
+
+def _blocking_location(frame: FrameType) -> str:
+    """The innermost frame of this package, else the innermost frame, e.g. `core/auth/service.py:42 login`."""
+    location_frame: FrameType | None = frame
+    while location_frame is not None and not _is_application_frame(location_frame):
+        location_frame = location_frame.f_back
+    if location_frame is None:
+        location_frame = frame
+    filename = location_frame.f_code.co_filename
+    if filename.startswith(_PACKAGE_DIRECTORY):
+        filename = filename[len(_PACKAGE_DIRECTORY) + 1 :]
+    return f"{filename}:{location_frame.f_lineno} {location_frame.f_code.co_name}"
+
+
+class LoopLagMonitor:
+    """
+    The event loop lag histogram and the locations of the calls blocking the loop.
+
+    Usage:
+    >>> monitor = LoopLagMonitor(interval=0.05, threshold=0.1, buckets=(0.01, 0.1, 1.0))
+    >>> monitor.start()  # On the event loop
+    >>> monitor.statistics()
+    >>> monitor.stop()
+
+    :param interval: the seconds between the measurements
+    :param threshold: the lag in seconds from which the stack of the loop thread is captured
+    :param buckets: the upper bounds of the lag histogram buckets in seconds, ascending
+    :param max_locations: the distinct blocking locations counted, the others are counted as `OTHER_LOCATION`
+    """
+
+    def __init__(
+        self,
+        *,
+        interval: float = 0.05,
+        threshold: float = 0.1,
+        buckets: Iterable[float] = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+        max_locations: int = 100,
+    ) -> None:
+        """Create a stopped monitor."""
+        self.interval = interval
+        self.threshold = threshold
+        self.buckets = tuple(sorted(buckets))
+        self.max_locations = max_locations
+        # The last bucket counts the lags above the largest bound, `+Inf`
+        self._bucket_counts = [0] * (len(self.buckets) + 1)
+        self._lag_sum = 0.0
+        self._max_lag = 0.0
+        self._locations: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._task: asyncio.Task[None] | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stopped = threading.Event()
+        self._loop_thread_id = 0
+        # The time the measuring task is expected to wake up at, `None` while not waiting
+        self._expected_wake_up: float | None = None
+        self._captured_wake_up: float | None = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Start measuring the running event loop, must be called on the loop."""
+        if self.is_running:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._stopped.clear()
+        self._task = asyncio.get_running_loop().create_task(self._measure(), name="loop-lag-monitor")
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.warning(f"Event loop lag monitor started, interval: {self.interval}s, threshold: {self.threshold}s")
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._watchdog is not None:
+            self._stopped.set()
+            self._watchdog.join()
+            self._watchdog = None
+        self._expected_wake_up = None
+
+    async def _measure(self) -> None:
+        while True:
+            self._expected_wake_up = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            self.record(max(time.perf_counter() - self._expected_wake_up, 0.0))
+
+    def record(self, lag: float) -> None:
+        """Record a lag in seconds."""
+        with self._lock:
+            self._bucket_counts[bisect.bisect_left(self.buckets, lag)] += 1
+            self._lag_sum += lag
+            self._max_lag = max(self._max_lag, lag)
+
+    def _watch(self) -> None:
+        poll_interval = min(self.interval, self.threshold) / 2
+        while not self._stopped.wait(poll_interval):
+            expected_wake_up = self._expected_wake_up
+            if expected_wake_up is None or expected_wake_up == self._captured_wake_up:
+                continue
+            blocked = time.perf_counter() - expected_wake_up
+            if blocked >= self.threshold:
+                # Once per stall
+                self._captured_wake_up = expected_wake_up
+                self._capture(blocked)
+
+    def _capture(self, blocked: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread_id)  # noqa: SLF001
+        if frame is None:
+            return
+        location = _blocking_location(frame)
+        with self._lock:
+            if location not in self._locations and len(self._locations) >= self.max_locations:
+                location = OTHER_LOCATION
+            self._locations[location] = self._locations.get(location, 0) + 1
+        stack = "".join(traceback.format_stack(frame))
+        logger.warning(f"Event loop blocked for {blocked:.3f}s+ by {location}, stack:\n{stack}")
+
+    def histogram(self) -> tuple[list[int], float]:
+        """Get the lag histogram bucket counts (not cumulative) and the sum of the lags."""
+        with self._lock:
+            return list(self._bucket_counts), self._lag_sum
+
+    def locations(self) -> dict[str, int]:
+        """Get the count of the captured stalls per blocking location."""
+        with self._lock:
+            return dict(self._locations)
+
+    def statistics(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "running": self.is_running,
+                "measurements": sum(self._bucket_counts),
+                "max_lag": self._max_lag,
+                "stalls": sum(self._locations.values()),
+            }
@@ -0,0 +1,306 @@
+"""
+In-process request metrics per route template, served in the Prometheus text format.
+
+Every thread records into its own shard without locks; the shards are only merged when scraped. With several worker
+processes, each worker spools its snapshot into a shared directory, merged by the worker serving the scrape, see
+`MetricsSpool`.
+
+Usage:
+>>> registry = MetricsRegistry((0.01, 0.1, 1.0))
+>>> registry.request_started("GET /api/v1/users/{user_id}")
+>>> registry.request_finished("GET /api/v1/users/{user_id}", 200, 0.012)
+>>> render_prometheus(registry.snapshot(), registry.buckets)
+"""
+
+from __future__ import annotations
+
+import bisect
+import math
+import os
+import threading
+import time
+from collections.abc import Callable, Iterable, Mapping
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, NamedTuple
+
+import orjson
+from loguru import logger
+
+# A snapshot of all routes, `{route: {"requests": {status_class: count}, "buckets": [...], "sum": ..., ...}}`,
+# JSON-serializable to be spooled
+Snapshot = dict[str, dict[str, Any]]
+
+
+class Sample(NamedTuple):
+    """A sample besides the request metrics, e.g. the checked-out connections of a pool."""
+
+    name: str
+    value: float
+    labels: Mapping[str, str] = {}
+    # The Prometheus metric type, `gauge`, `counter` (monotonic since the process started) or `histogram`
+    kind: str = "gauge"
+
+
+@dataclass(slots=True)
+class _RouteMetrics:
+    bucket_counts: list[int]
+    requests: dict[str, int] = field(default_factory=dict)
+    latency_sum: float = 0.0
+    in_flight: int = 0
+
+
+class MetricsRegistry:
+    """
+    The request count per status class, the latency histogram and the in-flight requests of each route template.
+
+    :param buckets: the upper bounds of the latency histogram buckets in seconds, ascending
+    """
+
+    def __init__(self, buckets: Iterable[float]) -> None:
+        """Create an empty registry."""
+        self.buckets = tuple(sorted(buckets))
+        self._local = threading.local()
+        self._shards: list[dict[str, _RouteMetrics]] = []
+        self._shards_lock = threading.Lock()
+
+    def _route(self, route: str) -> _RouteMetrics:
+        shard: dict[str, _RouteMetrics] | None = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            # Once per thread
+            with self._shards_lock:
+                self._shards.append(shard)
+        metrics = shard.get(route)
+        if metrics is None:
+            # The last bucket counts the latencies above the largest bound, `+Inf`
+            metrics = shard[route] = _RouteMetrics([0] * (len(self.buckets) + 1))
+        return metrics
+
+    def request_started(self, route: str) -> None:
+        self._route(route).in_flight += 1
+
+    def request_finished(self, route: str, status_code: int, elapsed: float) -> None:
+        """Record a finished request, its status class (e.g. `2xx`) and latency in seconds."""
+        metrics = self._route(route)
+        metrics.in_flight -= 1
+        status_class = f"{status_code // 100}xx"
+        metrics.requests[status_class] = metrics.requests.get(status_class, 0) + 1
+        metrics.bucket_counts[bisect.bisect_left(self.buckets, elapsed)] += 1
+        metrics.latency_sum += elapsed
+
+    def snapshot(self) -> Snapshot:
+        """Merge the shards of all threads."""
+        with self._shards_lock:
+            shards = list(self._shards)
+        return merge_snapshots(
+            {
+                route: {
+                    "requests": dict(metrics.requests),
+                    "buckets": list(metrics.bucket_counts),
+                    "sum": metrics.latency_sum,
+                    "in_flight": metrics.in_flight,
+                }
+                for route, metrics in list(shard.items())
+            }
+            for shard in shards
+        )
+
+
+def merge_snapshots(snapshots: Iterable[Snapshot]) -> Snapshot:
+    """Sum the snapshots of several threads or workers."""
+    merged: Snapshot = {}
+    for snapshot in snapshots:
+        for route, metrics in snapshot.items():
+            total = merged.get(route)
+            if total is None:
+                merged[route] = {**metrics, "requests": dict(metrics["requests"]), "buckets": list(metrics["buckets"])}
+                continue
+            for status_class, count in metrics["requests"].items():
+                total["requests"][status_class] = total["requests"].get(status_class, 0) + count
+            total["buckets"] = [a + b for a, b in zip(total["buckets"], metrics["buckets"], strict=True)]
+            total["sum"] += metrics["sum"]
+            total["in_flight"] += metrics["in_flight"]
+    return merged
+
+
+def statistics_samples(
+    name: str,
+    statistics: Mapping[str, Any],
+    labels: Mapping[str, str] | None = None,
+    counters: Iterable[str] = (),
+) -> list[Sample]:
+    """
+    Convert the numeric values of a statistics dict into samples named `<name>_<key>`.
+
+    :param counters: the keys of the monotonic counters, besides the keys ending with `_total`; the others are gauges
+    """
+    counters = set(counters)
+    return [
+        Sample(
+            f"{name}_{key}", value, labels or {}, "counter" if key in counters or key.endswith("_total") else "gauge"
+        )
+        for key, value in statistics.items()
+        if isinstance(value, int | float) and not isinstance(value, bool)
+    ]
+
+
+def histogram_samples(name: str, buckets: tuple[float, ...], counts: Iterable[int], total: float) -> list[Sample]:
+    """Convert the bucket counts (not cumulative, `+Inf` last) of a histogram into `<name>_bucket`, `_sum`, `_count`."""
+    samples = []
+    cumulative = 0
+    for bound, count in zip((*buckets, math.inf), counts, strict=True):
+        cumulative += count
+        samples.append(Sample(f"{name}_bucket", cumulative, {"le": _number(bound)}, "histogram"))
+    return [
+        *samples,
+        Sample(f"{name}_sum", total, kind="histogram"),
+        Sample(f"{name}_count", cumulative, kind="histogram"),
+    ]
+
+
+def _family(sample: Sample) -> str:
+    """The metric family of a sample, e.g. `<name>` of the `<name>_bucket` sample of a histogram."""
+    if sample.kind == "histogram":
+        for suffix in ("_bucket", "_sum", "_count"):
+            if sample.name.endswith(suffix):
+                return sample.name.removesuffix(suffix)
+    return sample.name
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Mapping[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    if isinstance(value, float) and math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(snapshot: Snapshot, buckets: tuple[float, ...], samples: Iterable[Sample] = ()) -> str:
+    """Render the request metrics and the other samples in the Prometheus text format 0.0.4."""
+    routes = sorted(snapshot.items())
+    lines = [
+        "# HELP http_requests_total The number of finished HTTP requests per route and status class.",
+        "# TYPE http_requests_total counter",
+    ]
+    for route, metrics in routes:
+        for status_class, count in sorted(metrics["requests"].items()):
+            lines.append(f"http_requests_total{_labels({'route': route, 'status': status_class})} {count}")
+    lines += [
+        "# HELP http_request_duration_seconds The latency of the HTTP requests per route.",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for route, metrics in routes:
+        cumulative = 0
+        for bound, count in zip((*buckets, math.inf), metrics["buckets"], strict=True):
+            cumulative += count
+            lines.append(
+                f"http_request_duration_seconds_bucket{_labels({'route': route, 'le': _number(bound)})} {cumulative}"
+            )
+        lines.append(f"http_request_duration_seconds_sum{_labels({'route': route})} {_number(metrics['sum'])}")
+        lines.append(f"http_request_duration_seconds_count{_labels({'route': route})} {cumulative}")
+    lines += [
+        "# HELP http_requests_in_flight The number of HTTP requests in progress per route.",
+        "# TYPE http_requests_in_flight gauge",
+    ]
+    lines += [f"http_requests_in_flight{_labels({'route': route})} {metrics['in_flight']}" for route, metrics in routes]
+    samples_by_family: dict[str, list[Sample]] = {}
+    for sample in samples:
+        samples_by_family.setdefault(_family(sample), []).append(sample)
+    for family, family_samples in sorted(samples_by_family.items()):
+        lines.append(f"# TYPE {family} {family_samples[0].kind}")
+        lines += [f"{sample.name}{_labels(sample.labels)} {_number(sample.value)}" for sample in family_samples]
+    return "\n".join(lines) + "\n"
+
+
+class MetricsSpool:
+    """
+    Share the metrics of several worker processes through a directory, one file per worker.
+
+    Each worker writes its snapshot and samples every `interval` seconds, and right before serving a scrape; the
+    scrape merges all files not older than `3 * interval`, thus the files of stopped workers expire. The samples are
+    labelled with the `pid` of their worker.
+
+    Usage:
+    >>> spool = MetricsSpool(get_data_dir("metrics"), registry, collect_samples, interval=5.0)
+    >>> snapshot, samples = spool.merge()
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        registry: MetricsRegistry,
+        collect_samples: Callable[[], list[Sample]],
+        interval: float = 5.0,
+    ) -> None:
+        """Start the thread writing the file of this worker."""
+        self.directory = directory
+        self.interval = interval
+        self._registry = registry
+        self._collect_samples = collect_samples
+        self._path = directory / f"{os.getpid()}.json"
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-spool", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self._try_write()
+
+    def _try_write(self) -> None:
+        try:
+            self.write()
+        except OSError as e:
+            logger.warning(f"Failed to spool metrics into {self._path}: {e}")
+
+    def write(self) -> None:
+        """Write the snapshot and samples of this worker, atomically replacing its file."""
+        pid = str(os.getpid())
+        content = {
+            "routes": self._registry.snapshot(),
+            "samples": [
+                [name, value, {**labels, "pid": pid}, kind] for name, value, labels, kind in self._collect_samples()
+            ],
+        }
+        temporary_path = self._path.with_suffix(".tmp")
+        temporary_path.write_bytes(orjson.dumps(content))
+        temporary_path.replace(self._path)
+
+    def merge(self) -> tuple[Snapshot, list[Sample]]:
+        """Merge the files of all live workers, after writing the file of this worker."""
+        self.write()
+        expired_before = time.time() - 3 * self.interval
+        snapshots: list[Snapshot] = []
+        samples: list[Sample] = []
+        for path in self.directory.glob("*.json"):
+            content = _read_spool_file(path, expired_before)
+            if content is not None:
+                snapshots.append(content["routes"])
+                samples += [Sample(*sample) for sample in content["samples"]]
+        return merge_snapshots(snapshots), samples
+
+    def stop(self) -> None:
+        """Stop the thread and remove the file of this worker."""
+        self._stopped.set()
+        self._thread.join()
+        self._path.unlink(missing_ok=True)
+
+
+def _read_spool_file(path: Path, expired_before: float) -> dict[str, Any] | None:
+    try:
+        if path.stat().st_mtime < expired_before:
+            # The worker has stopped
+            path.unlink(missing_ok=True)
+            return None
+        return orjson.loads(path.read_bytes())
+    except (OSError, orjson.JSONDecodeError):
+        # Removed or being replaced
+        return None
@@ -1,13 +1,44 @@
 from __future__ import annotations
 
+import asyncio
+import random
+import time
 from contextvars import ContextVar
+from http import HTTPStatus
 from typing import Any
 
 from fastapi import Request, Response
+from fastapi.responses import JSONResponse
 from loguru import logger
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
 from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
-from python_web_service_boilerplate.common.trace import clear_trace_id, generate_trace_id, set_trace_id
+from python_web_service_boilerplate.common import request_profiler
+from python_web_service_boilerplate.common.deadline import (
+    DEADLINE_ATTRIBUTE,
+    deadline_exceeded,
+    deadline_scope,
+    record_deadline_exceeded,
+)
+from python_web_service_boilerplate.common.trace import clear_trace_id, generate_trace_id, get_trace_id, set_trace_id
+from python_web_service_boilerplate.common.tracing import (
+    TRACEPARENT_HEADER,
+    TRACESTATE_HEADER,
+    parse_traceparent,
+    start_server_span,
+    start_span,
+    to_trace_id,
+)
+from python_web_service_boilerplate.configuration.application import settings
+from python_web_service_boilerplate.configuration.database import request_session_scope
+from python_web_service_boilerplate.configuration.loguru import tail_buffer
+from python_web_service_boilerplate.configuration.metrics import metrics
+
+# The scope key of the resolved route template and endpoint, see `resolve_route()`
+_ROUTE_SCOPE_KEY = "route_template"
 
 # Create a context variable
 _http_request_context: ContextVar[Request | None] = ContextVar("http_request")
@@ -18,47 +49,292 @@ class TraceIDMiddleware(BaseHTTPMiddleware):
     Middleware to handle trace ID for each HTTP request.
 
     The middleware will:
-    1. Extract trace ID from request headers (X-Trace-ID) or generate a new one
+    1. Extract trace ID from request headers (W3C traceparent, X-Trace-ID) or generate a new one, a W3C trace ID
+       shared by the logs and the spans
     2. Set it in the context for the duration of the request
-    3. Add it to the response headers
-    4. Log request start and end with trace ID
+    3. Start the server span of the request, sampled as its traceparent parent or by `settings.tracing.sample_rate`
+    4. Add it to the response headers (X-Trace-ID, traceparent and tracestate)
+    5. Log request start and end with trace ID
     """
 
     TRACE_ID_HEADER = "X-Trace-ID"
 
     async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
-        # Extract trace ID from headers or generate a new one
-        trace_id = request.headers.get(self.TRACE_ID_HEADER)
-        if not trace_id:
-            trace_id = generate_trace_id()
+        # Extract trace ID from headers or generate a new one, the W3C traceparent wins
+        parent = parse_traceparent(request.headers.get(TRACEPARENT_HEADER), request.headers.get(TRACESTATE_HEADER))
+        trace_id = parent.trace_id if parent is not None else request.headers.get(self.TRACE_ID_HEADER)
+        # The same trace ID in the logs and the spans, thus a W3C one
+        trace_id = to_trace_id(trace_id) if trace_id else generate_trace_id()
 
         # Set trace ID in context
         set_trace_id(trace_id)
 
         _http_request_context.set(request)
+        if tail_buffer is not None:
+            tail_buffer.start(trace_id)
+        start = time.perf_counter()
 
         # Log request start
         logger.info(f"Request started: {request.method} {request.url.path}")
 
+        failed = True
         try:
-            # Process the request
-            response = await call_next(request)
+            with start_server_span(
+                f"{request.method} {request.url.path}", trace_id, parent, settings.tracing.sample_rate
+            ) as span:
+                if span.context.sampled:
+                    span.set_attribute("http.method", request.method)
+                    span.set_attribute("http.target", request.url.path)
+                # Process the request
+                response = await call_next(request)
+                span.set_attribute("http.status_code", response.status_code)
         except Exception as e:
             # Log error with trace ID
             logger.error(f"Request failed: {request.method} {request.url.path} - Error: {e!s}", e)
             raise e
         else:
+            failed = response.status_code >= HTTPStatus.INTERNAL_SERVER_ERROR.value
             # Add trace ID to response headers
             response.headers[self.TRACE_ID_HEADER] = trace_id
+            response.headers[TRACEPARENT_HEADER] = span.context.traceparent()
+            if span.context.trace_state:
+                response.headers[TRACESTATE_HEADER] = span.context.trace_state
             # Log request completion
             logger.info(f"Request completed: {request.method} {request.url.path} - Status: {response.status_code}")
             return response
         finally:
+            if tail_buffer is not None:
+                _end_tail_buffering(trace_id, failed=failed, elapsed=time.perf_counter() - start)
             # Clean up context
             clear_trace_id()
             _http_request_context.set(None)
 
 
+def _end_tail_buffering(trace_id: str, *, failed: bool, elapsed: float) -> None:
+    """Write the buffered records of a failed or slow request, discard them otherwise."""
+    if tail_buffer is None:
+        return
+    if failed or elapsed > settings.log_tail_latency_threshold:
+        flushed = tail_buffer.flush(trace_id)
+        logger.warning(f"Flushed {flushed} buffered log records, failed: {failed}, elapsed: {elapsed:.3f}s")
+        return
+    tail_buffer.discard(trace_id)
+
+
+class UnitOfWorkMiddleware:
+    """
+    Middleware to share one database session across all repository calls of an HTTP request (unit of work).
+
+    The session is committed (rolled back for 4xx/5xx responses) and released as soon as the handler sends the
+    response start, before a streaming body is iterated, thus streaming endpoints use their own dedicated session.
+    It's a pure ASGI middleware, since `BaseHTTPMiddleware.call_next()` only returns after the response started.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        """Wrap the ASGI app."""
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        async with request_session_scope() as request_session:
+
+            async def send_wrapper(message: Message) -> None:
+                if message["type"] == "http.response.start" and request_session.active:
+                    await request_session.release(commit=message["status"] < 400)
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+
+
+def resolve_route(scope: Scope) -> tuple[str, Any]:
+    """
+    Get the route template of the request, e.g. `GET /api/v1/users/{user_id}`, and its endpoint.
+
+    Resolved once per request, the result is kept in the scope for the other middlewares.
+    """
+    resolved: tuple[str, Any] | None = scope.get(_ROUTE_SCOPE_KEY)
+    if resolved is not None:
+        return resolved
+    resolved = f"{scope['method']} <unmatched>", None
+    router = getattr(scope.get("app"), "router", None)
+    for route in getattr(router, "routes", ()):
+        match, _child_scope = route.matches(scope)
+        if match is Match.FULL:
+            resolved = f"{scope['method']} {getattr(route, 'path', scope['path'])}", getattr(route, "endpoint", None)
+            break
+    scope[_ROUTE_SCOPE_KEY] = resolved
+    return resolved
+
+
+class MetricsMiddleware:
+    """
+    Middleware to record the count, status class and latency of the requests per route template, see `/metrics`.
+
+    The outermost middleware, thus the latency includes all other middlewares.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        """Wrap the ASGI app."""
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route, _endpoint = resolve_route(scope)
+        status_code = HTTPStatus.INTERNAL_SERVER_ERROR.value
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        metrics.request_started(route)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            metrics.request_finished(route, status_code, time.perf_counter() - start)
+
+
+class RequestProfilerMiddleware:
+    """
+    Middleware to profile single requests: of admins sending the `X-Profile: 1` header, or a sampled ratio of all
+    requests (`settings.profiling.request_sample_rate`).
+
+    The profile name is returned in the `X-Profile` response header, the profile is downloadable from
+    `/api/v1/admin/profiles/{name}`. At most one request is profiled at a time per worker. It must be wrapped by
+    `AuthMiddleware`, which sets the scopes of the user.
+    """
+
+    PROFILE_HEADER = "X-Profile"
+
+    def __init__(self, app: ASGIApp) -> None:
+        """Wrap the ASGI app."""
+        self.app = app
+        self._profiling = False
+
+    def _should_profile(self, scope: Scope) -> bool:
+        if self._profiling or not request_profiler.is_available():
+            return False
+        if Headers(scope=scope).get(self.PROFILE_HEADER) == "1":
+            scopes = scope.get("state", {}).get("scopes") or ""
+            return "admin" in scopes.split(",")
+        rate = settings.profiling.request_sample_rate
+        return rate > 0 and random.random() < rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        name = request_profiler.profile_name(get_trace_id())
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers[self.PROFILE_HEADER] = name
+            await send(message)
+
+        profiler = request_profiler.create_profiler()
+        try:
+            profiler.start()
+        except RuntimeError as e:
+            # E.g. the whole application is being profiled
+            logger.warning(f"Failed to profile the request: {e}")
+            await self.app(scope, receive, send)
+            return
+        self._profiling = True
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.stop()
+            self._profiling = False
+            # Rendering takes a while, off the event loop. The response has been sent, thus errors are only logged
+            try:
+                await run_in_threadpool(request_profiler.save_profile, profiler, name)
+            except Exception as e:
+                logger.error(f"Failed to save the profile of the request: {name}, {e!r}")
+
+
+class DeadlineMiddleware:
+    """
+    Middleware to cancel the handler once the request deadline expires, answering 504 Gateway Timeout.
+
+    The deadline is `settings.request_timeout` by default, overridden per route with `@request_deadline()`. Clients
+    can only shorten it with the `X-Request-Timeout` header (seconds). The deadline is kept in a context variable, so
+    the database session applies the remaining budget as statement timeout, see `configuration.database`.
+    It must wrap `UnitOfWorkMiddleware`, so that the request-scoped session of a cancelled handler is rolled back and
+    its connection is returned to the pool.
+    """
+
+    REQUEST_TIMEOUT_HEADER = "X-Request-Timeout"
+
+    def __init__(self, app: ASGIApp) -> None:
+        """Wrap the ASGI app."""
+        self.app = app
+
+    @staticmethod
+    def _resolve_route(scope: Scope) -> tuple[str, float | None]:
+        """Get the route template and its deadline in seconds."""
+        route, endpoint = resolve_route(scope)
+        return route, getattr(endpoint, DEADLINE_ATTRIBUTE, settings.request_timeout)
+
+    def _requested_timeout(self, scope: Scope) -> float | None:
+        value = Headers(scope=scope).get(self.REQUEST_TIMEOUT_HEADER)
+        if value is None:
+            return None
+        try:
+            seconds = float(value)
+        except ValueError:
+            logger.warning(f"Ignored invalid {self.REQUEST_TIMEOUT_HEADER} header: {value}")
+            return None
+        return seconds if seconds > 0 else None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route, seconds = self._resolve_route(scope)
+        requested = self._requested_timeout(scope)
+        if requested is not None:
+            seconds = requested if seconds is None else min(seconds, requested)
+        if seconds is None:
+            with start_span(route, attributes={"http.route": route}):
+                await self.app(scope, receive, send)
+            return
+        response_started = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        timeout = asyncio.timeout(seconds)
+        with deadline_scope(seconds):
+            try:
+                async with timeout:
+                    with start_span(route, attributes={"http.route": route}):
+                        await self.app(scope, receive, send_wrapper)
+            except Exception:
+                # Either cancelled by the timeout, or a statement interrupted by the database
+                if not (timeout.expired() or deadline_exceeded()):
+                    raise
+                record_deadline_exceeded(route)
+                logger.warning(f"Request deadline of {seconds}s exceeded: {route}")
+                if response_started:
+                    # Abort the half-sent response, the server closes the connection
+                    raise
+                response = JSONResponse(
+                    status_code=HTTPStatus.GATEWAY_TIMEOUT.value,
+                    content={"detail": f"Request deadline of {seconds}s exceeded"},
+                )
+                await response(scope, receive, send)
+
+
 def get_current_request() -> Request:
     """Get the current HTTP request from context."""
     http_request = _http_request_context.get()
@@ -0,0 +1,205 @@
+"""
+Helpers for online migrations of large tables, usable from revision scripts.
+
+Usage:
+>>> from python_web_service_boilerplate.common.migration import (
+>>>     backfill,
+>>>     create_index_concurrently,
+>>>     lock_timeout,
+>>> )
+>>>
+>>> def upgrade() -> None:
+>>>     with lock_timeout():
+>>>         op.add_column("user", sa.Column("locale", sa.String(16), nullable=True))
+>>>     backfill("user", {"locale": "en_US"}, where="locale IS NULL")
+>>>     create_index_concurrently("ix_user_locale", "user", ["locale"])
+"""
+
+from __future__ import annotations
+
+import time
+from collections.abc import Generator, Mapping, Sequence
+from contextlib import contextmanager, suppress
+from typing import Any, Final
+
+import sqlalchemy as sa
+from alembic import op
+from loguru import logger
+from sqlalchemy.engine import Connection
+
+DEFAULT_BATCH_SIZE: Final = 10_000
+DEFAULT_LOCK_TIMEOUT: Final = "3s"
+
+
+def _as_table(table: str | sa.Table, columns: Sequence[str]) -> sa.TableClause | sa.Table:
+    if isinstance(table, sa.Table):
+        return table
+    return sa.table(table, *(sa.column(column) for column in columns))
+
+
+def backfill_in_batches(
+    connection: Connection,
+    table: str | sa.Table,
+    values: Mapping[str, Any],
+    *,
+    where: str | sa.ColumnElement[bool] | None = None,
+    primary_key: str = "id",
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    throttle: float = 0.0,
+) -> int:
+    """
+    Update rows in batches by primary key range, so that each batch only locks its own rows for a short time.
+
+    The connection should be in autocommit mode, so that every batch is committed on its own, see `backfill()`.
+
+    :param connection: the connection to run the updates on
+    :param table: the table name or table
+    :param values: the column values to set, can be SQL expressions
+    :param where: the extra criteria of the rows to update, e.g. `locale IS NULL`, to be able to resume
+    :param primary_key: the integer primary key column
+    :param batch_size: the primary key range per batch
+    :param throttle: seconds to sleep between batches, leaving room for the application's writes
+    :return: the number of updated rows
+    """
+    table_clause = _as_table(table, [primary_key, *values])
+    pk = table_clause.c[primary_key]
+    criteria = sa.text(where) if isinstance(where, str) else where
+    min_id, max_id = connection.execute(sa.select(sa.func.min(pk), sa.func.max(pk))).one()
+    if min_id is None:
+        logger.info(f"Backfill skipped, table {table_clause.name} is empty")
+        return 0
+    updated = 0
+    started = time.perf_counter()
+    for low in range(min_id, max_id + 1, batch_size):
+        statement = sa.update(table_clause).where(pk >= low, pk < low + batch_size).values(dict(values))
+        if criteria is not None:
+            statement = statement.where(criteria)
+        updated += connection.execute(statement).rowcount
+        progress = min(1.0, (low + batch_size - min_id) / (max_id - min_id + 1))
+        logger.info(
+            f"Backfilled {updated} rows of {table_clause.name}, {progress:.0%} "
+            f"({primary_key} < {low + batch_size}), elapsed {time.perf_counter() - started:.1f}s"
+        )
+        if throttle > 0:
+            time.sleep(throttle)
+    return updated
+
+
+def backfill(
+    table: str | sa.Table,
+    values: Mapping[str, Any],
+    *,
+    where: str | sa.ColumnElement[bool] | None = None,
+    primary_key: str = "id",
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    throttle: float = 0.0,
+) -> int:
+    """
+    Backfill a column in batches within an Alembic migration, see `backfill_in_batches()`.
+
+    The migration's transaction is committed first, each batch is then committed on its own (autocommit), thus a
+    failed backfill is not rolled back; use `where` to make it resumable.
+    """
+    with op.get_context().autocommit_block():
+        return backfill_in_batches(
+            op.get_bind(),
+            table,
+            values,
+            where=where,
+            primary_key=primary_key,
+            batch_size=batch_size,
+            throttle=throttle,
+        )
+
+
+@contextmanager
+def lock_timeout(
+    timeout: str = DEFAULT_LOCK_TIMEOUT, connection: Connection | None = None
+) -> Generator[None, None, None]:
+    """
+    Fail fast if a DDL statement cannot acquire its lock within the timeout.
+
+    Otherwise, the DDL statement queues behind a long transaction and blocks all the application's queries on the
+    table meanwhile; better fail the deploy and retry later. PostgreSQL sets `lock_timeout` for the current
+    transaction (the migration's). SQLite locks the whole database, its `busy_timeout` is used instead. The previous
+    timeout is restored on exit.
+
+    :param timeout: PostgreSQL interval, e.g. `3s` or `500ms`
+    :param connection: default is the migration's connection
+    """
+    bind = connection if connection is not None else op.get_bind()
+    if bind.dialect.name == "postgresql":
+        previous = bind.exec_driver_sql("SHOW lock_timeout").scalar_one()
+        bind.exec_driver_sql(f"SET LOCAL lock_timeout = '{_interval_ms(timeout)}ms'")
+        try:
+            yield
+        except BaseException:
+            # A failed statement aborts the transaction, whose rollback restores the previous timeout instead
+            with suppress(sa.exc.DBAPIError):
+                _set_local_lock_timeout(bind, previous)
+            raise
+        _set_local_lock_timeout(bind, previous)
+        return
+    if bind.dialect.name == "sqlite":
+        previous = bind.exec_driver_sql("PRAGMA busy_timeout").scalar_one()
+        bind.exec_driver_sql(f"PRAGMA busy_timeout = {_interval_ms(timeout)}")
+        try:
+            yield
+        finally:
+            bind.exec_driver_sql(f"PRAGMA busy_timeout = {int(previous)}")
+        return
+    yield
+
+
+def _set_local_lock_timeout(bind: Connection, value: str) -> None:
+    bind.execute(sa.text("SELECT set_config('lock_timeout', :value, true)"), {"value": value})
+
+
+def _interval_ms(timeout: str) -> int:
+    """Convert `3s`, `500ms` or `1min` into milliseconds."""
+    for suffix, factor in (("ms", 1), ("min", 60_000), ("s", 1000)):
+        if timeout.endswith(suffix):
+            return int(float(timeout.removesuffix(suffix)) * factor)
+    return int(float(timeout))
+
+
+def create_index_concurrently(index_name: str, table_name: str, columns: Sequence[str], **kwargs: Any) -> None:
+    """
+    Create an index without blocking writes, `CREATE INDEX CONCURRENTLY` on PostgreSQL.
+
+    It cannot run inside a transaction, thus the migration's transaction is committed first. If it fails, PostgreSQL
+    leaves an invalid index behind, which is dropped and rebuilt on the next attempt; a valid index is kept. Other
+    databases create the index as usual.
+    """
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        op.create_index(index_name, table_name, list(columns), if_not_exists=True, **kwargs)
+        return
+    with op.get_context().autocommit_block():
+        valid = _is_index_valid(bind, index_name, kwargs.get("schema"))
+        if valid:
+            logger.info(f"Index {index_name} already exists and is valid, skipped")
+            return
+        if valid is not None:
+            logger.warning(f"Index {index_name} is invalid, left by a failed build, rebuilding it")
+            op.drop_index(index_name, table_name=table_name, schema=kwargs.get("schema"), postgresql_concurrently=True)
+        op.create_index(index_name, table_name, list(columns), postgresql_concurrently=True, **kwargs)
+
+
+def _is_index_valid(bind: Connection, index_name: str, schema: str | None) -> bool | None:
+    """Check `pg_index.indisvalid` of the index, in the search path unless `schema` is given; `None` if missing."""
+    statement = sa.text(
+        "SELECT indisvalid FROM pg_index "
+        "WHERE indexrelid = to_regclass(concat_ws('.', quote_ident(:schema), quote_ident(:name)))"
+    )
+    valid: bool | None = bind.execute(statement, {"schema": schema, "name": index_name}).scalar_one_or_none()
+    return valid
+
+
+def drop_index_concurrently(index_name: str, table_name: str) -> None:
+    """Drop an index without blocking writes, `DROP INDEX CONCURRENTLY` on PostgreSQL."""
+    if op.get_bind().dialect.name != "postgresql":
+        op.drop_index(index_name, table_name=table_name, if_exists=True)
+        return
+    with op.get_context().autocommit_block():
+        op.drop_index(index_name, table_name=table_name, postgresql_concurrently=True, if_exists=True)
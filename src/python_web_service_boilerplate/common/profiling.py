@@ -1,20 +1,105 @@
+from __future__ import annotations
+
 import functools
 import inspect
 import os
+import random
+import threading
 import time
+import tracemalloc
+from collections.abc import Coroutine, Generator
+from dataclasses import dataclass
 from datetime import timedelta
 from typing import Any, Callable, TypeVar
 
 import psutil
 from loguru import logger
 
+from python_web_service_boilerplate.common.function_stats import FunctionStatsRegistry
+from python_web_service_boilerplate.configuration.application import MemoryProfileMode, settings
+
 R = TypeVar("R")
+M = TypeVar("M")
+
+# The statistics of the decorated functions, see the admin endpoint `/api/v1/admin/function_stats`
+function_stats = FunctionStatsRegistry(enabled=settings.profiling.enabled, log_every=settings.profiling.log_every)
+
+
+def _safe_measurement(
+    func: Callable[..., Any], begin: Callable[[], M], end: Callable[[M, bool], None]
+) -> tuple[Callable[[], M | None], Callable[[M | None, bool], None]]:
+    """Wrap `begin()` and `end()` to log their errors; a call whose `begin()` failed (`None`) isn't ended."""
+
+    def safe_begin() -> M | None:
+        try:
+            return begin()
+        except Exception as e:
+            logger.warning(f"Failed to measure the call of {func.__qualname__}(): {e!r}")
+            return None
+
+    def safe_end(measurement: M | None, failed: bool) -> None:  # noqa: FBT001
+        if measurement is None:
+            return
+        try:
+            end(measurement, failed)
+        except Exception as e:
+            logger.warning(f"Failed to measure the call of {func.__qualname__}(): {e!r}")
+
+    return safe_begin, safe_end
+
+
+def _instrument(func: Callable[..., Any], begin: Callable[[], M], end: Callable[[M, bool], None]) -> Callable[..., Any]:
+    """
+    Wrap a sync or async function, measuring each call with `begin()` before and `end(measurement, failed)` after it.
+
+    Once `function_stats` is disabled, the wrapper is a plain call of the function. Measuring errors are logged, they
+    never fail the call.
+    """
+    safe_begin, safe_end = _safe_measurement(func, begin, end)
+    if inspect.iscoroutinefunction(func):
+        # Handle async functions
+        # noinspection PyUnresolvedReferences
+        @functools.wraps(func)
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not function_stats.enabled:
+                return await func(*args, **kwargs)
+            measurement = safe_begin()
+            failed = False
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                safe_end(measurement, failed)
+
+        return async_wrapper
+
+    # Handle sync functions
+    # noinspection PyUnresolvedReferences
+    @functools.wraps(func)
+    def sync_wrapper(*args: Any, **kwargs: Any) -> Any:
+        if not function_stats.enabled:
+            return func(*args, **kwargs)
+        measurement = safe_begin()
+        failed = False
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            safe_end(measurement, failed)
+
+    return sync_wrapper
 
 
 def elapsed_time(level: str = "INFO") -> Callable[..., Any]:
     """
     The decorator to monitor the elapsed time of both sync and async functions.
 
+    Every call is recorded into `function_stats`; once it's disabled, the function is called without measuring.
+
     Usage:
 
     * decorate the function with `@elapsed_time()` to profile the function with INFO log
@@ -37,57 +122,19 @@ def elapsed_time(level: str = "INFO") -> Callable[..., Any]:
 
     https://stackoverflow.com/questions/12295974/python-decorators-just-syntactic-sugar
 
-    :param level: logging level, default is "INFO". Available values: ["TRACE", "DEBUG", "INFO", "WARNING", "ERROR"]
+    :param level: logging level of the logged calls (1 in `settings.profiling.log_every`), default is "INFO".
+    Available values: ["TRACE", "DEBUG", "INFO", "WARNING", "ERROR"]
     """
 
     def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
-        if inspect.iscoroutinefunction(func):
-            # Handle async functions
-            # noinspection PyUnresolvedReferences
-            @functools.wraps(func)
-            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
-                start_time = time.perf_counter()
-                try:
-                    return_value = await func(*args, **kwargs)
-                except Exception as e:
-                    elapsed = time.perf_counter() - start_time
-                    logger.log(
-                        level,
-                        f"{func.__module__}.{func.__qualname__}() -> elapsed time: {timedelta(seconds=elapsed)}",
-                    )
-                    raise e
-                elapsed = time.perf_counter() - start_time
-                logger.log(
-                    level,
-                    f"{func.__module__}.{func.__qualname__}() -> elapsed time: {timedelta(seconds=elapsed)}",
-                )
-                return return_value
+        function = f"{func.__module__}.{func.__qualname__}"
 
-            return async_wrapper
-
-        # Handle sync functions
-        # noinspection PyUnresolvedReferences
-        @functools.wraps(func)
-        def sync_wrapper(*args: Any, **kwargs: Any) -> Any:
-            start_time = time.perf_counter()
-            try:
-                return_value = func(*args, **kwargs)
-            except Exception as e:
-                logger.exception(f"Exception raised when executing function: {func.__qualname__}(). Exception: {e}")
-                elapsed = time.perf_counter() - start_time
-                logger.log(
-                    level,
-                    f"{func.__module__}.{func.__qualname__}() -> elapsed time: {timedelta(seconds=elapsed)}",
-                )
-                raise e
+        def record(start_time: float, failed: bool) -> None:  # noqa: FBT001
             elapsed = time.perf_counter() - start_time
-            logger.log(
-                level,
-                f"{func.__module__}.{func.__qualname__}() -> elapsed time: {timedelta(seconds=elapsed)}",
-            )
-            return return_value
+            if function_stats.record(function, "elapsed", elapsed, failed=failed):
+                logger.log(level, f"{function}() -> elapsed time: {timedelta(seconds=elapsed)}")
 
-        return sync_wrapper
+        return _instrument(func, time.perf_counter, record)
 
     return decorator
 
@@ -103,19 +150,128 @@ def _get_memory_usage() -> int:
     return mem_info.rss
 
 
-def _get_cpu_usage() -> float:
+class _CpuTimedCoroutine:
+    """
+    Await a coroutine, summing the CPU time of its own steps.
+
+    The thread CPU time between two steps belongs to the other tasks of the event loop, thus it's not counted.
     """
-    Getting cpu_percent non-blocking (percentage since last call).
 
-    :return: CPU usage
+    __slots__ = ("_coroutine", "cpu_time")
+
+    def __init__(self, coroutine: Coroutine[Any, Any, Any]) -> None:
+        """Wrap the coroutine, not started yet."""
+        self._coroutine = coroutine
+        self.cpu_time = 0.0
+
+    def __await__(self) -> Generator[Any, Any, Any]:
+        send: Any = None
+        error: BaseException | None = None
+        while True:
+            start = time.thread_time()
+            try:
+                yielded = self._coroutine.send(send) if error is None else self._coroutine.throw(error)
+            except StopIteration as e:
+                return e.value
+            finally:
+                self.cpu_time += time.thread_time() - start
+            try:
+                send, error = (yield yielded), None
+            except GeneratorExit:
+                self._coroutine.close()
+                raise
+            except BaseException as e:
+                # E.g. the cancellation of the task, thrown into the coroutine
+                send, error = None, e
+
+
+@dataclass(slots=True)
+class _TracemallocCall:
+    # `None` if tracemalloc was started by this call, thus every traced allocation was made since
+    before: tracemalloc.Snapshot | None
+
+
+_tracemalloc_lock = threading.Lock()
+# The users of tracemalloc in progress (sampled calls, the leak detector), tracemalloc is stopped after the last one if
+# it was started by them
+_tracemalloc_users = 0
+_tracemalloc_started = False
+# The allocations of tracemalloc and this module are not reported
+_TRACEMALLOC_FILTERS = (
+    tracemalloc.Filter(inclusive=False, filename_pattern=tracemalloc.__file__),
+    tracemalloc.Filter(inclusive=False, filename_pattern=__file__),
+)
+
+
+def acquire_tracemalloc(frames: int) -> bool:
     """
-    return psutil.cpu_percent()
+    Start tracing the allocations unless traced already, until the matching `release_tracemalloc()`.
+
+    Every user of tracemalloc in this process must acquire and release it, so that no user stops tracing under another.
 
+    :param frames: the frames traced per allocation, if tracing is started by this call
+    :return: whether tracing was started by this call, thus every traced allocation was made since
+    """
+    global _tracemalloc_users, _tracemalloc_started
+    with _tracemalloc_lock:
+        _tracemalloc_users += 1
+        if tracemalloc.is_tracing():
+            return False
+        tracemalloc.start(frames)
+        _tracemalloc_started = True
+        return True
+
+
+def release_tracemalloc() -> None:
+    """Stop tracing the allocations after the last user, unless tracing was started otherwise (`PYTHONTRACEMALLOC`)."""
+    global _tracemalloc_users, _tracemalloc_started
+    with _tracemalloc_lock:
+        _tracemalloc_users = max(0, _tracemalloc_users - 1)
+        if _tracemalloc_users == 0 and _tracemalloc_started:
+            tracemalloc.stop()
+            _tracemalloc_started = False
+
+
+def _start_tracemalloc_call() -> _TracemallocCall | None:
+    """Start tracing the allocations of a sampled call, `None` if the call isn't sampled."""
+    if random.random() >= settings.profiling.memory_sample_rate:
+        return None
+    if acquire_tracemalloc(settings.profiling.tracemalloc_frames):
+        return _TracemallocCall(None)
+    try:
+        return _TracemallocCall(tracemalloc.take_snapshot())
+    except BaseException:
+        release_tracemalloc()
+        raise
+
+
+def _stop_tracemalloc_call(call: _TracemallocCall) -> list[tuple[str, int]]:
+    """
+    Get the net retained bytes per source line since the call started, then stop tracing after the last user.
 
-def mem_profile(level: str = "INFO") -> Callable[..., Any]:
+    Concurrent sampled calls see the allocations of each other.
+    """
+    try:
+        after = tracemalloc.take_snapshot().filter_traces(_TRACEMALLOC_FILTERS)
+    finally:
+        release_tracemalloc()
+    if call.before is None:
+        statistics = [(statistic.traceback[0], statistic.size) for statistic in after.statistics("lineno")]
+    else:
+        statistics = [
+            (statistic.traceback[0], statistic.size_diff)
+            for statistic in after.compare_to(call.before.filter_traces(_TRACEMALLOC_FILTERS), "lineno")
+            if statistic.size_diff
+        ]
+    return [(f"{frame.filename}:{frame.lineno}", size) for frame, size in statistics]
+
+
+def mem_profile(level: str = "INFO", mode: MemoryProfileMode | None = None) -> Callable[..., Any]:
     """
     The decorator to monitor the memory usage of both sync and async functions.
 
+    Every call is recorded into `function_stats`; once it's disabled, the function is called without measuring.
+
     Usage:
 
     * decorate the function with `@mem_profile()` to profile the function with INFO log
@@ -136,62 +292,46 @@ def mem_profile(level: str = "INFO") -> Callable[..., Any]:
     >>> async def some_async_function():
     >>>    pass
 
+    * decorate the function with `@mem_profile(mode="tracemalloc")` to get the net retained bytes and the top
+    allocating source lines, of a sample of the calls (`settings.profiling.memory_sample_rate`)
+    >>> @mem_profile(mode="tracemalloc")
+    >>> def some_function():
+    >>>    pass
+
     https://stackoverflow.com/questions/12295974/python-decorators-just-syntactic-sugar
 
-    :param level: logging level, default is "INFO". Available values: ["TRACE", "DEBUG", "INFO", "WARNING", "ERROR"]
+    :param level: logging level of the logged calls (1 in `settings.profiling.log_every`), default is "INFO".
+    Available values: ["TRACE", "DEBUG", "INFO", "WARNING", "ERROR"]
+    :param mode: `rss` (the growth of the process' resident memory, noisy under concurrency) or `tracemalloc`,
+    default is `settings.profiling.memory_mode`
     """
 
     def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
-        if inspect.iscoroutinefunction(func):
-            # Handle async functions
-            # noinspection PyUnresolvedReferences
-            @functools.wraps(func)
-            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
-                mem_before = _get_memory_usage()
-                try:
-                    return_value = await func(*args, **kwargs)
-                except Exception as e:
-                    mem_after = _get_memory_usage()
-                    logger.log(
-                        level,
-                        f"{func.__module__}.{func.__qualname__}() -> Mem before: {mem_before}, mem after: {mem_after}, "
-                        f"delta: {(mem_after - mem_before) / (1024 * 1024):.2f} MB",
-                    )
-                    raise e
-                mem_after = _get_memory_usage()
-                logger.log(
-                    level,
-                    f"{func.__module__}.{func.__qualname__}() -> Mem before: {mem_before}, mem after: {mem_after}, "
-                    f"delta: {(mem_after - mem_before) / (1024 * 1024):.2f} MB",
-                )
-                return return_value
-
-            return async_wrapper
+        function = f"{func.__module__}.{func.__qualname__}"
 
-        # Handle sync functions
-        # noinspection PyUnresolvedReferences
-        @functools.wraps(func)
-        def sync_wrapper(*args: Any, **kwargs: Any) -> Any:
-            mem_before = _get_memory_usage()
-            try:
-                return_value = func(*args, **kwargs)
-            except Exception as e:
-                mem_after = _get_memory_usage()
+        def record(mem_before: int, failed: bool) -> None:  # noqa: FBT001
+            mem_after = _get_memory_usage()
+            # The growth of the resident memory, in bytes
+            if function_stats.record(function, "memory", max(0, mem_after - mem_before), failed=failed):
                 logger.log(
                     level,
-                    f"{func.__module__}.{func.__qualname__}() -> Mem before: {mem_before}, mem after: {mem_after}, "
+                    f"{function}() -> Mem before: {mem_before}, mem after: {mem_after}, "
                     f"delta: {(mem_after - mem_before) / (1024 * 1024):.2f} MB",
                 )
-                raise e
-            mem_after = _get_memory_usage()
-            logger.log(
-                level,
-                f"{func.__module__}.{func.__qualname__}() -> Mem before: {mem_before}, mem after: {mem_after}, "
-                f"delta: {(mem_after - mem_before) / (1024 * 1024):.2f} MB",
-            )
-            return return_value
 
-        return sync_wrapper
+        def record_allocations(call: _TracemallocCall | None, failed: bool) -> None:  # noqa: FBT001
+            if call is None:
+                return
+            allocations = _stop_tracemalloc_call(call)
+            retained = sum(size for _line, size in allocations)
+            function_stats.record_allocations(function, (allocation for allocation in allocations if allocation[1] > 0))
+            if function_stats.record(function, "memory", retained, failed=failed):
+                top = sorted(allocations, key=lambda allocation: allocation[1], reverse=True)[:3]
+                logger.log(level, f"{function}() -> retained: {retained} bytes, top allocations: {top}")
+
+        if (mode or settings.profiling.memory_mode) == "tracemalloc":
+            return _instrument(func, _start_tracemalloc_call, record_allocations)
+        return _instrument(func, _get_memory_usage, record)
 
     return decorator
 
@@ -200,6 +340,12 @@ def cpu_profile(level: str = "INFO") -> Callable[..., Any]:
     """
     The decorator to monitor the CPU usage of both sync and async functions.
 
+    Every call is recorded into `function_stats`; once it's disabled, the function is called without measuring. The
+    `cpu` metric is the CPU time of the thread running the call in seconds; for async functions, only the steps of the
+    coroutine are counted, not the other tasks running on the event loop while it awaits. The `cpu_ratio` metric is
+    the CPU time divided by the wall time, which tells CPU-bound functions, which should move off the event loop
+    (e.g. `@async_function`), from I/O-bound ones.
+
     Usage:
 
     * decorate the function with `@cpu_profile()` to profile the function with INFO log
@@ -222,59 +368,49 @@ def cpu_profile(level: str = "INFO") -> Callable[..., Any]:
 
     https://stackoverflow.com/questions/12295974/python-decorators-just-syntactic-sugar
 
-    :param level: logging level, default is "INFO". Available values: ["TRACE", "DEBUG", "INFO", "WARNING", "ERROR"]
+    :param level: logging level of the logged calls (1 in `settings.profiling.log_every`), default is "INFO".
+    Available values: ["TRACE", "DEBUG", "INFO", "WARNING", "ERROR"]
     """
 
     def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        function = f"{func.__module__}.{func.__qualname__}"
+
+        def record(cpu_time: float, wall_time: float, *, failed: bool) -> None:
+            # Close to 1 for CPU-bound functions, which block the event loop; close to 0 for I/O-bound functions
+            ratio = cpu_time / wall_time if wall_time > 0 else 0.0
+            function_stats.record(function, "cpu_ratio", ratio, failed=failed)
+            if function_stats.record(function, "cpu", cpu_time, failed=failed):
+                logger.log(
+                    level,
+                    f"{function}() -> CPU time: {timedelta(seconds=cpu_time)}, "
+                    f"wall time: {timedelta(seconds=wall_time)}, CPU/wall: {ratio:.2f}",
+                )
+
         if inspect.iscoroutinefunction(func):
             # Handle async functions
             # noinspection PyUnresolvedReferences
             @functools.wraps(func)
             async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
-                cpu_before = _get_cpu_usage()
+                if not function_stats.enabled:
+                    return await func(*args, **kwargs)
+                timed_coroutine = _CpuTimedCoroutine(func(*args, **kwargs))
+                start_time = time.perf_counter()
+                failed = False
                 try:
-                    return_value = await func(*args, **kwargs)
-                except Exception as e:
-                    cpu_after = _get_cpu_usage()
-                    logger.log(
-                        level,
-                        f"{func.__module__}.{func.__qualname__}() -> CPU before: {cpu_before}, CPU after: {cpu_after}, "
-                        f"delta: {(cpu_after - cpu_before):.2f}",
-                    )
-                    raise e
-                cpu_after = _get_cpu_usage()
-                logger.log(
-                    level,
-                    f"{func.__module__}.{func.__qualname__}() -> CPU before: {cpu_before}, CPU after: {cpu_after}, "
-                    f"delta: {(cpu_after - cpu_before):.2f}",
-                )
-                return return_value
+                    return await timed_coroutine
+                except Exception:
+                    failed = True
+                    raise
+                finally:
+                    record(timed_coroutine.cpu_time, time.perf_counter() - start_time, failed=failed)
 
             return async_wrapper
 
-        # Handle sync functions
-        # noinspection PyUnresolvedReferences
-        @functools.wraps(func)
-        def sync_wrapper(*args: Any, **kwargs: Any) -> Any:
-            cpu_before = _get_cpu_usage()
-            try:
-                return_value = func(*args, **kwargs)
-            except Exception as e:
-                cpu_after = _get_cpu_usage()
-                logger.log(
-                    level,
-                    f"{func.__module__}.{func.__qualname__}() -> CPU before: {cpu_before}, CPU after: {cpu_after}, "
-                    f"delta: {(cpu_after - cpu_before):.2f}",
-                )
-                raise e
-            cpu_after = _get_cpu_usage()
-            logger.log(
-                level,
-                f"{func.__module__}.{func.__qualname__}() -> CPU before: {cpu_before}, CPU after: {cpu_after}, "
-                f"delta: {(cpu_after - cpu_before):.2f}",
-            )
-            return return_value
-
-        return sync_wrapper
+        def record_sync(start: tuple[float, float], failed: bool) -> None:  # noqa: FBT001
+            start_cpu_time, start_time = start
+            record(time.thread_time() - start_cpu_time, time.perf_counter() - start_time, failed=failed)
+
+        # Handle sync functions, run on a single thread
+        return _instrument(func, lambda: (time.thread_time(), time.perf_counter()), record_sync)
 
     return decorator
@@ -0,0 +1,92 @@
+"""
+Profile single HTTP requests with pyinstrument, a sampling profiler, see `RequestProfilerMiddleware`.
+
+The profiles are stored under `data/profiles`, named after the time and trace ID of the request, as pyinstrument's
+HTML report or speedscope JSON (https://www.speedscope.app). pyinstrument is a main dependency, so requests can be
+profiled in production too; without it, requests are never profiled.
+"""
+
+from __future__ import annotations
+
+import re
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Final
+
+from loguru import logger
+
+from python_web_service_boilerplate.common.common_function import get_data_dir
+from python_web_service_boilerplate.configuration.application import ProfileFormat, settings
+
+if TYPE_CHECKING:
+    from pyinstrument import Profiler
+
+try:
+    import pyinstrument
+    from pyinstrument.renderers import SpeedscopeRenderer
+
+    _AVAILABLE = True
+except ImportError:
+    _AVAILABLE = False
+
+_EXTENSIONS: Final[dict[ProfileFormat, str]] = {"html": ".html", "speedscope": ".speedscope.json"}
+_PROFILE_NAME_PATTERN: Final = re.compile(r"^[\w-]+(\.html|\.speedscope\.json)$")
+_UNSAFE_CHARACTERS: Final = re.compile(r"[^\w-]")
+
+
+def is_available() -> bool:
+    return _AVAILABLE
+
+
+def create_profiler() -> Profiler:
+    """Create a profiler of the current async context (task) only, not the other requests served concurrently."""
+    if not _AVAILABLE:
+        msg = "pyinstrument is not installed"
+        raise RuntimeError(msg)
+    return pyinstrument.Profiler(interval=settings.profiling.request_interval, async_mode="enabled")
+
+
+def profile_name(trace_id: str | None) -> str:
+    """Name the profile of a request after the current time and its trace ID, safe as a file name."""
+    safe_trace_id = _UNSAFE_CHARACTERS.sub("_", trace_id or "none")[:64]
+    return f"{time.strftime('%Y%m%d-%H%M%S')}_{safe_trace_id}{_EXTENSIONS[settings.profiling.request_format]}"
+
+
+def save_profile(profiler: Profiler, name: str) -> Path:
+    """Render and write the profile, then delete the oldest profiles beyond `settings.profiling.request_max_files`."""
+    session = profiler.last_session
+    if session is None:
+        msg = "The profiler has not been run"
+        raise RuntimeError(msg)
+    directory = get_data_dir("profiles")
+    if name.endswith(_EXTENSIONS["speedscope"]):
+        content = profiler.output(renderer=SpeedscopeRenderer())
+    else:
+        content = profiler.output_html()
+    path = directory / name
+    path.write_text(content, encoding="utf-8")
+    # Only the profiles, not the other files of the directory
+    profiles = [file for file in directory.iterdir() if _PROFILE_NAME_PATTERN.match(file.name)]
+    newest_first = sorted(profiles, key=lambda file: file.stat().st_mtime, reverse=True)
+    for expired in newest_first[settings.profiling.request_max_files :]:
+        expired.unlink(missing_ok=True)
+    logger.warning(f"Saved the profile of the request: {path}, duration: {session.duration:.3f}s")
+    return path
+
+
+def list_profiles() -> list[dict[str, Any]]:
+    """Get the name, size and creation time of the stored profiles, newest first."""
+    profiles = [
+        {"name": path.name, "size": stat.st_size, "created_at": stat.st_mtime}
+        for path in get_data_dir("profiles").iterdir()
+        if _PROFILE_NAME_PATTERN.match(path.name) and (stat := path.stat())
+    ]
+    return sorted(profiles, key=lambda profile: profile["created_at"], reverse=True)
+
+
+def get_profile(name: str) -> Path | None:
+    """Get the path of a stored profile, `None` if it doesn't exist or the name is not a profile name."""
+    if not _PROFILE_NAME_PATTERN.match(name):
+        return None
+    path = get_data_dir("profiles") / name
+    return path if path.is_file() else None
@@ -0,0 +1,107 @@
+"""
+A compact in-memory time series of the resource usage of the process, see `configuration.resources`.
+
+Usage:
+>>> series = ResourceSeries(capacity=8640)
+>>> series.append({**sample_process(psutil.Process()), "thread_pool_queue": 0, ...})
+>>> series.series(since=time.time() - 3600)
+"""
+
+from __future__ import annotations
+
+import gc
+import threading
+import time
+from array import array
+from collections.abc import Mapping
+from typing import Final
+
+import psutil
+
+# The columns of a sample, all stored as floats
+RESOURCE_FIELDS: Final = (
+    "timestamp",
+    # Bytes
+    "rss",
+    # User + system CPU seconds since the process started
+    "cpu_time",
+    "open_fds",
+    "threads",
+    # Tasks waiting for a thread of `configuration.thread_pool.executor`
+    "thread_pool_queue",
+    "thread_pool_threads",
+    # Summed over the async pools
+    "db_pool_checked_out",
+    "db_pool_overflow",
+    # Summed over the generations, since the process started
+    "gc_collections",
+    "gc_collected",
+    "gc_uncollectable",
+)
+
+
+def sample_process(process: psutil.Process) -> dict[str, float]:
+    """Sample the memory, CPU time, file descriptors, threads and garbage collection of a process."""
+    with process.oneshot():
+        cpu_times = process.cpu_times()
+        sample = {
+            "timestamp": time.time(),
+            "rss": process.memory_info().rss,
+            "cpu_time": cpu_times.user + cpu_times.system,
+            # File handles on Windows
+            "open_fds": process.num_fds() if hasattr(process, "num_fds") else process.num_handles(),
+            "threads": process.num_threads(),
+        }
+    generations = gc.get_stats()
+    for key in ("collections", "collected", "uncollectable"):
+        sample[f"gc_{key}"] = sum(generation[key] for generation in generations)
+    return sample
+
+
+class ResourceSeries:
+    """
+    A ring buffer of the last `capacity` samples, one float array per field of `RESOURCE_FIELDS`.
+
+    8 bytes per field and sample, e.g. a day every 10 seconds takes about 830 KB.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        """Create an empty series."""
+        self.capacity = capacity
+        self._columns = {field: array("d", bytes(8 * capacity)) for field in RESOURCE_FIELDS}
+        # The number of samples appended so far, the next one is written at `_count % capacity`
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Get the number of kept samples."""
+        return min(self._count, self.capacity)
+
+    def append(self, sample: Mapping[str, float]) -> None:
+        """Append a sample, overwriting the oldest one once full; missing fields are stored as 0."""
+        with self._lock:
+            index = self._count % self.capacity
+            for field, column in self._columns.items():
+                column[index] = sample.get(field, 0.0)
+            self._count += 1
+
+    def _indexes(self, last: int) -> list[int]:
+        kept = min(self._count, self.capacity, last)
+        return [(self._count - kept + offset) % self.capacity for offset in range(kept)]
+
+    def series(self, since: float | None = None) -> dict[str, list[float]]:
+        """Get the kept samples from `since` (POSIX timestamp) on, oldest first, as a list per field."""
+        with self._lock:
+            timestamps = self._columns["timestamp"]
+            indexes = [index for index in self._indexes(self.capacity) if since is None or timestamps[index] >= since]
+            return {field: [column[index] for index in indexes] for field, column in self._columns.items()}
+
+    def mean(self, last: int) -> dict[str, float]:
+        """Get the mean of each field over the `last` samples, the downsampled value of the period."""
+        with self._lock:
+            indexes = self._indexes(last)
+            if not indexes:
+                return {}
+            return {
+                field: sum(column[index] for index in indexes) / len(indexes) for field, column in self._columns.items()
+            }
@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import threading
+import urllib.request
+from collections import deque
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Final, Protocol
+
+import orjson
+from loguru import logger
+
+if TYPE_CHECKING:
+    from python_web_service_boilerplate.common.tracing import Span
+
+_STATUS_CODE_ERROR: Final = 2
+DEFAULT_MAX_BYTES: Final = 10 * 1024 * 1024
+DEFAULT_BACKUPS: Final = 5
+
+
+class SpanExporter(Protocol):
+    def export(self, spans: list[Span]) -> None: ...
+
+
+def _attribute_value(value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        # 64-bit integers are strings in OTLP/JSON
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _attributes(attributes: dict[str, Any]) -> list[dict[str, Any]]:
+    return [{"key": key, "value": _attribute_value(value)} for key, value in attributes.items()]
+
+
+def to_otlp(spans: list[Span], service_name: str) -> dict[str, Any]:
+    """Convert spans into an OTLP/JSON `ExportTraceServiceRequest`."""
+    otlp_spans = []
+    for span in spans:
+        otlp_span: dict[str, Any] = {
+            "traceId": span.context.trace_id,
+            "spanId": span.context.span_id,
+            "name": span.name,
+            "kind": int(span.kind),
+            "startTimeUnixNano": str(span.start_time_ns),
+            "endTimeUnixNano": str(span.end_time_ns),
+            "attributes": _attributes(span.attributes),
+        }
+        if span.parent_span_id:
+            otlp_span["parentSpanId"] = span.parent_span_id
+        if span.context.trace_state:
+            otlp_span["traceState"] = span.context.trace_state
+        if span.error:
+            otlp_span["status"] = {"code": _STATUS_CODE_ERROR, "message": span.error}
+        otlp_spans.append(otlp_span)
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": _attributes({"service.name": service_name})},
+                "scopeSpans": [{"scope": {"name": service_name}, "spans": otlp_spans}],
+            }
+        ]
+    }
+
+
+class OtlpJsonFileExporter:
+    """
+    Append each batch as one line of OTLP/JSON, the format of the OpenTelemetry Collector's file exporter.
+
+    Once the file would exceed `max_bytes`, it's rotated to `<path>.1`, the older files shifted up to `<path>.<backups>`
+    and the oldest one deleted.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        service_name: str,
+        *,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        backups: int = DEFAULT_BACKUPS,
+    ) -> None:
+        """Create the exporter, the file is opened for every batch."""
+        self.path = path
+        self.service_name = service_name
+        self.max_bytes = max_bytes
+        self.backups = backups
+
+    def export(self, spans: list[Span]) -> None:
+        line = orjson.dumps(to_otlp(spans, self.service_name), option=orjson.OPT_APPEND_NEWLINE)
+        if self.path.exists() and self.path.stat().st_size + len(line) > self.max_bytes:
+            self._rotate()
+        with self.path.open("ab") as file:
+            file.write(line)
+
+    def _rotate(self) -> None:
+        self.path.with_name(f"{self.path.name}.{self.backups}").unlink(missing_ok=True)
+        for index in range(self.backups - 1, 0, -1):
+            backup = self.path.with_name(f"{self.path.name}.{index}")
+            if backup.exists():
+                backup.replace(self.path.with_name(f"{self.path.name}.{index + 1}"))
+        if self.backups > 0:
+            self.path.replace(self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink(missing_ok=True)
+
+
+class OtlpHttpExporter:
+    """POST each batch as OTLP/JSON to a collector, e.g. `http://localhost:4318/v1/traces`."""
+
+    def __init__(self, endpoint: str, service_name: str, timeout: float = 5.0) -> None:
+        """Create the exporter of the collector endpoint."""
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.timeout = timeout
+
+    def export(self, spans: list[Span]) -> None:
+        request = urllib.request.Request(  # noqa: S310
+            self.endpoint,
+            data=orjson.dumps(to_otlp(spans, self.service_name)),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout):  # noqa: S310
+            pass
+
+
+class BatchSpanProcessor:
+    """
+    Queue the ended spans, exported in batches by a background thread.
+
+    Ending a span only appends it to a bounded queue; once it's full, spans are dropped and counted instead of
+    blocking the request.
+
+    Usage:
+    >>> processor = BatchSpanProcessor(OtlpJsonFileExporter(Path("spans.jsonl"), "my-service"))
+    >>> set_span_processor(processor)
+    """
+
+    def __init__(
+        self,
+        exporter: SpanExporter,
+        *,
+        max_queue_size: int = 2048,
+        batch_size: int = 512,
+        schedule_delay: float = 1.0,
+    ) -> None:
+        """Start the export thread."""
+        self._exporter = exporter
+        self._max_queue_size = max_queue_size
+        self._batch_size = batch_size
+        self._schedule_delay = schedule_delay
+        self._queue: deque[Span] = deque()
+        self._lock = threading.Lock()
+        self._batch_ready = threading.Condition(self._lock)
+        self._export_lock = threading.Lock()
+        self._stopped = False
+        self._exported = 0
+        self._dropped = 0
+        self._failed = 0
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def on_end(self, span: Span) -> None:
+        with self._lock:
+            if len(self._queue) >= self._max_queue_size:
+                self._dropped += 1
+                return
+            self._queue.append(span)
+            if len(self._queue) >= self._batch_size:
+                self._batch_ready.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if not self._stopped and len(self._queue) < self._batch_size:
+                    self._batch_ready.wait(self._schedule_delay)
+                if self._stopped:
+                    return
+            self.force_flush()
+
+    def force_flush(self) -> None:
+        """Export all queued spans."""
+        with self._export_lock:
+            while True:
+                with self._lock:
+                    batch = [self._queue.popleft() for _ in range(min(self._batch_size, len(self._queue)))]
+                if not batch:
+                    return
+                self._export(batch)
+
+    def _export(self, batch: list[Span]) -> None:
+        try:
+            self._exporter.export(batch)
+        except Exception as e:
+            with self._lock:
+                self._failed += len(batch)
+            logger.warning(f"Failed to export {len(batch)} spans: {e}")
+            return
+        with self._lock:
+            self._exported += len(batch)
+
+    def shutdown(self) -> None:
+        """Stop the export thread and export the remaining spans."""
+        with self._lock:
+            if self._stopped:
+                return
+            self._stopped = True
+            self._batch_ready.notify()
+        self._thread.join()
+        self.force_flush()
+
+    def statistics(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "queued": len(self._queue),
+                "exported": self._exported,
+                "dropped": self._dropped,
+                "failed": self._failed,
+            }
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import functools
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Final
+
+from loguru import logger
+
+if TYPE_CHECKING:
+    from loguru import Message, Record
+
+# The extra key of the records written by `TailBuffer.flush()`, which pass the level filter of the sinks
+TAIL_BUFFERED: Final = "tail_buffered"
+# The estimated size of a record besides its message, in bytes
+_RECORD_OVERHEAD: Final = 512
+
+
+@dataclass
+class _TraceBuffer:
+    records: deque[Record] = field(default_factory=deque)
+    size: int = 0
+
+
+class TailBuffer:
+    """
+    Buffer the low-level records of each request (trace) in memory, written only if the request turns out to be bad.
+
+    The middleware calls `start()` when a request starts, and `flush()` if it fails, returns 5xx or is slow, otherwise
+    `discard()`. Once a trace holds `max_records_per_trace` records, its oldest records are dropped; once all traces
+    hold `max_bytes`, new records are dropped.
+
+    Usage:
+    >>> tail_buffer = TailBuffer()
+    >>> logger.add(tail_buffer.capture, level="DEBUG", filter=lambda record: record["level"].no < INFO)
+    >>> tail_buffer.start(trace_id)
+    >>> tail_buffer.flush(trace_id) if failed else tail_buffer.discard(trace_id)
+    """
+
+    def __init__(self, *, max_records_per_trace: int = 1000, max_bytes: int = 16 * 1024 * 1024) -> None:
+        """Create an empty buffer with its memory limits."""
+        self.max_records_per_trace = max_records_per_trace
+        self.max_bytes = max_bytes
+        self._traces: dict[str, _TraceBuffer] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self._flushed = 0
+        self._discarded = 0
+        self._dropped = 0
+
+    def start(self, trace_id: str) -> None:
+        """Start buffering the records of a trace."""
+        with self._lock:
+            self._traces.setdefault(trace_id, _TraceBuffer())
+
+    def is_buffering(self, trace_id: str | None) -> bool:
+        return trace_id is not None and trace_id in self._traces
+
+    def capture(self, message: Message) -> None:
+        """Buffer the record of the message, the sink function; records of traces not started are ignored."""
+        record = message.record
+        trace_id = record["extra"].get("trace_id")
+        size = len(record["message"]) + _RECORD_OVERHEAD
+        with self._lock:
+            trace = self._traces.get(trace_id) if trace_id else None
+            if trace is None:
+                return
+            if self._size + size > self.max_bytes:
+                self._dropped += 1
+                return
+            if len(trace.records) >= self.max_records_per_trace:
+                oldest = trace.records.popleft()
+                oldest_size = len(oldest["message"]) + _RECORD_OVERHEAD
+                trace.size -= oldest_size
+                self._size -= oldest_size
+                self._dropped += 1
+            trace.records.append(record)
+            trace.size += size
+            self._size += size
+
+    def flush(self, trace_id: str) -> int:
+        """Write the buffered records of a trace to the sinks, then stop buffering it; return the number of records."""
+        trace = self._pop(trace_id)
+        if trace is None:
+            return 0
+        with self._lock:
+            self._flushed += 1
+        for record in trace.records:
+            # Keep the time, location and extra of the original record
+            logger.patch(functools.partial(_restore, original=record)).log(record["level"].name, record["message"])
+        return len(trace.records)
+
+    def discard(self, trace_id: str) -> None:
+        """Drop the buffered records of a trace, then stop buffering it."""
+        if self._pop(trace_id) is not None:
+            with self._lock:
+                self._discarded += 1
+
+    def statistics(self) -> dict[str, int]:
+        """Get the memory usage and the counts of flushed and discarded traces."""
+        with self._lock:
+            return {
+                "buffered_traces": len(self._traces),
+                "buffered_bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "flushed_traces": self._flushed,
+                "discarded_traces": self._discarded,
+                "dropped_records": self._dropped,
+            }
+
+    def _pop(self, trace_id: str) -> _TraceBuffer | None:
+        with self._lock:
+            trace = self._traces.pop(trace_id, None)
+            if trace is not None:
+                self._size -= trace.size
+            return trace
+
+
+def _restore(record: Record, original: Record) -> None:
+    for key in ("time", "elapsed", "name", "module", "file", "function", "line", "process", "thread", "exception"):
+        record[key] = original[key]
+    record["extra"] = {**original["extra"], TAIL_BUFFERED: True}
@@ -0,0 +1,207 @@
+"""
+A lightweight span API with W3C Trace Context (`traceparent`/`tracestate`) propagation.
+
+The server span of a request decides the sampling (head sampling): a sampled parent from the `traceparent` header is
+followed, otherwise a ratio of the trace IDs is sampled. Inside an unsampled request, `start_span()` only reads a
+context variable and creates nothing. Ended spans are handed to the span processor, see `BatchSpanProcessor`.
+
+Usage:
+>>> with start_span("render report", attributes={"report.id": 42}) as span:
+>>>     ...
+"""
+
+from __future__ import annotations
+
+import enum
+import hashlib
+import os
+import re
+import time
+from collections.abc import Generator, Mapping
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Final, Protocol
+
+TRACEPARENT_HEADER: Final = "traceparent"
+TRACESTATE_HEADER: Final = "tracestate"
+_TRACEPARENT_PATTERN: Final = re.compile(r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+_TRACE_ID_PATTERN: Final = re.compile(r"^[0-9a-f]{32}$")
+_INVALID_TRACE_ID: Final = "0" * 32
+_INVALID_SPAN_ID: Final = "0" * 16
+_SAMPLED_FLAG: Final = 0x01
+
+
+class SpanKind(enum.IntEnum):
+    """The span kinds, valued as in OTLP."""
+
+    INTERNAL = 1
+    SERVER = 2
+    CLIENT = 3
+
+
+@dataclass(frozen=True, slots=True)
+class SpanContext:
+    trace_id: str
+    span_id: str
+    sampled: bool
+    trace_state: str = ""
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+
+@dataclass(slots=True)
+class Span:
+    name: str
+    context: SpanContext
+    parent_span_id: str | None
+    kind: SpanKind = SpanKind.INTERNAL
+    start_time_ns: int = field(default_factory=time.time_ns)
+    end_time_ns: int = 0
+    attributes: dict[str, Any] = field(default_factory=dict)
+    error: str | None = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_exception(self, exception: BaseException) -> None:
+        self.error = f"{type(exception).__name__}: {exception}"
+
+    def end(self) -> None:
+        """End the span, a sampled span is handed to the span processor."""
+        if self.end_time_ns:
+            return
+        self.end_time_ns = time.time_ns()
+        if self.context.sampled and _span_processor is not None:
+            _span_processor.on_end(self)
+
+
+class SpanProcessor(Protocol):
+    def on_end(self, span: Span) -> None: ...
+
+
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+_span_processor: SpanProcessor | None = None
+
+
+def set_span_processor(processor: SpanProcessor | None) -> None:
+    """Set the processor of the ended spans, `None` to drop them."""
+    global _span_processor
+    _span_processor = processor
+
+
+def generate_span_id() -> str:
+    return os.urandom(8).hex()
+
+
+def is_valid_trace_id(trace_id: str | None) -> bool:
+    """Check whether the trace ID is a W3C trace ID, 32 lowercase hex digits and not all zeros."""
+    return trace_id is not None and trace_id != _INVALID_TRACE_ID and _TRACE_ID_PATTERN.match(trace_id) is not None
+
+
+def to_trace_id(value: str) -> str:
+    """
+    Derive a W3C trace ID from a trace ID of another format, e.g. of the `X-Trace-ID` header.
+
+    A UUID becomes its 32 hex digits, any other value is hashed, so the same value always gets the same trace ID.
+    """
+    trace_id = value.strip().lower().replace("-", "")
+    if is_valid_trace_id(trace_id):
+        return trace_id
+    return hashlib.sha256(value.encode()).hexdigest()[:32]
+
+
+def parse_traceparent(traceparent: str | None, tracestate: str | None = None) -> SpanContext | None:
+    """
+    Parse the W3C `traceparent` header, e.g. `00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01`.
+
+    :return: the span context of the remote parent, `None` if the header is missing or invalid
+    """
+    if not traceparent:
+        return None
+    match = _TRACEPARENT_PATTERN.match(traceparent.strip().lower())
+    if match is None:
+        return None
+    version, trace_id, span_id, flags = match.groups()
+    if version == "ff" or trace_id == _INVALID_TRACE_ID or span_id == _INVALID_SPAN_ID:
+        return None
+    return SpanContext(trace_id, span_id, bool(int(flags, 16) & _SAMPLED_FLAG), (tracestate or "").strip())
+
+
+def should_sample(trace_id: str, rate: float) -> bool:
+    """Sample a ratio of the trace IDs, by their lower 64 bits, thus every service decides the same way."""
+    return int(trace_id[16:], 16) < rate * 2**64
+
+
+def get_current_span() -> Span | None:
+    return _current_span.get()
+
+
+def is_sampled() -> bool:
+    span = _current_span.get()
+    return span is not None and span.context.sampled
+
+
+@contextmanager
+def start_server_span(
+    name: str, trace_id: str, parent: SpanContext | None, sample_rate: float
+) -> Generator[Span, None, None]:
+    """
+    Start the root span of an incoming request, which decides the sampling of the whole request.
+
+    :param name: the span name, e.g. `GET /api/v1/users`
+    :param trace_id: the W3C trace ID, of `parent` if any
+    :param parent: the remote parent from the `traceparent` header, its sampling decision is followed
+    :param sample_rate: the ratio of the requests without parent to sample
+    """
+    sampled = parent.sampled if parent is not None else should_sample(trace_id, sample_rate)
+    span = Span(
+        name=name,
+        context=SpanContext(trace_id, generate_span_id(), sampled, parent.trace_state if parent is not None else ""),
+        parent_span_id=parent.span_id if parent is not None else None,
+        kind=SpanKind.SERVER,
+    )
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.record_exception(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end()
+
+
+@contextmanager
+def start_span(
+    name: str, *, kind: SpanKind = SpanKind.INTERNAL, attributes: Mapping[str, Any] | None = None
+) -> Generator[Span | None, None, None]:
+    """Start a child span of the current span, nothing is created (`None`) if the request is not sampled."""
+    parent = _current_span.get()
+    if parent is None or not parent.context.sampled:
+        yield None
+        return
+    span = create_span(name, parent, kind=kind, attributes=attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.record_exception(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end()
+
+
+def create_span(
+    name: str, parent: Span, *, kind: SpanKind = SpanKind.INTERNAL, attributes: Mapping[str, Any] | None = None
+) -> Span:
+    """Create a child span without making it current, for callbacks ending it elsewhere, e.g. SQLAlchemy events."""
+    return Span(
+        name=name,
+        context=SpanContext(parent.context.trace_id, generate_span_id(), parent.context.sampled),
+        parent_span_id=parent.context.span_id,
+        kind=kind,
+        attributes=dict(attributes) if attributes else {},
+    )
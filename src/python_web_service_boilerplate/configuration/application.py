@@ -1,3 +1,5 @@
+from __future__ import annotations
+
 from pathlib import Path
 from typing import Final, Literal
 
@@ -29,6 +31,10 @@ with _pyproject_toml_file.open("rb") as file:
 
 
 LogLevel = Literal["TRACE", "DEBUG", "INFO", "SUCCESS", "WARNING", "ERROR", "CRITICAL"]
+LogFormat = Literal["text", "json"]
+SpanExporterType = Literal["file", "http", "none"]
+MemoryProfileMode = Literal["rss", "tracemalloc"]
+ProfileFormat = Literal["html", "speedscope"]
 
 
 class DatabaseSettings(BaseSettings):
@@ -45,6 +51,164 @@ class DatabaseSettings(BaseSettings):
     password: str = Field(default="password")
     db_name: str = "boilerplate_db"
     sql_log_enabled: bool = True
+    # Bulkheads: separate async connection pools, so that long streams and background jobs never starve the short
+    # queries of HTTP requests, see `DatabasePool`
+    oltp_pool_size: int = 5
+    oltp_max_overflow: int = 10
+    oltp_pool_timeout: float = 30.0
+    stream_pool_size: int = 2
+    stream_max_overflow: int = 3
+    stream_pool_timeout: float = 5.0
+    background_pool_size: int = 1
+    background_max_overflow: int = 2
+    background_pool_timeout: float = 30.0
+    # Connections of the async pools idle for `pool_validation_interval` seconds are pinged at checkout, instead of a
+    # ping on every checkout. A connection found dead at use time triggers one immediate retry of idempotent reads, see
+    # `idempotent_read()`
+    pool_pre_ping: bool = False
+    pool_validation_interval: float = 30.0
+    # The sync engine only serves APScheduler's job store and legacy sync callers, keep its pool small
+    sync_pool_size: int = 1
+    sync_max_overflow: int = 2
+    # Resilience: idempotent reads are retried with jittered backoff, the circuit breaker fails fast once
+    # `circuit_breaker_failure_threshold` consecutive connection errors occurred
+    retry_attempts: int = 3
+    retry_max_wait: float = 1.0
+    circuit_breaker_failure_threshold: int = 5
+    circuit_breaker_recovery_timeout: float = 30.0
+    # Refuse to start if the Alembic revision of the database differs from the application's, otherwise only log it
+    schema_version_strict: bool = True
+
+
+class TracingSettings(BaseSettings):
+    """Tracing configuration settings."""
+
+    model_config = SettingsConfigDict(
+        env_prefix="TRACING_",
+        case_sensitive=False,
+    )
+
+    # Head sampling: the ratio of the requests without a sampled `traceparent` to trace, 0 disables it
+    sample_rate: float = 0.1
+    # `file` appends OTLP/JSON lines to `data/traces/spans.jsonl`, `http` posts them to `otlp_endpoint`, `none` drops
+    # them. Off by default: the spans hold the SQL statements, their parameters are bound thus not included
+    exporter: SpanExporterType = "none"
+    otlp_endpoint: str = "http://localhost:4318/v1/traces"
+    # The file is rotated at `file_max_bytes`, keeping `file_backups` rotated files, e.g. `spans.jsonl.1`
+    file_max_bytes: int = 10 * 1024 * 1024
+    file_backups: int = 5
+    # The bounded queue of the ended spans, exported in batches every `schedule_delay` seconds
+    max_queue_size: int = 2048
+    batch_size: int = 512
+    schedule_delay: float = 1.0
+
+
+def _default_latency_buckets() -> list[float]:
+    return [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+
+class MetricsSettings(BaseSettings):
+    """Metrics configuration settings."""
+
+    model_config = SettingsConfigDict(
+        env_prefix="METRICS_",
+        case_sensitive=False,
+    )
+
+    # The upper bounds of the request latency histogram buckets in seconds
+    latency_buckets: list[float] = Field(default_factory=_default_latency_buckets)
+    # Merge the metrics of several worker processes, spooled into `data/metrics` every `spool_interval` seconds
+    multiprocess: bool = False
+    spool_interval: float = 5.0
+
+
+def _default_loop_lag_buckets() -> list[float]:
+    return [0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0]
+
+
+class LoopMonitorSettings(BaseSettings):
+    """Event loop lag monitor configuration settings."""
+
+    model_config = SettingsConfigDict(
+        env_prefix="LOOP_MONITOR_",
+        case_sensitive=False,
+    )
+
+    enabled: bool = True
+    # The lag is measured every `interval` seconds, from `threshold` seconds the stack of the blocking call is logged
+    interval: float = 0.05
+    threshold: float = 0.1
+    # The upper bounds of the lag histogram buckets in seconds
+    lag_buckets: list[float] = Field(default_factory=_default_loop_lag_buckets)
+    # Raise `BlockingCallError` on synchronous database sessions (`db_context()`) used by coroutines, for development
+    strict: bool = False
+
+
+class ResourceSettings(BaseSettings):
+    """Process resource sampling configuration settings."""
+
+    model_config = SettingsConfigDict(
+        env_prefix="RESOURCES_",
+        case_sensitive=False,
+    )
+
+    # Sample the resource usage every `interval` seconds by APScheduler, the last `capacity` samples are kept in memory
+    enabled: bool = True
+    interval: float = 10.0
+    capacity: int = 8640
+    # Save the mean of every `persist_every` samples into the `resource_sample` table for `retention_days`, 0 to disable
+    persist_every: int = 30
+    retention_days: int = 7
+
+
+class LeakDetectorSettings(BaseSettings):
+    """Memory leak detector configuration settings."""
+
+    model_config = SettingsConfigDict(
+        env_prefix="LEAK_DETECTOR_",
+        case_sensitive=False,
+    )
+
+    # Take a census of the objects and allocations every `interval` seconds from startup, otherwise started at runtime,
+    # see `/api/v1/admin/leak_detector`
+    enabled: bool = False
+    interval: float = 300.0
+    # Report the object types and allocation lines (`frames` deep) grown at each of the last `intervals` intervals
+    intervals: int = 5
+    frames: int = 1
+    limit: int = 20
+
+
+class ProfilingSettings(BaseSettings):
+    """Profiling configuration settings."""
+
+    model_config = SettingsConfigDict(
+        env_prefix="PROFILING_",
+        case_sensitive=False,
+    )
+
+    # `@elapsed_time`, `@mem_profile` and `@cpu_profile` aggregate every call into statistics, see
+    # `/api/v1/admin/function_stats`, and log 1 in `log_every` calls per function, 0 logs none
+    enabled: bool = True
+    log_every: int = 0
+    # `@mem_profile` measures the growth of the resident memory (`rss`), or the net retained bytes per source line of
+    # `memory_sample_rate` of the calls (`tracemalloc`), tracing `tracemalloc_frames` frames
+    memory_mode: MemoryProfileMode = "rss"
+    memory_sample_rate: float = 0.01
+    tracemalloc_frames: int = 1
+    # Requests of admins with the `X-Profile: 1` header, and `request_sample_rate` of all requests, are profiled by
+    # pyinstrument every `request_interval` seconds; the newest `request_max_files` profiles are kept under
+    # `data/profiles`, see `/api/v1/admin/profiles`
+    request_sample_rate: float = 0.0
+    request_format: ProfileFormat = "html"
+    request_interval: float = 0.001
+    request_max_files: int = 100
+    # The background sampler of the stacks of all threads at `sampler_rate` Hz, counted per window of `sampler_window`
+    # seconds, the last `sampler_windows` windows are kept, see `/api/v1/admin/stack_samples`
+    sampler_enabled: bool = False
+    sampler_rate: float = 19.0
+    sampler_window: float = 60.0
+    sampler_windows: int = 10
 
 
 def _default_logger() -> dict[str, LogLevel]:
@@ -63,9 +227,31 @@ class Settings(BaseSettings):
 
     offline: bool = False
     log_level: LogLevel = "DEBUG"
+    # `json` writes JSON lines to the console in batches, for log shippers, see `BatchedJsonSink`
+    log_format: LogFormat = "text"
+    # The max number of records buffered by the JSON sink, newer records are dropped once it's full
+    log_buffer_size: int = 10_000
+    # `diagnose` logs the values of variables in tracebacks, which might leak sensitive data in production
+    log_backtrace: bool = True
+    log_diagnose: bool = False
+    # Tail-based logging: the records from `log_tail_level` up to `log_level` of each request are buffered in memory,
+    # written only if the request fails, returns 5xx or takes longer than `log_tail_latency_threshold` seconds
+    log_tail_buffering: bool = False
+    log_tail_level: LogLevel = "DEBUG"
+    log_tail_latency_threshold: float = 1.0
+    log_tail_max_records: int = 1000
+    log_tail_max_bytes: int = 16 * 1024 * 1024
     logger: dict[str, LogLevel] = Field(default_factory=_default_logger)
     intercepted_loggers: list[str] = Field(default_factory=lambda: ["sqlalchemy.engine.Engine"])
+    # Default deadline of HTTP requests in seconds, overridden per route with `@request_deadline()`, `None` to disable
+    request_timeout: float | None = 30.0
     database: DatabaseSettings = Field(default_factory=DatabaseSettings)
+    tracing: TracingSettings = Field(default_factory=TracingSettings)
+    metrics: MetricsSettings = Field(default_factory=MetricsSettings)
+    loop_monitor: LoopMonitorSettings = Field(default_factory=LoopMonitorSettings)
+    resources: ResourceSettings = Field(default_factory=ResourceSettings)
+    leak_detector: LeakDetectorSettings = Field(default_factory=LeakDetectorSettings)
+    profiling: ProfilingSettings = Field(default_factory=ProfilingSettings)
 
 
 settings: Final[Settings] = Settings()
@@ -1,4 +1,5 @@
 from apscheduler.executors.pool import ThreadPoolExecutor
+from apscheduler.jobstores.memory import MemoryJobStore
 from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from apscheduler.schedulers.background import BackgroundScheduler
 from loguru import logger
@@ -6,18 +7,19 @@ from tzlocal import get_localzone
 
 from python_web_service_boilerplate.common.common_function import get_cpu_count
 from python_web_service_boilerplate.common.profiling import elapsed_time
-from python_web_service_boilerplate.configuration.database import sync_engine
+from python_web_service_boilerplate.configuration.database import get_sync_engine
 
 # https://apscheduler.readthedocs.io/en/3.x/userguide.html#configuring-the-scheduler
 # https://crontab.guru/
 
-jobstores = {"default": SQLAlchemyJobStore(engine=sync_engine)}
 executors = {"default": ThreadPoolExecutor(max_workers=get_cpu_count() * 2)}
 job_defaults = {"coalesce": False, "max_instances": 3}
 
 
+MEMORY_JOB_STORE = "memory"
+
+# The SQLAlchemy job store is added in `configure()`, so that the sync engine is only created when the scheduler starts
 scheduler = BackgroundScheduler(
-    jobstores=jobstores,
     executors=executors,
     job_defaults=job_defaults,
     timezone=get_localzone(),
@@ -26,6 +28,9 @@ scheduler = BackgroundScheduler(
 
 def configure() -> None:
     """Configure APScheduler."""
+    scheduler.add_jobstore(SQLAlchemyJobStore(engine=get_sync_engine()), alias="default")
+    # The jobs of each worker process, e.g. sampling its own resources, not shared through the database
+    scheduler.add_jobstore(MemoryJobStore(), alias=MEMORY_JOB_STORE)
     scheduler.start()
     logger.warning(f"APSScheduler configured, with SQLAlchemy job store: {scheduler}")
 
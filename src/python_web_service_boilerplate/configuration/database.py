@@ -1,23 +1,47 @@
 from __future__ import annotations
 
-from collections.abc import AsyncGenerator, Generator
+import enum
+import errno
+import functools
+import inspect
+import threading
+import time
+from collections.abc import AsyncGenerator, Awaitable, Generator
 from contextlib import asynccontextmanager, contextmanager
-from typing import Any
+from contextvars import ContextVar
+from dataclasses import dataclass
+from math import ceil
+from pathlib import Path
+from typing import Any, Callable, Final, TypeVar
 
 import orjson
+from alembic.script import ScriptDirectory
 from loguru import logger
-from sqlalchemy import create_engine, text
-from sqlalchemy.engine import Engine
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Connection, Engine, ExceptionContext
+from sqlalchemy.exc import DBAPIError, DisconnectionError
 from sqlalchemy.ext.asyncio import (
+    AsyncConnection,
+    AsyncEngine,
     async_sessionmaker,
     create_async_engine,
 )
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import ORMExecuteState, SessionTransaction, sessionmaker, with_loader_criteria
+from sqlalchemy.orm.util import LoaderCriteriaOption
+from sqlalchemy.pool import ConnectionPoolEntry, Pool
+from sqlalchemy.util import await_only
 from sqlmodel import Session, SQLModel
 from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlmodel.main import default_registry
+from tenacity import AsyncRetrying, RetryCallState, retry_if_exception, stop_after_attempt, wait_random_exponential
 
+from python_web_service_boilerplate.common.circuit_breaker import CircuitBreaker
 from python_web_service_boilerplate.common.common_function import get_data_dir, get_module_name, offline_environment
+from python_web_service_boilerplate.common.deadline import get_deadline
+from python_web_service_boilerplate.common.loop_monitor import check_not_on_loop
+from python_web_service_boilerplate.common.tracing import SpanKind, create_span, get_current_span
 from python_web_service_boilerplate.configuration.application import settings
+from python_web_service_boilerplate.core.common_models import Deleted
 
 DATABASE_URL = (
     (
@@ -36,6 +60,27 @@ ASYNC_DATABASE_URL = (
     else f"sqlite+aiosqlite:///{get_data_dir()}/{get_module_name()}.db"
 )
 
+R = TypeVar("R")
+
+_ALEMBIC_DIR: Final = Path(__file__).parent.parent / "alembic"
+
+# SQLite calls the progress handler every N virtual machine instructions, to check the request deadline
+_SQLITE_PROGRESS_HANDLER_INSTRUCTIONS: Final = 1000
+_SQLITE_DEADLINE_INFO_KEY: Final = "sqlite_deadline"
+# The SQLSTATEs of the connection-level errors, the class of the connection exceptions, and the server shutting down
+# or starting up
+_CONNECTION_SQLSTATE_CLASS: Final = "08"
+_SERVER_UNAVAILABLE_SQLSTATES: Final = frozenset({"57P01", "57P02", "57P03"})
+# The errnos of the network errors without a `ConnectionError` subclass of their own
+_NETWORK_ERRNOS: Final = frozenset({errno.EHOSTUNREACH, errno.EHOSTDOWN, errno.ENETUNREACH, errno.ENETDOWN})
+# The connection info key of the spans of the executing statements, and the length the statements are truncated to
+_SPANS_INFO_KEY: Final = "spans"
+# The connection info key of the time the connection was returned to the pool, see `validate_idle_connections()`
+_CHECKED_IN_AT_INFO_KEY: Final = "checked_in_at"
+_SPAN_STATEMENT_MAX_LENGTH: Final = 1000
+# The execution option to opt out of the global soft-delete filter, e.g. `select(User).execution_options(...)`
+INCLUDE_DELETED: Final = "include_deleted"
+
 
 def orjson_serializer(obj: Any) -> str:
     """
@@ -45,96 +90,578 @@ def orjson_serializer(obj: Any) -> str:
     return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NAIVE_UTC).decode()
 
 
-# Synchronous engine and session setup (backward compatibility)
-sync_engine: Engine = create_engine(
-    DATABASE_URL,
-    json_serializer=orjson_serializer,
-    json_deserializer=orjson.loads,
-    pool_use_lifo=True,
-    pool_pre_ping=True,
-    pool_recycle=3600,
-    echo=settings.database.sql_log_enabled,
-)
+class DatabasePool(enum.Enum):
+    """
+    The connection pool bulkheads, each with its own size limits (see `DatabaseSettings`).
 
-_SessionLocal = sessionmaker(
-    bind=sync_engine, class_=Session, autocommit=False, autoflush=False, expire_on_commit=False
-)
+    Exhausting one pool, e.g. by many stream viewers, never blocks the checkouts of another, e.g. logins.
+    """
 
-# Async engine and session setup
-__async_engine = create_async_engine(
-    ASYNC_DATABASE_URL,
-    json_serializer=orjson_serializer,
-    json_deserializer=orjson.loads,
-    pool_use_lifo=True,
-    pool_pre_ping=True,
-    pool_recycle=3600,
-    echo=settings.database.sql_log_enabled,
-)
+    # Short queries of HTTP requests
+    OLTP = "oltp"
+    # Long-running reads, e.g. streaming or exports
+    STREAM = "stream"
+    # Scheduled and background jobs
+    BACKGROUND = "background"
+
+
+def validate_idle_connections(engine: AsyncEngine, max_idle: float) -> None:
+    """
+    Ping a connection at checkout once it has been idle in the pool for `max_idle` seconds, replacing it if dead.
+
+    It replaces `pool_pre_ping`, which costs a round trip on every checkout: connections in steady use are never
+    pinged, and only the connection being checked out is validated, the other idle ones stay available to concurrent
+    requests.
+    """
+    dialect = engine.dialect
+
+    def record_checkin(_dbapi_connection: Any, connection_record: ConnectionPoolEntry) -> None:
+        connection_record.info[_CHECKED_IN_AT_INFO_KEY] = time.monotonic()
+
+    def ping_if_idle(dbapi_connection: Any, connection_record: ConnectionPoolEntry, _connection_proxy: Any) -> None:
+        checked_in_at = connection_record.info.get(_CHECKED_IN_AT_INFO_KEY)
+        if checked_in_at is None or time.monotonic() - checked_in_at < max_idle:
+            return
+        try:
+            dialect.do_ping(dbapi_connection)
+        except Exception as e:
+            # The pool invalidates the connection and checks out a new one
+            msg = f"Idle connection found dead: {e!s}"
+            raise DisconnectionError(msg) from e
+
+    event.listen(engine.sync_engine.pool, "checkin", record_checkin)
+    event.listen(engine.sync_engine.pool, "checkout", ping_if_idle)
+
+
+@dataclass(slots=True)
+class _GuardedCall:
+    # Set once the driver opens a new connection for the call, not while waiting for a connection of the pool
+    connecting: bool = False
+
+
+# The guarded call checking out the connection of its session, see `_connect()`
+_connecting_call: ContextVar[_GuardedCall | None] = ContextVar("connecting_call", default=None)
+
+
+def _mark_driver_connect(*_args: Any) -> None:
+    """Mark the guarded call opening a new connection, the listener of the `do_connect` event of the engines."""
+    call = _connecting_call.get()
+    if call is not None:
+        call.connecting = True
+
+
+def _create_async_engine(pool: DatabasePool) -> AsyncEngine:
+    engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        json_serializer=orjson_serializer,
+        json_deserializer=orjson.loads,
+        pool_size=getattr(settings.database, f"{pool.value}_pool_size"),
+        max_overflow=getattr(settings.database, f"{pool.value}_max_overflow"),
+        pool_timeout=getattr(settings.database, f"{pool.value}_pool_timeout"),
+        pool_use_lifo=True,
+        pool_pre_ping=settings.database.pool_pre_ping,
+        pool_recycle=3600,
+        echo=settings.database.sql_log_enabled,
+    )
+    if not settings.database.pool_pre_ping:
+        validate_idle_connections(engine, settings.database.pool_validation_interval)
+    event.listen(engine.sync_engine, "do_connect", _mark_driver_connect)
+    return engine
+
+
+def _create_session_factory(engine: AsyncEngine) -> async_sessionmaker[AsyncSession]:
+    return async_sessionmaker(
+        bind=engine, class_=AsyncSession, autocommit=False, autoflush=False, expire_on_commit=False
+    )
+
+
+# Async engine and session setup, the OLTP pool is created eagerly, the others on first use
+async_engine: AsyncEngine = _create_async_engine(DatabasePool.OLTP)
+_async_engines: dict[DatabasePool, AsyncEngine] = {DatabasePool.OLTP: async_engine}
+_session_factories: dict[DatabasePool, async_sessionmaker[AsyncSession]] = {
+    DatabasePool.OLTP: _create_session_factory(async_engine)
+}
+
+
+def get_async_engine(pool: DatabasePool = DatabasePool.OLTP) -> AsyncEngine:
+    """Get the async engine of the pool (bulkhead), creating it lazily on first use."""
+    engine = _async_engines.get(pool)
+    if engine is None:
+        engine = _async_engines[pool] = _create_async_engine(pool)
+        _session_factories[pool] = _create_session_factory(engine)
+        logger.warning(f"Async engine of the {pool.value} pool created lazily, pool: {engine.pool.status()}")
+    return engine
+
+
+def _get_session_factory(pool: DatabasePool) -> async_sessionmaker[AsyncSession]:
+    get_async_engine(pool)
+    return _session_factories[pool]
+
+
+def get_pool_statistics() -> dict[str, dict[str, int]]:
+    """Get the checked-out connections and limits of the created async pools, for health checks and metrics."""
+    statistics: dict[str, dict[str, int]] = {}
+    for pool, engine in _async_engines.items():
+        queue_pool = engine.pool
+        statistics[pool.value] = {
+            "size": queue_pool.size(),  # type: ignore[attr-defined]
+            "checked_out": queue_pool.checkedout(),  # type: ignore[attr-defined]
+            "overflow": max(0, queue_pool.overflow()),  # type: ignore[attr-defined]
+            "max_overflow": getattr(settings.database, f"{pool.value}_max_overflow"),
+        }
+    return statistics
 
-_AsyncSessionLocal = async_sessionmaker(
-    bind=__async_engine, class_=AsyncSession, autocommit=False, autoflush=False, expire_on_commit=False
-)
+
+# Synchronous engine and session setup (backward compatibility).
+# Only APScheduler's job store and legacy sync callers need it, so it is created on first use with a small pool
+# instead of holding a second full-size pool of connections in every worker.
+_sync_engine: Engine | None = None
+_sync_engine_lock = threading.Lock()
+_SessionLocal = sessionmaker(class_=Session, autocommit=False, autoflush=False, expire_on_commit=False)
+
+
+def get_sync_engine() -> Engine:
+    """Get the synchronous engine, creating it lazily on first use."""
+    global _sync_engine
+    if _sync_engine is not None:
+        return _sync_engine
+    with _sync_engine_lock:
+        if _sync_engine is None:
+            _sync_engine = create_engine(
+                DATABASE_URL,
+                json_serializer=orjson_serializer,
+                json_deserializer=orjson.loads,
+                pool_size=settings.database.sync_pool_size,
+                max_overflow=settings.database.sync_max_overflow,
+                pool_use_lifo=True,
+                pool_pre_ping=True,
+                pool_recycle=3600,
+                echo=settings.database.sql_log_enabled,
+            )
+            logger.warning(
+                f"Sync engine created lazily, name: {_sync_engine.name}, "
+                f"pool_size: {settings.database.sync_pool_size}, max_overflow: {settings.database.sync_max_overflow}"
+            )
+    return _sync_engine
 
 
 def get_db() -> Generator[Session, None, None]:
-    with _SessionLocal() as session:
+    if settings.loop_monitor.strict:
+        check_not_on_loop("Synchronous database session")
+    with _SessionLocal(bind=get_sync_engine()) as session:
         yield session
 
 
+@dataclass(slots=True)
+class _SqliteDeadline:
+    """The SQLite progress handler, interrupting the running statement once the deadline passed."""
+
+    deadline: float | None = None
+
+    def __call__(self) -> int:
+        return int(self.deadline is not None and time.monotonic() >= self.deadline)
+
+
+@event.listens_for(Session, "after_begin")
+def _apply_deadline(_session: Session, _transaction: SessionTransaction, connection: Connection) -> None:
+    """
+    Pass the remaining budget of the request deadline to the database, see `DeadlineMiddleware`.
+
+    PostgreSQL gets a per-transaction `statement_timeout`. SQLite has no statement timeout, a progress handler is
+    installed once per connection instead, and the deadline it checks is updated on every transaction begin.
+    """
+    deadline = get_deadline()
+    if connection.dialect.name == "postgresql":
+        if deadline is not None:
+            timeout_ms = max(1, ceil((deadline - time.monotonic()) * 1000))
+            connection.exec_driver_sql(f"SET LOCAL statement_timeout = {timeout_ms}")
+        return
+    if connection.dialect.name != "sqlite":
+        return
+    info = connection.connection.info
+    handler: _SqliteDeadline | None = info.get(_SQLITE_DEADLINE_INFO_KEY)
+    if handler is None:
+        if deadline is None:
+            return
+        handler = info[_SQLITE_DEADLINE_INFO_KEY] = _SqliteDeadline()
+        result = connection.connection.driver_connection.set_progress_handler(  # type: ignore[union-attr]
+            handler, _SQLITE_PROGRESS_HANDLER_INSTRUCTIONS
+        )
+        if inspect.isawaitable(result):
+            # aiosqlite runs the call in its own thread
+            await_only(result)
+    handler.deadline = deadline
+
+
+@event.listens_for(Pool, "checkin")
+def _clear_deadline(_dbapi_connection: Any, connection_record: ConnectionPoolEntry) -> None:
+    """Don't let the deadline of a finished request interrupt the next user of the connection."""
+    handler: _SqliteDeadline | None = connection_record.info.get(_SQLITE_DEADLINE_INFO_KEY)
+    if handler is not None:
+        handler.deadline = None
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_statement_span(
+    connection: Connection, _cursor: Any, statement: str, _parameters: Any, _context: Any, _executemany: Any
+) -> None:
+    """Time the statement in a child span of the current span, only if the request is sampled."""
+    parent = get_current_span()
+    if parent is None or not parent.context.sampled:
+        return
+    span = create_span(
+        "db.query",
+        parent,
+        kind=SpanKind.CLIENT,
+        attributes={"db.system": connection.dialect.name, "db.statement": statement[:_SPAN_STATEMENT_MAX_LENGTH]},
+    )
+    connection.info.setdefault(_SPANS_INFO_KEY, []).append(span)
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _end_statement_span(
+    connection: Connection, _cursor: Any, _statement: str, _parameters: Any, _context: Any, _executemany: Any
+) -> None:
+    spans = connection.info.get(_SPANS_INFO_KEY)
+    if spans:
+        spans.pop().end()
+
+
+@event.listens_for(Engine, "handle_error")
+def _fail_statement_span(context: ExceptionContext) -> None:
+    spans = context.connection.info.get(_SPANS_INFO_KEY) if context.connection is not None else None
+    if spans:
+        span = spans.pop()
+        span.record_exception(context.original_exception)
+        span.end()
+
+
+_soft_delete_criteria: tuple[int, tuple[LoaderCriteriaOption, ...]] = (0, ())
+
+
+def _get_soft_delete_criteria() -> tuple[LoaderCriteriaOption, ...]:
+    """Get the `deleted == N` criteria of all tables having the `deleted` flag, rebuilt once models were added."""
+    global _soft_delete_criteria
+    mappers = default_registry.mappers
+    if _soft_delete_criteria[0] != len(mappers):
+        criteria = tuple(
+            with_loader_criteria(mapper.class_, lambda cls: cls.deleted == Deleted.N, include_aliases=True)
+            for mapper in mappers
+            if "deleted" in mapper.columns
+        )
+        _soft_delete_criteria = (len(mappers), criteria)
+    return _soft_delete_criteria[1]
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _filter_soft_deleted(execute_state: ORMExecuteState) -> None:
+    """
+    Exclude soft-deleted rows from all ORM selects, unless the `INCLUDE_DELETED` execution option is set.
+
+    Usage:
+    >>> await db.exec(select(User).execution_options(**{INCLUDE_DELETED: True}))
+
+    https://docs.sqlalchemy.org/en/20/orm/session_events.html#adding-global-where-on-criteria
+    """
+    if (
+        execute_state.is_select
+        and not execute_state.is_column_load
+        and not execute_state.is_relationship_load
+        and not execute_state.execution_options.get(INCLUDE_DELETED, False)
+    ):
+        execute_state.statement = execute_state.statement.options(*_get_soft_delete_criteria())
+
+
+# Circuit breaker shared by all database calls of the worker, see `async_db_context()`
+db_circuit_breaker = CircuitBreaker(
+    "database",
+    failure_threshold=settings.database.circuit_breaker_failure_threshold,
+    recovery_timeout=settings.database.circuit_breaker_recovery_timeout,
+)
+
+
+def _is_network_error(error: BaseException | None) -> bool:
+    # ConnectionError (reset, refused, aborted, broken pipe) and TimeoutError are subclasses of OSError
+    return isinstance(error, (ConnectionError, TimeoutError)) or (
+        isinstance(error, OSError) and error.errno in _NETWORK_ERRNOS
+    )
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """
+    Check if the error is a connection-level error (e.g. during a failover).
+
+    Transient errors count as circuit breaker failures, and idempotent reads are retried on them. Only the errors of the
+    connection are: an invalidated connection, a SQLSTATE of the connection exception class or of the server shutting
+    down, or a network error of the driver. Errors of the statement are not, e.g. SQLite's "no such table" or
+    "database is locked", nor statements cancelled by `statement_timeout` or the request deadline.
+    """
+    if isinstance(error, DBAPIError):
+        if error.connection_invalidated:
+            return True
+        # asyncpg and psycopg expose the SQLSTATE
+        sqlstate = getattr(error.orig, "sqlstate", None) or ""
+        if sqlstate.startswith(_CONNECTION_SQLSTATE_CLASS) or sqlstate in _SERVER_UNAVAILABLE_SQLSTATES:
+            return True
+        return _is_network_error(error.orig) or _is_network_error(error.orig.__cause__ if error.orig else None)
+    return _is_network_error(error)
+
+
+@contextmanager
+def _circuit_breaker_guard() -> Generator[_GuardedCall, None, None]:
+    """Fail fast if the circuit breaker is open, otherwise record the outcome of the guarded block."""
+    db_circuit_breaker.before_call()
+    call = _GuardedCall()
+    try:
+        yield call
+    except Exception as e:
+        # Non-database errors count as success, the database did answer
+        if is_transient_error(e):
+            db_circuit_breaker.record_failure()
+        else:
+            db_circuit_breaker.record_success()
+        raise
+    except BaseException:
+        if call.connecting:
+            # Cancelled (e.g. by the request deadline) while the driver was connecting: the database did not answer
+            db_circuit_breaker.record_failure()
+        else:
+            # Cancelled (e.g. client disconnect, request deadline) before the outcome is known: neither a success,
+            # which would close a half-open breaker, nor a failure
+            db_circuit_breaker.release_probe()
+        raise
+    else:
+        db_circuit_breaker.record_success()
+
+
+async def _connect(session: AsyncSession, call: _GuardedCall) -> None:
+    """
+    Check out the connection of a new session eagerly, so that the guard tells connecting apart.
+
+    Only the driver opening a new connection marks the call, waiting for a free connection of an exhausted pool involves
+    no database.
+    """
+    token = _connecting_call.set(call)
+    try:
+        await session.connection()
+    finally:
+        _connecting_call.reset(token)
+    call.connecting = False
+
+
+@dataclass(slots=True)
+class RequestSession:
+    """
+    The request-scoped session (unit of work), shared by all repository calls of one HTTP request.
+
+    The session is opened lazily on the first repository call, so requests not touching the database never check out
+    a connection. `release()` commits or rolls back once and returns the connection to the pool; after that, the
+    repository calls of the same request (e.g. a streaming body) fall back to their own dedicated sessions.
+    """
+
+    active: bool = True
+    session: AsyncSession | None = None
+
+    async def release(self, *, commit: bool) -> None:
+        self.active = False
+        session, self.session = self.session, None
+        if session is None:
+            return
+        try:
+            if commit:
+                await session.commit()
+            else:
+                await session.rollback()
+        except Exception as e:
+            if is_transient_error(e):
+                db_circuit_breaker.record_failure()
+            raise
+        finally:
+            await session.close()
+
+
+_request_session_context: ContextVar[RequestSession | None] = ContextVar("request_session", default=None)
+
+
+@asynccontextmanager
+async def request_session_scope() -> AsyncGenerator[RequestSession, None]:
+    """Open a request scope, the session is rolled back on exit unless it has been released (committed) before."""
+    request_session = RequestSession()
+    token = _request_session_context.set(request_session)
+    try:
+        yield request_session
+    finally:
+        _request_session_context.reset(token)
+        if request_session.active:
+            await request_session.release(commit=False)
+
+
+@asynccontextmanager
+async def async_db_context(
+    *, dedicated: bool = False, pool: DatabasePool = DatabasePool.OLTP
+) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Get an async session.
+
+    Within a request scope, the request-scoped session is returned and the request commits it once the handler
+    finishes. Otherwise (or if `dedicated`, e.g. for streaming), a new session is opened and committed on exit, unless
+    an exception is raised. Repository functions should therefore `flush()` instead of `commit()`.
+
+    The call fails fast with `CircuitBreakerOpenError` while the database circuit breaker is open.
+
+    Usage:
+    >>> async with async_db_context(pool=DatabasePool.STREAM) as session:
+    >>>     result = await session.stream_scalars(select(StartupLog))
+
+    :param dedicated: always open a new session, which is not shared with the other calls of the request
+    :param pool: the connection pool (bulkhead) to use, sessions of the non-OLTP pools are always dedicated
+    """
+    request_session = _request_session_context.get()
+    with _circuit_breaker_guard() as call:
+        if not dedicated and pool is DatabasePool.OLTP and request_session is not None and request_session.active:
+            if request_session.session is None:
+                request_session.session = _get_session_factory(pool)()
+                await _connect(request_session.session, call)
+            yield request_session.session
+            return
+        async with _get_session_factory(pool)() as session:
+            await _connect(session, call)
+            yield session
+            await session.commit()
+
+
+_backoff = wait_random_exponential(multiplier=0.05, max=settings.database.retry_max_wait)
+
+
+def _retry_wait(retry_state: RetryCallState) -> float:
+    error = retry_state.outcome.exception() if retry_state.outcome else None
+    # A connection found dead at use time has been invalidated and is replaced by the pool, retry at once
+    if retry_state.attempt_number == 1 and isinstance(error, DBAPIError) and error.connection_invalidated:
+        return 0.0
+    return _backoff(retry_state)
+
+
+def idempotent_read(func: Callable[..., Awaitable[R]]) -> Callable[..., Awaitable[R]]:
+    """
+    The decorator to retry an idempotent read on transient database errors, with jittered exponential backoff.
+
+    Within a request scope, the read is only retried if it starts the transaction of the request-scoped session,
+    because the earlier statements of the transaction would be lost along with a broken connection.
+
+    Usage:
+    >>> @idempotent_read
+    >>> async def get_user_by_username(username: str) -> ScalarResult[User]:
+    >>>     async with async_db_context() as db:
+    >>>         return await db.exec(select(User).where(User.username == username))
+    """
+
+    @functools.wraps(func)
+    async def wrapper(*args: Any, **kwargs: Any) -> R:
+        request_session = _request_session_context.get()
+        shared_session = request_session.session if request_session is not None and request_session.active else None
+        if shared_session is not None and shared_session.in_transaction():
+            return await func(*args, **kwargs)
+
+        async def before_sleep(retry_state: RetryCallState) -> None:
+            error = retry_state.outcome.exception() if retry_state.outcome else None
+            logger.warning(f"Retrying {func.__qualname__}(), attempt {retry_state.attempt_number} failed: {error}")
+            if request_session is not None and request_session.session is not None:
+                await request_session.session.rollback()
+
+        retrying = AsyncRetrying(
+            stop=stop_after_attempt(settings.database.retry_attempts),
+            wait=_retry_wait,
+            retry=retry_if_exception(is_transient_error),
+            before_sleep=before_sleep,
+            reraise=True,
+        )
+        return await retrying(func, *args, **kwargs)
+
+    return wrapper
+
+
 async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
-    async with _AsyncSessionLocal() as session:
+    async with async_db_context() as session:
         yield session
 
 
-# Sync and Async context managers for manual session management
+# Sync context manager for manual session management
 db_context = contextmanager(get_db)
-async_db_context = asynccontextmanager(get_async_db)
+
+
+def get_schema_heads() -> set[str]:
+    """Get the head revisions of the Alembic migrations shipped with the application, read from the files only."""
+    script_directory = ScriptDirectory(_ALEMBIC_DIR, recursive_version_locations=True)
+    return set(script_directory.get_heads())
+
+
+async def _check_schema_version(connection: AsyncConnection) -> None:
+    """
+    Compare the Alembic revision of the database with the application's, it's one query.
+
+    :raise RuntimeError: on mismatch, if `settings.database.schema_version_strict`
+    """
+    try:
+        result = await connection.execute(text("SELECT version_num FROM alembic_version;"))
+        current = set(result.scalars().all())
+    except DBAPIError as e:
+        logger.warning(f"Failed to read the schema version, the database might not be migrated: {e!s}")
+        current = set()
+    expected = get_schema_heads()
+    if current == expected:
+        logger.warning(f"Schema version check passed, revision: {sorted(current)}")
+        return
+    message = (
+        f"Schema version mismatch, database revision: {sorted(current)}, application revision: {sorted(expected)}. "
+        f"Run `alembic upgrade head` before starting the application"
+    )
+    if settings.database.schema_version_strict:
+        raise RuntimeError(message)
+    logger.error(message)
 
 
 async def configure() -> None:
     """
-    Initialize the database connection and create all tables if not exist.
-    >>> from sqlalchemy.engine.create import create_engine
-    >>> create_engine()
+    Initialize the database connection and check the schema version.
+
+    Tables are created by the Alembic migrations, startup only reads the Alembic revision (one query) and refuses to
+    start on mismatch. In the offline environment (and pytest), all tables are created if not exist instead.
+    A single connection of the async engine is used, the sync engine is not touched here.
     >>> from sqlalchemy.ext.asyncio import create_async_engine
     >>> create_async_engine()
-    >>> from sqlalchemy.pool.impl import QueuePool
-    >>> # QueuePool is the default sync pool implementation
-    >>> QueuePool.__init__()
     >>> from sqlalchemy.pool.impl import AsyncAdaptedQueuePool
     >>> # AsyncAdaptedQueuePool is the default async pool implementation
     >>> AsyncAdaptedQueuePool.__init__()
     Default the database connection configuration above.
     """
     try:
-        with db_context() as session:
-            result = session.execute(text("SELECT 1;"))
-            logger.warning("Creating all tables if not exist...")
-            SQLModel.metadata.create_all(sync_engine)
-        logger.warning(f"Sync connection initialized successfully, name: {sync_engine.name}, result: {result.all()}")
-    except Exception as e:
-        logger.error(f"Failed to initialize sync connection: {e!s}", e)
-        raise
-    try:
-        # Test async connection
-        async with async_db_context() as session:
-            result = await session.execute(text("SELECT 1;"))
-        logger.warning(
-            f"Async connection initialized successfully, name: {__async_engine.name}, result: {result.all()}"
-        )
+        if offline_environment():
+            async with async_engine.begin() as connection:
+                logger.warning("Creating all tables if not exist...")
+                await connection.run_sync(SQLModel.metadata.create_all)
+        else:
+            async with async_engine.connect() as connection:
+                await _check_schema_version(connection)
+        logger.warning(f"Async connection initialized successfully, name: {async_engine.name}")
     except Exception as e:
         logger.error(f"Failed to initialize async connection: {e!s}", e)
         raise
 
 
 async def cleanup() -> None:
+    if _sync_engine is not None:
+        try:
+            _sync_engine.dispose()
+            logger.warning(f"{_sync_engine.name} sync engine disposed")
+        except Exception as e:
+            logger.error(f"Error disposing sync engine: {e!s}", e)
+    for pool, engine in _async_engines.items():
+        await _dispose_async_engine(pool, engine)
+
+
+async def _dispose_async_engine(pool: DatabasePool, engine: AsyncEngine) -> None:
     try:
-        sync_engine.dispose()
-        logger.warning(f"{sync_engine.name} sync engine disposed")
-    except Exception as e:
-        logger.error(f"Error disposing sync engine: {e!s}", e)
-    try:
-        await __async_engine.dispose()
-        logger.warning(f"{__async_engine.name} async engine disposed")
+        await engine.dispose()
+        logger.warning(f"{engine.name} async engine of the {pool.value} pool disposed")
     except Exception as e:
-        logger.error(f"Error disposing async engine: {e!s}", e)
+        logger.error(f"Error disposing async engine of the {pool.value} pool: {e!s}", e)
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from loguru import logger
+
+from python_web_service_boilerplate.common.leak_detector import LeakDetector
+from python_web_service_boilerplate.configuration.application import settings
+from python_web_service_boilerplate.configuration.apscheduler import MEMORY_JOB_STORE, scheduler
+
+_JOB_ID = "leak_detector_census"
+
+leak_detector = LeakDetector(
+    intervals=settings.leak_detector.intervals,
+    frames=settings.leak_detector.frames,
+    limit=settings.leak_detector.limit,
+)
+
+
+def get_interval() -> float | None:
+    """Get the seconds between the scheduled censuses, `None` if not scheduled."""
+    job = scheduler.get_job(_JOB_ID, jobstore=MEMORY_JOB_STORE)
+    return job.trigger.interval.total_seconds() if job is not None else None
+
+
+def start(interval: float) -> None:
+    """Take a census every `interval` seconds in this worker, the first one right now."""
+    scheduler.add_job(
+        leak_detector.census,
+        "interval",
+        seconds=interval,
+        id=_JOB_ID,
+        jobstore=MEMORY_JOB_STORE,
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+        next_run_time=datetime.now(tz=scheduler.timezone),
+    )
+    logger.warning(f"Leak detector started, a census every {interval}s, intervals: {leak_detector.intervals}")
+
+
+def stop() -> None:
+    """Stop the censuses and tracing the allocations."""
+    if scheduler.get_job(_JOB_ID, jobstore=MEMORY_JOB_STORE) is not None:
+        scheduler.remove_job(_JOB_ID, jobstore=MEMORY_JOB_STORE)
+    leak_detector.stop_tracing()
+    logger.warning("Leak detector stopped")
+
+
+def configure() -> None:
+    """Start the leak detector if enabled, after APScheduler was configured."""
+    if settings.leak_detector.enabled:
+        start(settings.leak_detector.interval)
+
+
+def cleanup() -> None:
+    if get_interval() is not None:
+        stop()
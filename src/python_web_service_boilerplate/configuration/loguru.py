@@ -1,21 +1,30 @@
 from __future__ import annotations
 
+import atexit
+import functools
 import logging
 import platform
+import re
 import sys
+import threading
 from logging import LogRecord
 from typing import TYPE_CHECKING
 
 import arrow
 from arrow import Arrow
 from loguru import logger
+from loguru._file_sink import FileSink
 
 from python_web_service_boilerplate.common.common_function import get_data_dir, get_module_name
+from python_web_service_boilerplate.common.log_index import compress_and_index, search_trace
+from python_web_service_boilerplate.common.log_level import LogLevelController
+from python_web_service_boilerplate.common.log_sink import BatchedJsonSink, json_format
+from python_web_service_boilerplate.common.tail_buffer import TAIL_BUFFERED, TailBuffer
 from python_web_service_boilerplate.common.trace import get_trace_id
 from python_web_service_boilerplate.configuration.application import settings
 
 if TYPE_CHECKING:
-    from loguru import Record
+    from loguru import Logger, Message, Record
 
 
 def trace_id_filter(record: Record) -> bool:
@@ -40,53 +49,207 @@ logger.remove(handler_id=None)
 _logs_directory_path = get_data_dir("logs")
 _log_file = str(_logs_directory_path) + f"/{get_module_name()}.{platform.node()}." + "{time}.log"
 log_level = settings.log_level
-logger.add(
-    _log_file,
-    level=log_level,
-    format=_message_format,
-    filter=trace_id_filter,
-    enqueue=True,
-    # turn to false if in production to prevent data leaking
-    backtrace=True,
-    diagnose=True,
-    rotation="00:00",
-    retention="7 days",
-    compression="gz",
-    serialize=False,
-)
+# The global and per-module log levels and sampling, adjustable at runtime
+log_levels = LogLevelController(log_level)
 stderr = sys.stderr
+
+
+class _KeptSink:
+    """
+    A sink kept across the handlers re-added at a new floor, see `_readd_sinks()`.
+
+    Loguru stops the sink of a removed handler, this wrapper has no `stop()` and the sink is closed on exit instead. The
+    lock serializes the writes of the old and the new handler, which overlap while the sinks are re-added.
+    """
+
+    def __init__(self, sink: FileSink | BatchedJsonSink) -> None:
+        self.sink = sink
+        self._lock = threading.Lock()
+
+    def write(self, message: Message) -> None:
+        with self._lock:
+            self.sink.write(message)
+
+    def close(self) -> None:
+        """Stop the sink, the JSON sink writes its buffered records."""
+        with self._lock:
+            self.sink.stop()
+
+
+# Created once, so re-adding the sinks neither starts a new log file nor resets the counters of the JSON sink
+_file_sink = _KeptSink(
+    FileSink(
+        _log_file,
+        rotation="00:00",
+        retention="7 days",
+        # Compressed into gzip members with a sidecar trace ID index, see `search_trace()`
+        compression=compress_and_index,
+    )
+)
+# Structured logs for log shippers, written in batches by a background thread
+json_sink: BatchedJsonSink | None = (
+    BatchedJsonSink(stderr, buffer_size=settings.log_buffer_size)
+    if stderr is not None and settings.log_format == "json"
+    else None
+)
+_json_sink = _KeptSink(json_sink) if json_sink is not None else None
+_sink_ids: list[int] = []
+# Buffers the records below the log level per request, written only if the request fails or is slow
+tail_buffer: TailBuffer | None = (
+    TailBuffer(max_records_per_trace=settings.log_tail_max_records, max_bytes=settings.log_tail_max_bytes)
+    if settings.log_tail_buffering
+    else None
+)
+
+
+def _sink_filter(record: Record) -> bool:
+    return (TAIL_BUFFERED in record["extra"] or log_levels(record)) and trace_id_filter(record)
+
+
+def tail_buffer_filter(record: Record) -> bool:
+    """Capture the records filtered out by `log_levels` of the requests being buffered."""
+    trace_id = get_trace_id()
+    if tail_buffer is None or not tail_buffer.is_buffering(trace_id) or TAIL_BUFFERED in record["extra"]:
+        return False
+    if log_levels(record):
+        return False
+    record["extra"]["trace_id"] = trace_id
+    return True
+
+
+def _sink_level(floor: str) -> str:
+    """Get the level of the sinks, low enough for the records written by the tail buffer."""
+    if tail_buffer is None:
+        return floor
+    return min(floor, settings.log_tail_level, key=lambda level: logger.level(level).no)
+
+
+def _add_sinks(floor: str) -> None:
+    """Add the file and console sinks at `floor` of `log_levels`, which filters the records further."""
+    level = _sink_level(floor)
+    _sink_ids.append(
+        logger.add(
+            _file_sink,
+            level=level,
+            format=_message_format,
+            filter=_sink_filter,
+            enqueue=True,
+            colorize=False,
+            backtrace=settings.log_backtrace,
+            diagnose=settings.log_diagnose,
+            serialize=False,
+        )
+    )
+    if stderr is None:
+        return
+    if _json_sink is not None:
+        _sink_ids.append(
+            logger.add(
+                _json_sink,
+                level=level,
+                format=json_format,
+                filter=_sink_filter,
+                backtrace=settings.log_backtrace,
+                diagnose=settings.log_diagnose,
+            )
+        )
+        return
+    # Override the default stderr (console) if console is available
+    _sink_ids.append(
+        logger.add(
+            stderr,
+            level=level,
+            format=_message_format,
+            filter=_sink_filter,
+            backtrace=settings.log_backtrace,
+            diagnose=settings.log_diagnose,
+        )
+    )
+
+
+def _remove_sinks() -> None:
+    """Remove and close the sinks, the JSON sink writes its buffered records."""
+    while _sink_ids:
+        logger.remove(_sink_ids.pop())
+    _file_sink.close()
+    if _json_sink is not None:
+        _json_sink.close()
+
+
+def _readd_sinks(floor: str) -> None:
+    """
+    Re-add the sinks at the new floor.
+
+    Loguru cannot change the level of a sink. The same sinks are added again before the old handlers are removed, so no
+    record is lost meanwhile, and the log file and the counters of the JSON sink are kept.
+    """
+    previous_sink_ids = _sink_ids.copy()
+    _sink_ids.clear()
+    _add_sinks(floor)
+    for sink_id in previous_sink_ids:
+        logger.remove(sink_id)
+    logger.warning(f"Log sinks re-added at level {floor}")
+
+
+_add_sinks(log_level)
+log_levels.add_listener(_readd_sinks)
+if tail_buffer is not None:
+    logger.add(
+        tail_buffer.capture,
+        level=settings.log_tail_level,
+        format=lambda _record: "{message}",
+        filter=tail_buffer_filter,
+    )
+# Write the buffered records on exit
+atexit.register(_remove_sinks)
 if stderr is None:
     logger.warning("Detected no-console mode")
+elif settings.log_format == "json":
+    logger.warning("Detected console mode, logging JSON lines")
 else:
-    # Override the default stderr (console) if console is available
-    logger.add(stderr, level=log_level, format=_message_format, filter=trace_id_filter)
     logger.warning("Detected console mode")
 
 
+_LOGGING_FILE = logging.__file__
+
+
+@functools.cache
+def _loguru_level(level_name: str, level_no: int) -> str | int:
+    """Get the Loguru level of a standard logging level, cached since `logger.level()` raises for unknown levels."""
+    try:
+        return logger.level(level_name).name
+    except ValueError:
+        return level_no
+
+
 class InterceptHandler(logging.Handler):
     """
     Intercept standard logging.
 
+    The level of the handler and the root logger follows the level of the sinks, so standard logging drops the records
+    below it before creating them, see `_set_intercept_level()`.
+
     https://loguru.readthedocs.io/en/stable/overview.html#entirely-compatible-with-standard-logging
     https://gist.github.com/devsetgo/28c2edaca2d09e267dec46bb2e54b9e2
     """
 
-    def emit(self, record: LogRecord) -> None:
-        # Get corresponding Loguru level if it exists
-        level: int | str
-        try:
-            level = logger.level(record.levelname).name
-        except ValueError:
-            level = record.levelno
-
-        # Find caller from where originated the logged message
-        frame, depth = logging.currentframe(), 2
-        while frame.f_code.co_filename == logging.__file__:
-            if frame.f_back is not None:
-                frame = frame.f_back
-                depth += 1
+    def __init__(self, level: int = logging.NOTSET) -> None:
+        """Create the handler, with a cache of the Loguru loggers per frame depth."""
+        super().__init__(level)
+        self._loggers: dict[int, Logger] = {}
 
-        logger.opt(depth=depth, exception=record.exc_info).log(level, f"{record.name} -> {record.getMessage()}")
+    def emit(self, record: LogRecord) -> None:
+        level = _loguru_level(record.levelname, record.levelno)
+        # Find caller from where originated the logged message, skipping the frames of the logging module
+        frame, depth = sys._getframe(1), 1  # noqa: SLF001
+        while frame.f_code.co_filename == _LOGGING_FILE and frame.f_back is not None:
+            frame = frame.f_back
+            depth += 1
+        if record.exc_info:
+            opt_logger = logger.opt(depth=depth, exception=record.exc_info)
+        else:
+            opt_logger = self._loggers.get(depth) or self._loggers.setdefault(depth, logger.opt(depth=depth))
+        opt_logger.log(level, f"{record.name} -> {record.getMessage()}")  # noqa: G004
 
 
 intercept_handlers: list[logging.Handler] = [InterceptHandler()]
@@ -105,6 +268,18 @@ for name in existing_loggers:
 logging.getLogger().handlers = intercept_handlers
 logging.getLogger().propagate = False
 
+
+def _set_intercept_level(floor: str) -> None:
+    """Drop the standard logging records below the level of the sinks, before they are created and intercepted."""
+    level_no = logger.level(_sink_level(floor)).no
+    logging.getLogger().setLevel(level_no)
+    for handler in intercept_handlers:
+        handler.setLevel(level_no)
+
+
+_set_intercept_level(log_level)
+log_levels.add_listener(_set_intercept_level)
+
 logger.info(f"{type(logger)} is intercepting standard logging")
 
 for key, value in settings.logger.items():
@@ -112,19 +287,36 @@ for key, value in settings.logger.items():
     logger.info(f"Configured logger[{key}]'s level to {value}")
 
 
+_LOG_FILE_DATE_PATTERN = re.compile(r"\.(\d{4}-\d{2}-\d{2})_[\d_-]+\.log")
+
+
 def retain_log_files() -> None:
     now = arrow.now("local")
     dates = {date.format("YYYY-MM-DD") for date in Arrow.range("day", now.shift(days=-7), end=now)}
-    for file_path in _logs_directory_path.glob("*.log"):
-        split_log_file_name = file_path.name.split(".")
-        split_log_file_name.reverse()
-        date_in_file_name = split_log_file_name[1][0:10]
-        if date_in_file_name not in dates:
+    # The log files, the compressed ones and their trace ID indexes, e.g. `<module>.<node>.<time>.log.gz.idx`
+    for file_path in _logs_directory_path.glob("*.log*"):
+        date_in_file_name = _LOG_FILE_DATE_PATTERN.search(file_path.name)
+        if date_in_file_name is not None and date_in_file_name.group(1) not in dates:
             logger.debug(f"Deleting log: {file_path}")
             file_path.unlink(missing_ok=True)
 
 
+def search_trace_logs(trace_id: str) -> list[str]:
+    """Find the log records of a trace in the log files, via the trace ID indexes of the compressed ones."""
+    return search_trace(_logs_directory_path, trace_id)
+
+
+def get_log_sink_statistics() -> dict[str, int]:
+    """Get the counters of the JSON sink (buffered, written, dropped records), empty for the text sink."""
+    return json_sink.statistics() if json_sink is not None else {}
+
+
+def get_tail_buffer_statistics() -> dict[str, int]:
+    """Get the memory usage and the counts of flushed and discarded traces of the tail buffer, empty if disabled."""
+    return tail_buffer.statistics() if tail_buffer is not None else {}
+
+
 def configure() -> None:
     """Configure logging."""
     retain_log_files()
-    logger.warning(f"Loguru logging configured, log_level: {log_level}")
+    logger.warning(f"Loguru logging configured, log_levels: {log_levels.levels()}, log_format: {settings.log_format}")
@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+from loguru import logger
+
+from python_web_service_boilerplate.common.loop_monitor import LoopLagMonitor
+from python_web_service_boilerplate.common.metrics import Sample, histogram_samples, statistics_samples
+from python_web_service_boilerplate.configuration.application import settings
+
+loop_monitor = LoopLagMonitor(
+    interval=settings.loop_monitor.interval,
+    threshold=settings.loop_monitor.threshold,
+    buckets=settings.loop_monitor.lag_buckets,
+)
+
+
+def collect_loop_monitor_samples() -> list[Sample]:
+    """Collect the lag histogram and the stalls per blocking location of the event loop."""
+    counts, total = loop_monitor.histogram()
+    return [
+        *histogram_samples("event_loop_lag_seconds", loop_monitor.buckets, counts, total),
+        *statistics_samples("event_loop", loop_monitor.statistics(), counters=("measurements", "stalls")),
+        *[
+            Sample("event_loop_blocked_total", count, {"location": location}, "counter")
+            for location, count in loop_monitor.locations().items()
+        ],
+    ]
+
+
+def configure() -> None:
+    """Start the event loop lag monitor, must be called on the event loop."""
+    if settings.loop_monitor.enabled:
+        loop_monitor.start()
+    logger.warning(f"Event loop lag monitor configured, {settings.loop_monitor}")
+
+
+def cleanup() -> None:
+    loop_monitor.stop()
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+from loguru import logger
+
+from python_web_service_boilerplate.common.circuit_breaker import CircuitBreakerState
+from python_web_service_boilerplate.common.common_function import get_data_dir
+from python_web_service_boilerplate.common.deadline import get_deadline_exceeded_counts
+from python_web_service_boilerplate.common.metrics import (
+    MetricsRegistry,
+    MetricsSpool,
+    Sample,
+    render_prometheus,
+    statistics_samples,
+)
+from python_web_service_boilerplate.configuration.application import settings
+from python_web_service_boilerplate.configuration.database import db_circuit_breaker, get_pool_statistics
+from python_web_service_boilerplate.configuration.loguru import get_log_sink_statistics, get_tail_buffer_statistics
+from python_web_service_boilerplate.configuration.loop_monitor import collect_loop_monitor_samples
+from python_web_service_boilerplate.configuration.tracing import get_span_statistics
+
+metrics = MetricsRegistry(settings.metrics.latency_buckets)
+spool: MetricsSpool | None = None
+
+
+def collect_samples() -> list[Sample]:
+    """Collect the counters of the circuit breaker, deadlines, pools, log sinks, spans and event loop of this worker."""
+    circuit_breaker = db_circuit_breaker.snapshot()
+    samples = [
+        Sample("db_circuit_breaker_open", int(circuit_breaker["state"] == CircuitBreakerState.OPEN.value)),
+        *statistics_samples("db_circuit_breaker", circuit_breaker),
+        *[
+            Sample("http_deadline_exceeded_total", count, {"route": route}, "counter")
+            for route, count in get_deadline_exceeded_counts().items()
+        ],
+        *statistics_samples("log_sink", get_log_sink_statistics(), counters=("written", "dropped", "batches")),
+        *statistics_samples(
+            "log_tail_buffer",
+            get_tail_buffer_statistics(),
+            counters=("flushed_traces", "discarded_traces", "dropped_records"),
+        ),
+        *statistics_samples("tracing_spans", get_span_statistics(), counters=("exported", "dropped", "failed")),
+        *collect_loop_monitor_samples(),
+    ]
+    for pool, statistics in get_pool_statistics().items():
+        samples += statistics_samples("db_pool", statistics, {"pool": pool})
+    return samples
+
+
+def render_metrics() -> str:
+    """Render the metrics of this worker, or of all workers if `settings.metrics.multiprocess`."""
+    if spool is not None:
+        snapshot, samples = spool.merge()
+    else:
+        snapshot, samples = metrics.snapshot(), collect_samples()
+    return render_prometheus(snapshot, metrics.buckets, samples)
+
+
+def configure() -> None:
+    """Configure the metrics spool of this worker, if the metrics of several workers are merged."""
+    global spool
+    if settings.metrics.multiprocess:
+        spool = MetricsSpool(get_data_dir("metrics"), metrics, collect_samples, settings.metrics.spool_interval)
+    logger.warning(f"Metrics configured, {settings.metrics}, spool: {spool.directory if spool else None}")
+
+
+def cleanup() -> None:
+    """Stop spooling the metrics of this worker."""
+    global spool
+    if spool is not None:
+        spool.stop()
+        spool = None
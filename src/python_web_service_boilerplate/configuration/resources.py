@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+import arrow
+import psutil
+from loguru import logger
+
+from python_web_service_boilerplate.common.resource_series import ResourceSeries, sample_process
+from python_web_service_boilerplate.configuration.application import settings
+from python_web_service_boilerplate.configuration.apscheduler import MEMORY_JOB_STORE, scheduler
+from python_web_service_boilerplate.configuration.database import get_pool_statistics
+from python_web_service_boilerplate.configuration.thread_pool import executor
+from python_web_service_boilerplate.core.resource_sample.models import ResourceSample
+from python_web_service_boilerplate.core.resource_sample.repository import save_resource_sample
+
+_JOB_ID = "sample_resources"
+
+resource_series = ResourceSeries(settings.resources.capacity)
+_process = psutil.Process()
+_sampled = 0
+
+
+def collect_resource_sample() -> dict[str, float]:
+    """Sample the process, the thread pool and the database pools."""
+    pool_statistics = get_pool_statistics().values()
+    return {
+        **sample_process(_process),
+        # noinspection PyProtectedMember
+        "thread_pool_queue": executor._work_queue.qsize(),  # noqa: SLF001
+        "thread_pool_threads": len(executor._threads),  # noqa: SLF001
+        "db_pool_checked_out": sum(statistics["checked_out"] for statistics in pool_statistics),
+        "db_pool_overflow": sum(statistics["overflow"] for statistics in pool_statistics),
+    }
+
+
+def sample_resources() -> None:
+    """Append a sample to the series, and save the mean of every `persist_every` samples, run by APScheduler."""
+    global _sampled
+    resource_series.append(collect_resource_sample())
+    _sampled += 1
+    persist_every = settings.resources.persist_every
+    if persist_every <= 0 or _sampled % persist_every != 0:
+        return
+    mean = resource_series.mean(persist_every)
+    sampled_at = arrow.get(mean["timestamp"]).to("local").naive
+    save_resource_sample(
+        ResourceSample(
+            sampled_at=sampled_at,
+            rss=mean["rss"],
+            cpu_time=mean["cpu_time"],
+            open_fds=mean["open_fds"],
+            threads=mean["threads"],
+            thread_pool_queue=mean["thread_pool_queue"],
+            thread_pool_threads=mean["thread_pool_threads"],
+            db_pool_checked_out=mean["db_pool_checked_out"],
+            db_pool_overflow=mean["db_pool_overflow"],
+            gc_collections=mean["gc_collections"],
+            gc_collected=mean["gc_collected"],
+            gc_uncollectable=mean["gc_uncollectable"],
+        ),
+        retained_after=sampled_at - timedelta(days=settings.resources.retention_days),
+    )
+
+
+def configure() -> None:
+    """Schedule sampling the resources of this worker, after APScheduler was configured."""
+    if not settings.resources.enabled:
+        return
+    scheduler.add_job(
+        sample_resources,
+        "interval",
+        seconds=settings.resources.interval,
+        id=_JOB_ID,
+        jobstore=MEMORY_JOB_STORE,
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+        next_run_time=datetime.now(tz=scheduler.timezone),
+    )
+    logger.warning(f"Resource sampling scheduled, {settings.resources}")
@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from python_web_service_boilerplate.common.stack_sampler import StackSampler
+from python_web_service_boilerplate.configuration.application import settings
+
+stack_sampler = StackSampler(
+    rate=settings.profiling.sampler_rate,
+    window=settings.profiling.sampler_window,
+    max_windows=settings.profiling.sampler_windows,
+)
+
+
+def configure() -> None:
+    """Start the stack sampler if enabled, it can be started and stopped at runtime, see `/api/v1/admin`."""
+    if settings.profiling.sampler_enabled:
+        stack_sampler.start()
+
+
+def cleanup() -> None:
+    stack_sampler.stop()
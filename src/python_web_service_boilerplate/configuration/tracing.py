@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from loguru import logger
+
+from python_web_service_boilerplate.common.common_function import get_data_dir, get_module_name
+from python_web_service_boilerplate.common.span_export import (
+    BatchSpanProcessor,
+    OtlpHttpExporter,
+    OtlpJsonFileExporter,
+    SpanExporter,
+)
+from python_web_service_boilerplate.common.tracing import set_span_processor
+from python_web_service_boilerplate.configuration.application import settings
+
+span_processor: BatchSpanProcessor | None = None
+
+
+def _create_exporter() -> SpanExporter | None:
+    tracing = settings.tracing
+    if tracing.exporter == "file":
+        return OtlpJsonFileExporter(
+            get_data_dir("traces") / "spans.jsonl",
+            get_module_name(),
+            max_bytes=tracing.file_max_bytes,
+            backups=tracing.file_backups,
+        )
+    if tracing.exporter == "http":
+        return OtlpHttpExporter(tracing.otlp_endpoint, get_module_name())
+    return None
+
+
+def configure() -> None:
+    """Configure the export of the sampled spans."""
+    global span_processor
+    exporter = _create_exporter()
+    if exporter is None or settings.tracing.sample_rate <= 0:
+        logger.warning("Tracing disabled, spans are not exported")
+        return
+    span_processor = BatchSpanProcessor(
+        exporter,
+        max_queue_size=settings.tracing.max_queue_size,
+        batch_size=settings.tracing.batch_size,
+        schedule_delay=settings.tracing.schedule_delay,
+    )
+    set_span_processor(span_processor)
+    logger.warning(f"Tracing configured, {settings.tracing}, exporter: {exporter}")
+
+
+def get_span_statistics() -> dict[str, int]:
+    """Get the counters of the span processor (queued, exported, dropped, failed spans), empty if disabled."""
+    return span_processor.statistics() if span_processor is not None else {}
+
+
+def cleanup() -> None:
+    """Export the remaining spans."""
+    global span_processor
+    set_span_processor(None)
+    if span_processor is not None:
+        span_processor.shutdown()
+        logger.warning(f"Span processor shutdown, {span_processor.statistics()}")
+        span_processor = None
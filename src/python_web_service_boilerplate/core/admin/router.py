@@ -0,0 +1,229 @@
+import time
+from dataclasses import asdict
+from http import HTTPStatus
+
+import arrow
+from fastapi import APIRouter
+from fastapi.responses import FileResponse, PlainTextResponse
+from loguru import logger
+from starlette.exceptions import HTTPException
+
+from python_web_service_boilerplate.common import request_profiler
+from python_web_service_boilerplate.common.function_stats import SortKey
+from python_web_service_boilerplate.common.log_level import LogSampling
+from python_web_service_boilerplate.common.profiling import function_stats
+from python_web_service_boilerplate.common.resource_series import RESOURCE_FIELDS
+from python_web_service_boilerplate.configuration import leak_detector
+from python_web_service_boilerplate.configuration.application import settings
+from python_web_service_boilerplate.configuration.loguru import log_levels, search_trace_logs
+from python_web_service_boilerplate.configuration.resources import resource_series
+from python_web_service_boilerplate.configuration.stack_sampler import stack_sampler
+from python_web_service_boilerplate.core.admin.schemas import (
+    FunctionStatsResponse,
+    FunctionStatsSchema,
+    FunctionStatsUpdate,
+    GrowthSchema,
+    LeakDetectorUpdate,
+    LeakReportResponse,
+    LogLevelsResponse,
+    LogLevelUpdate,
+    LogSamplingSchema,
+    LogSamplingUpdate,
+    ProfileSchema,
+    ProfilesResponse,
+    ResourceSeriesResponse,
+    StackSamplerSchema,
+    StackSamplerUpdate,
+    TraceLogsResponse,
+)
+from python_web_service_boilerplate.core.auth.decorators import admin_required
+from python_web_service_boilerplate.core.resource_sample.repository import get_resource_samples
+
+router = APIRouter(prefix="/api/v1/admin")
+
+
+def _log_levels_response() -> LogLevelsResponse:
+    return LogLevelsResponse(
+        levels=log_levels.levels(),
+        samplings={
+            module: LogSamplingSchema(**asdict(sampling)) for module, sampling in log_levels.samplings().items()
+        },
+        sampled_out=log_levels.statistics(),
+    )
+
+
+@router.get("/log_levels")
+@admin_required
+async def get_log_levels() -> LogLevelsResponse:
+    return _log_levels_response()
+
+
+@router.put("/log_levels")
+@admin_required
+async def update_log_level(update: LogLevelUpdate) -> LogLevelsResponse:
+    if update.level is not None:
+        log_levels.set_level(update.level, update.module)
+    elif update.module:
+        log_levels.reset_level(update.module)
+    else:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST.value, detail="The global level cannot be reset")
+    return _log_levels_response()
+
+
+@router.put("/log_sampling")
+@admin_required
+async def update_log_sampling(update: LogSamplingUpdate) -> LogLevelsResponse:
+    sampling = None
+    if update.every is not None or update.per_second is not None:
+        sampling = LogSampling(every=update.every, per_second=update.per_second)
+    log_levels.set_sampling(update.module, sampling)
+    return _log_levels_response()
+
+
+@router.get("/logs/{trace_id}")
+@admin_required
+def get_trace_logs(trace_id: str) -> TraceLogsResponse:
+    # Reads files, thus a sync endpoint, run in the thread pool
+    return TraceLogsResponse(trace_id=trace_id, records=search_trace_logs(trace_id))
+
+
+def _function_stats_response(limit: int, metric: str, sort: SortKey) -> FunctionStatsResponse:
+    return FunctionStatsResponse(
+        enabled=function_stats.enabled,
+        log_every=function_stats.log_every,
+        functions=[
+            FunctionStatsSchema(**statistics) for statistics in function_stats.top(limit, metric=metric, sort=sort)
+        ],
+    )
+
+
+@router.get("/function_stats")
+@admin_required
+async def get_function_stats(
+    limit: int = 20, metric: str = "elapsed", sort: SortKey = "total"
+) -> FunctionStatsResponse:
+    """Get the top functions of a metric, by total time by default."""
+    return _function_stats_response(limit, metric, sort)
+
+
+@router.put("/function_stats")
+@admin_required
+async def update_function_stats(update: FunctionStatsUpdate) -> FunctionStatsResponse:
+    if update.enabled is not None:
+        function_stats.enabled = update.enabled
+    if update.log_every is not None:
+        function_stats.log_every = update.log_every
+    logger.warning(f"Function stats updated, enabled: {function_stats.enabled}, log_every: {function_stats.log_every}")
+    return _function_stats_response(20, "elapsed", "total")
+
+
+@router.delete("/function_stats")
+@admin_required
+async def reset_function_stats() -> FunctionStatsResponse:
+    function_stats.reset()
+    return _function_stats_response(20, "elapsed", "total")
+
+
+@router.get("/profiles")
+@admin_required
+def get_profiles() -> ProfilesResponse:
+    """List the profiles of the requests sent with the `X-Profile: 1` header, or sampled, newest first."""
+    return ProfilesResponse(
+        available=request_profiler.is_available(),
+        profiles=[ProfileSchema(**profile) for profile in request_profiler.list_profiles()],
+    )
+
+
+@router.get("/profiles/{name}")
+@admin_required
+def download_profile(name: str) -> FileResponse:
+    path = request_profiler.get_profile(name)
+    if path is None:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND.value, detail=f"Profile not found: {name}")
+    media_type = "text/html" if path.suffix == ".html" else "application/json"
+    return FileResponse(path, media_type=media_type, filename=name)
+
+
+@router.get("/stack_sampler")
+@admin_required
+def get_stack_sampler() -> StackSamplerSchema:
+    return StackSamplerSchema(**stack_sampler.statistics())
+
+
+@router.put("/stack_sampler")
+@admin_required
+def update_stack_sampler(update: StackSamplerUpdate) -> StackSamplerSchema:
+    if update.running:
+        stack_sampler.start()
+    else:
+        stack_sampler.stop()
+    return StackSamplerSchema(**stack_sampler.statistics())
+
+
+@router.get("/stack_samples", response_class=PlainTextResponse)
+@admin_required
+def get_stack_samples(windows: int = 0) -> str:
+    """
+    Get the sampled stacks of the last `windows` windows, 0 for all, in the collapsed stack format.
+
+    Usage: `curl -H "Authorization: Bearer $TOKEN" .../api/v1/admin/stack_samples | flamegraph.pl > flamegraph.svg`
+    """
+    return stack_sampler.collapsed(windows or None)
+
+
+@router.get("/resources")
+@admin_required
+async def get_resources(minutes: float = 60, persisted: bool = False) -> ResourceSeriesResponse:  # noqa: FBT001, FBT002
+    """
+    Get the resource usage of the last `minutes`, sampled in memory by this worker, or the downsampled samples of all
+    workers persisted in the `resource_sample` table.
+    """
+    since = time.time() - minutes * 60
+    if not persisted:
+        return ResourceSeriesResponse(interval=settings.resources.interval, series=resource_series.series(since))
+    samples = await get_resource_samples(arrow.get(since).to("local").naive)
+    series: dict[str, list[float]] = {field: [] for field in (*RESOURCE_FIELDS, "pid")}
+    for sample in samples:
+        series["timestamp"].append(sample.sampled_at.timestamp())
+        series["pid"].append(sample.pid)
+        for field in RESOURCE_FIELDS[1:]:
+            series[field].append(getattr(sample, field))
+    return ResourceSeriesResponse(
+        interval=settings.resources.interval * settings.resources.persist_every, series=series
+    )
+
+
+def _leak_report_response() -> LeakReportResponse:
+    report = leak_detector.leak_detector.report()
+    return LeakReportResponse(
+        interval=leak_detector.get_interval(),
+        censuses=report["censuses"],
+        intervals=report["intervals"],
+        types=[GrowthSchema(**growth) for growth in report["types"]],
+        allocations=[GrowthSchema(**growth) for growth in report["allocations"]],
+    )
+
+
+@router.get("/leak_detector")
+@admin_required
+def get_leak_report() -> LeakReportResponse:
+    """Get the object types and allocation lines of this worker grown at every interval, by growth descending."""
+    return _leak_report_response()
+
+
+@router.put("/leak_detector")
+@admin_required
+def update_leak_detector(update: LeakDetectorUpdate) -> LeakReportResponse:
+    if update.running:
+        leak_detector.start(update.interval or settings.leak_detector.interval)
+    else:
+        leak_detector.stop()
+    return _leak_report_response()
+
+
+@router.post("/leak_detector/census")
+@admin_required
+def take_census() -> LeakReportResponse:
+    """Take a census right now, besides the scheduled ones."""
+    leak_detector.leak_detector.census()
+    return _leak_report_response()
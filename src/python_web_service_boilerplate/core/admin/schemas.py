@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+from pydantic import BaseModel, Field
+
+from python_web_service_boilerplate.configuration.application import LogLevel
+
+
+class LogLevelUpdate(BaseModel):
+    # The module and its submodules, e.g. `python_web_service_boilerplate.core.auth`, `None` for the global level
+    module: str | None = None
+    # `None` resets the level of the module, it inherits the level of its parent module again
+    level: LogLevel | None = None
+
+
+class LogSamplingSchema(BaseModel):
+    # Log 1 in `every` records per call site
+    every: int | None = Field(default=None, ge=1)
+    # Log at most `per_second` records per second per call site
+    per_second: float | None = Field(default=None, gt=0)
+
+
+class LogSamplingUpdate(LogSamplingSchema):
+    module: str
+
+
+class LogLevelsResponse(BaseModel):
+    # The global level is keyed by an empty module name
+    levels: dict[str, str]
+    samplings: dict[str, LogSamplingSchema]
+    # The number of records dropped by sampling, per module
+    sampled_out: dict[str, int]
+
+
+class TraceLogsResponse(BaseModel):
+    trace_id: str
+    # The log records of the trace, oldest first, including the lines of their tracebacks
+    records: list[str]
+
+
+class AllocationSchema(BaseModel):
+    # The source line, `file:line`
+    line: str
+    # The net retained bytes allocated by the line, summed over the sampled calls
+    size: int
+
+
+class FunctionStatsSchema(BaseModel):
+    # The qualified name of the function, e.g. `python_web_service_boilerplate.core.auth.service.verify_token`
+    function: str
+    # `elapsed` (seconds), `memory` (bytes) or `cpu`
+    metric: str
+    count: int
+    # The number of calls raising an exception
+    errors: int
+    total: float
+    mean: float
+    min: float
+    max: float
+    # The percentiles are estimated within 1%
+    p50: float
+    p90: float
+    p99: float
+    # The top allocating source lines of the `memory` metric, with `@mem_profile(mode="tracemalloc")`
+    allocations: list[AllocationSchema] = []
+
+
+class FunctionStatsResponse(BaseModel):
+    enabled: bool
+    log_every: int
+    functions: list[FunctionStatsSchema]
+
+
+class FunctionStatsUpdate(BaseModel):
+    # Disabled, the decorated functions are called without measuring anything
+    enabled: bool | None = None
+    # Log 1 in `log_every` calls per function, 0 logs none
+    log_every: int | None = Field(default=None, ge=0)
+
+
+class ProfileSchema(BaseModel):
+    # The file name, `<time>_<trace ID>.html` or `<time>_<trace ID>.speedscope.json`
+    name: str
+    size: int
+    # The POSIX timestamp
+    created_at: float
+
+
+class ProfilesResponse(BaseModel):
+    # Whether pyinstrument is installed, requests are never profiled without it
+    available: bool
+    profiles: list[ProfileSchema]
+
+
+class StackSamplerSchema(BaseModel):
+    running: bool
+    # Samples per second
+    rate: float
+    # The length of a window in seconds
+    window: float
+    windows: int
+    samples: int
+    # The distinct stacks summed over the windows
+    stacks: int
+    # The ratio of a CPU core used by the sampler thread
+    overhead: float
+
+
+class StackSamplerUpdate(BaseModel):
+    # Start or stop the sampler
+    running: bool
+
+
+class ResourceSeriesResponse(BaseModel):
+    # The seconds between the in-memory samples
+    interval: float
+    # The samples per field, oldest first, e.g. `{"timestamp": [...], "rss": [...]}`, see `RESOURCE_FIELDS`; the
+    # persisted samples have the `pid` field as well
+    series: dict[str, list[float]]
+
+
+class GrowthSchema(BaseModel):
+    # The object type, e.g. `builtins.dict`, or the allocation line, `file:line`
+    name: str
+    # The object counts or traced bytes of the censuses, oldest first
+    values: list[int]
+    growth: int
+
+
+class LeakReportResponse(BaseModel):
+    # The seconds between the scheduled censuses, `None` if not scheduled
+    interval: float | None
+    censuses: int
+    # The intervals a type or line has to grow at to be reported
+    intervals: int
+    types: list[GrowthSchema]
+    allocations: list[GrowthSchema]
+
+
+class LeakDetectorUpdate(BaseModel):
+    # Schedule or stop the censuses of this worker
+    running: bool
+    # The seconds between the censuses, `settings.leak_detector.interval` by default
+    interval: float | None = Field(default=None, gt=0)
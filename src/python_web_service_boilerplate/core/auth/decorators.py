@@ -21,7 +21,7 @@ def require_scopes(required_scopes: set[str]) -> Callable[[F], F]:
     def decorator(func: F) -> Any:
         def _check_scopes() -> None:
             """Common scope checking logic."""
-            logger.debug(f"@require_scopes checking scopes: {required_scopes}")
+            logger.debug("@require_scopes checking scopes: {}", required_scopes)
             request = get_current_request()
             scopes_str = getattr(request.state, "scopes", "")
             user_scopes = set(scopes_str.split(","))
@@ -37,7 +37,7 @@ def require_scopes(required_scopes: set[str]) -> Callable[[F], F]:
                     detail=f"Insufficient permissions. Required scopes: {joined_scopes}",
                     headers={"WWW-Authenticate": f'Bearer scope="{joined_scopes}"'},
                 )
-            logger.debug(f"Scope validation successful. Required: {required_scopes}, User has: {user_scopes}")
+            logger.debug("Scope validation successful. Required: {}, User has: {}", required_scopes, user_scopes)
 
         if inspect.iscoroutinefunction(func):
             # Async function wrapper
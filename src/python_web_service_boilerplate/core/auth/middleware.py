@@ -11,6 +11,7 @@ _PUBLIC_ENDPOINTS = {
     "POST /api/v1/token",
     "POST /api/v1/users",
     "GET /health",
+    "GET /metrics",
     "GET /docs",
     "GET /openapi.json",
     "GET /redoc",
@@ -22,7 +23,8 @@ class AuthMiddleware(BaseHTTPMiddleware):
         api = f"{request.method} {request.url.path}"
         # Public endpoints that do not require authentication
         if api in _PUBLIC_ENDPOINTS:
-            logger.info(f"Public endpoint: {api}, skipping auth")
+            # Logged on every request, the message is only formatted if DEBUG is enabled
+            logger.debug("Public endpoint: {}, skipping auth", api)
             return await call_next(request)
 
         auth_header = request.headers.get("Authorization")
@@ -2,11 +2,11 @@ from __future__ import annotations
 
 from datetime import datetime
 
-from sqlalchemy import BigInteger, Integer, Text, func
+from sqlalchemy import BigInteger, Index, Integer, Text, func
 from sqlmodel import Field, SQLModel
 
 from python_web_service_boilerplate.common.common_function import get_login_user, offline_environment
-from python_web_service_boilerplate.core.common_models import Deleted
+from python_web_service_boilerplate.core.common_models import LIVE_ROWS, Deleted
 
 
 class User(SQLModel, table=True):
@@ -18,17 +18,32 @@ class User(SQLModel, table=True):
         sa_type=BigInteger if not offline_environment() else Integer,
         description="The primary key",
     )
-    username: str = Field(max_length=64, index=True, unique=True, description="The username")
+    username: str = Field(max_length=64, description="The username")
     password: str = Field(max_length=512, description="The password")
-    email: str = Field(max_length=256, index=True, description="The email address")
+    email: str = Field(max_length=256, description="The email address")
     full_name: str = Field(max_length=128, description="The full name of the user")
     scopes: str = Field(sa_type=Text, description="The scopes/permissions assigned to the user, comma-separated")
 
-    # Common audit fields
+    # Common audit fields, bulk inserts fill them client-side too (see `bulk_insert()`)
     created_by: str = Field(default_factory=get_login_user, max_length=64, description="Created by")
-    created_at: datetime = Field(default_factory=datetime.now, description="Creation timestamp")
+    created_at: datetime = Field(
+        default_factory=datetime.now,
+        sa_column_kwargs={"default": None, "server_default": func.now()},
+        description="Creation timestamp",
+    )
     updated_by: str | None = Field(default_factory=get_login_user, max_length=64, description="Last updated by")
     updated_at: datetime | None = Field(
-        default_factory=datetime.now, sa_column_kwargs={"onupdate": func.now()}, description="Last update timestamp"
+        default_factory=datetime.now,
+        sa_column_kwargs={"default": None, "server_default": func.now(), "onupdate": func.now()},
+        description="Last update timestamp",
+    )
+    deleted: Deleted = Field(
+        default=Deleted.N, sa_column_kwargs={"server_default": Deleted.N.name}, description="Deletion flag"
+    )
+
+    # Partial indexes on live rows, soft-deleted rows are excluded from all ORM selects anyway.
+    # The username is unique among live users, thus a deleted user's username can be registered again.
+    __table_args__ = (
+        Index("ix_user_username_live", "username", unique=True, postgresql_where=LIVE_ROWS, sqlite_where=LIVE_ROWS),
+        Index("ix_user_email_live", "email", postgresql_where=LIVE_ROWS, sqlite_where=LIVE_ROWS),
     )
-    deleted: Deleted = Field(default=Deleted.N, description="Deletion flag")
@@ -1,6 +1,13 @@
 import enum
+from typing import Final
+
+from sqlalchemy import text
 
 
 class Deleted(enum.Enum):
     Y = "Yes"
     N = "No"
+
+
+# The WHERE clause of partial indexes covering live rows only, the enum is stored by name
+LIVE_ROWS: Final = text(f"deleted = '{Deleted.N.name}'")
@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from collections.abc import AsyncGenerator, AsyncIterable, Iterable, Mapping
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, Final, Union
+
+from loguru import logger
+from sqlalchemy import Table, func, insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.sql.dml import Insert
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from python_web_service_boilerplate.common.common_function import get_login_user
+from python_web_service_boilerplate.configuration.database import async_db_context
+from python_web_service_boilerplate.core.common_models import Deleted
+
+DEFAULT_CHUNK_SIZE: Final = 1000
+# Both PostgreSQL (32767) and SQLite (32766) limit the number of bound parameters in one statement
+_MAX_BIND_PARAMETERS: Final = 32000
+# Audit columns are filled once per bulk call, with the local time like the `datetime.now` defaults of the models, not
+# the server-side defaults (UTC `CURRENT_TIMESTAMP` on SQLite)
+_AUDIT_USER_COLUMNS: Final = ("created_by", "updated_by")
+_AUDIT_TIMESTAMP_COLUMNS: Final = ("created_at", "updated_at")
+_IMMUTABLE_AUDIT_COLUMNS: Final = ("created_by", "created_at")
+
+BulkRow = Union[SQLModel, Mapping[str, Any]]
+BulkRows = Union[Iterable[BulkRow], AsyncIterable[BulkRow]]
+
+
+@asynccontextmanager
+async def _session_scope(session: AsyncSession | None) -> AsyncGenerator[AsyncSession, None]:
+    """Use the given session as-is, or the request-scoped/a new one, see `async_db_context()`."""
+    if session is not None:
+        yield session
+        return
+    async with async_db_context() as db:
+        yield db
+
+
+async def _iterate(rows: BulkRows) -> AsyncGenerator[BulkRow, None]:
+    if isinstance(rows, AsyncIterable):
+        async for row in rows:
+            yield row
+    else:
+        for row in rows:
+            yield row
+
+
+async def _chunks(rows: BulkRows, chunk_size: int) -> AsyncGenerator[list[BulkRow], None]:
+    chunk: list[BulkRow] = []
+    async for row in _iterate(rows):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _effective_chunk_size(table: Table, chunk_size: int) -> int:
+    """Cap the chunk size, so that a multi-row VALUES statement never exceeds the bound parameter limit."""
+    return max(1, min(chunk_size, _MAX_BIND_PARAMETERS // len(table.columns)))
+
+
+def _to_values(table: Table, row: BulkRow, audit_values: Mapping[str, Any]) -> dict[str, Any]:
+    """
+    Convert a row into column values.
+
+    For SQLModel instances only explicitly set fields are kept, the unset ones (like the primary key) are left to the
+    database, the unset audit columns are filled with `audit_values`.
+    """
+    values = row.model_dump(exclude_unset=True) if isinstance(row, SQLModel) else dict(row)
+    values = {key: value for key, value in values.items() if key in table.columns}
+    for key, value in audit_values.items():
+        values.setdefault(key, value)
+    return values
+
+
+def _audit_values(table: Table) -> dict[str, Any]:
+    login_user = get_login_user()
+    now = datetime.now()
+    values: dict[str, Any] = {column: login_user for column in _AUDIT_USER_COLUMNS if column in table.columns}
+    values.update({column: now for column in _AUDIT_TIMESTAMP_COLUMNS if column in table.columns})
+    return values
+
+
+def _group_by_columns(values_list: list[dict[str, Any]]) -> dict[tuple[str, ...], list[dict[str, Any]]]:
+    """Rows of one multi-row VALUES or COPY statement must share the same columns."""
+    groups: dict[tuple[str, ...], list[dict[str, Any]]] = defaultdict(list)
+    for values in values_list:
+        groups[tuple(sorted(values))].append(values)
+    return groups
+
+
+def _dialect_insert(dialect_name: str, table: Table) -> postgresql.Insert | sqlite.Insert:
+    if dialect_name == "postgresql":
+        return postgresql.insert(table)
+    if dialect_name == "sqlite":
+        return sqlite.insert(table)
+    raise ValueError(f"Upsert is not supported for dialect: {dialect_name}")
+
+
+def _conflict_where(table: Table, conflict: list[str], dialect_name: str) -> Any:
+    """Get the WHERE clause of the partial unique index matching the conflict columns, which ON CONFLICT must repeat."""
+    for index in table.indexes:
+        if index.unique and {column.name for column in index.columns} == set(conflict):
+            return index.dialect_options[dialect_name]["where"]
+    return None
+
+
+async def _copy_records(
+    session: AsyncSession, table: Table, columns: tuple[str, ...], values_list: list[dict[str, Any]]
+) -> bool:
+    """
+    Write rows with PostgreSQL `COPY ... FROM STDIN` if the driver supports it (asyncpg).
+
+    :return: `False` if COPY is not available, so that the caller falls back to multi-row VALUES
+    """
+    connection = await session.connection()
+    if connection.dialect.name != "postgresql":
+        return False
+    raw_connection = await connection.get_raw_connection()
+    driver_connection = raw_connection.driver_connection
+    if driver_connection is None or not hasattr(driver_connection, "copy_records_to_table"):
+        return False
+    if not driver_connection.is_in_transaction():
+        # The driver adapter begins its transaction lazily, make sure COPY joins the session's transaction
+        await connection.exec_driver_sql("SELECT 1")
+    processors = [table.columns[column].type.bind_processor(connection.dialect) for column in columns]
+    records = [
+        tuple(
+            processor(values[column]) if processor else values[column] for column, processor in zip(columns, processors)
+        )
+        for values in values_list
+    ]
+    await driver_connection.copy_records_to_table(
+        table.name, records=records, columns=list(columns), schema_name=table.schema
+    )
+    return True
+
+
+async def bulk_insert(
+    model: type[SQLModel],
+    rows: BulkRows,
+    *,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    use_copy: bool = True,
+    session: AsyncSession | None = None,
+) -> int:
+    """
+    Insert rows in chunks, with PostgreSQL COPY where available and multi-row VALUES otherwise.
+
+    Usage:
+    >>> await bulk_insert(User, ({"username": f"user_{i}", ...} for i in range(100_000)), chunk_size=5000)
+
+    :param model: the SQLModel table class
+    :param rows: SQLModel instances or mappings of column values, either iterable or async iterable
+    :param chunk_size: the max number of rows per statement
+    :param use_copy: use PostgreSQL COPY if the driver supports it
+    :param session: an existing session to join, the caller is responsible to commit; if not given,
+    `async_db_context()` is used, which commits once all chunks are written
+    :return: the number of inserted rows
+    """
+    table: Table = model.__table__  # type: ignore[attr-defined]
+    audit_values = _audit_values(table)
+    inserted = 0
+    async with _session_scope(session) as db:
+        async for chunk in _chunks(rows, _effective_chunk_size(table, chunk_size)):
+            values_list = [_to_values(table, row, audit_values) for row in chunk]
+            for columns, group in _group_by_columns(values_list).items():
+                if not (use_copy and await _copy_records(db, table, columns, group)):
+                    await db.exec(insert(table).values(group))
+                inserted += len(group)
+            logger.debug(f"Bulk inserted {inserted} rows into {table.name}")
+    return inserted
+
+
+async def bulk_upsert(
+    model: type[SQLModel],
+    rows: BulkRows,
+    *,
+    conflict_columns: Iterable[str] | None = None,
+    update_columns: Iterable[str] | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    session: AsyncSession | None = None,
+) -> int:
+    """
+    Insert rows in chunks, updating the existing ones on conflict (`INSERT ... ON CONFLICT DO UPDATE`).
+
+    :param model: the SQLModel table class
+    :param rows: SQLModel instances or mappings of column values, either iterable or async iterable
+    :param conflict_columns: columns of a unique constraint or (partial) unique index, default is the primary key
+    :param update_columns: columns to update on conflict, default is all given columns except the conflict columns
+    and `created_by`/`created_at`
+    :param chunk_size: the max number of rows per statement
+    :param session: an existing session to join, see `bulk_insert()`
+    :return: the number of inserted or updated rows
+    """
+    table: Table = model.__table__  # type: ignore[attr-defined]
+    conflict = list(conflict_columns) if conflict_columns else [column.name for column in table.primary_key]
+    audit_values = _audit_values(table)
+    upserted = 0
+    async with _session_scope(session) as db:
+        dialect_name = (await db.connection()).dialect.name
+        index_where = _conflict_where(table, conflict, dialect_name)
+        async for chunk in _chunks(rows, _effective_chunk_size(table, chunk_size)):
+            values_list = [_to_values(table, row, audit_values) for row in chunk]
+            for columns, group in _group_by_columns(values_list).items():
+                statement = _dialect_insert(dialect_name, table).values(group)
+                updates = (
+                    list(update_columns)
+                    if update_columns is not None
+                    else [c for c in columns if c not in conflict and c not in _IMMUTABLE_AUDIT_COLUMNS]
+                )
+                set_: dict[str, Any] = {column: statement.excluded[column] for column in updates}
+                if set_ and "updated_at" in table.columns and "updated_at" not in set_:
+                    set_["updated_at"] = func.now()
+                upsert: Insert = (
+                    statement.on_conflict_do_update(index_elements=conflict, index_where=index_where, set_=set_)
+                    if set_
+                    else statement.on_conflict_do_nothing(index_elements=conflict, index_where=index_where)
+                )
+                await db.exec(upsert)
+                upserted += len(group)
+            logger.debug(f"Bulk upserted {upserted} rows into {table.name}")
+    return upserted
+
+
+async def bulk_soft_delete(
+    model: type[SQLModel],
+    ids: Iterable[Any] | AsyncIterable[Any],
+    *,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    session: AsyncSession | None = None,
+) -> int:
+    """
+    Flag rows as deleted by primary key in chunks (`UPDATE ... SET deleted = 'Y' WHERE id IN (...)`).
+
+    :param model: the SQLModel table class, must have the `deleted` column
+    :param ids: primary keys, either iterable or async iterable
+    :param chunk_size: the max number of primary keys per statement
+    :param session: an existing session to join, see `bulk_insert()`
+    :return: the number of rows flagged as deleted
+    """
+    table: Table = model.__table__  # type: ignore[attr-defined]
+    if "deleted" not in table.columns:
+        raise ValueError(f"Table {table.name} has no `deleted` column")
+    (primary_key,) = table.primary_key.columns
+    values: dict[str, Any] = {"deleted": Deleted.Y}
+    if "updated_at" in table.columns:
+        values["updated_at"] = func.now()
+    if "updated_by" in table.columns:
+        values["updated_by"] = get_login_user()
+    deleted = 0
+    async with _session_scope(session) as db:
+        async for chunk in _chunks(ids, min(chunk_size, _MAX_BIND_PARAMETERS)):
+            statement = update(table).where(primary_key.in_(chunk), table.columns.deleted == Deleted.N).values(values)
+            result = await db.exec(statement)
+            deleted += result.rowcount
+        logger.debug(f"Bulk soft deleted {deleted} rows from {table.name}")
+    return deleted
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import os
+import platform
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Integer
+from sqlmodel import Field, SQLModel
+
+from python_web_service_boilerplate.common.common_function import offline_environment
+
+
+class ResourceSample(SQLModel, table=True):
+    """
+    The resource usage of a worker process, downsampled from the in-memory series, see `configuration.resources`.
+
+    Append-only and deleted after the retention period, thus without the audit columns.
+    """
+
+    __tablename__ = "resource_sample"
+
+    id: int | None = Field(
+        default=None,
+        primary_key=True,
+        sa_type=BigInteger if not offline_environment() else Integer,
+        description="The primary key",
+    )
+    hostname: str = Field(max_length=64, default_factory=platform.node, description="The hostname of the worker")
+    pid: int = Field(default_factory=os.getpid, description="The process ID of the worker")
+    sampled_at: datetime = Field(index=True, description="The middle of the downsampled period")
+    rss: float = Field(description="The mean resident memory in bytes")
+    cpu_time: float = Field(description="The mean user and system CPU seconds since the process started")
+    open_fds: float = Field(description="The mean open file descriptors")
+    threads: float = Field(description="The mean threads")
+    thread_pool_queue: float = Field(description="The mean tasks waiting for a thread of the thread pool")
+    thread_pool_threads: float = Field(description="The mean threads of the thread pool")
+    db_pool_checked_out: float = Field(description="The mean checked-out connections of the async pools")
+    db_pool_overflow: float = Field(description="The mean overflow connections of the async pools")
+    gc_collections: float = Field(description="The mean garbage collections since the process started")
+    gc_collected: float = Field(description="The mean objects collected since the process started")
+    gc_uncollectable: float = Field(description="The mean uncollectable objects since the process started")
+
+    def __str__(self) -> str:
+        """String representation of the ResourceSample instance."""
+        return f"ResourceSample({self.hostname}:{self.pid} at {self.sampled_at}, rss: {self.rss:.0f})"
@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from loguru import logger
+from sqlalchemy import delete
+from sqlmodel import col, select
+
+from python_web_service_boilerplate.configuration.database import async_db_context, db_context
+from python_web_service_boilerplate.core.resource_sample.models import ResourceSample
+
+
+def save_resource_sample(resource_sample: ResourceSample, *, retained_after: datetime) -> None:
+    """Save a downsampled resource sample, and delete the samples older than `retained_after`, from a sync job."""
+    with db_context() as db:
+        db.add(resource_sample)
+        db.execute(delete(ResourceSample).where(ResourceSample.sampled_at < retained_after))  # type: ignore[arg-type]
+        db.commit()
+    logger.debug(f"Resource sample saved: {resource_sample}, retained after {retained_after}")
+
+
+async def get_resource_samples(since: datetime) -> list[ResourceSample]:
+    async with async_db_context() as db:
+        result = await db.exec(
+            select(ResourceSample).where(ResourceSample.sampled_at >= since).order_by(col(ResourceSample.sampled_at))
+        )
+        return list(result.all())
@@ -8,7 +8,7 @@ from sqlalchemy import BigInteger, Index, Integer, func
 from sqlmodel import Field, SQLModel
 
 from python_web_service_boilerplate.common.common_function import get_login_user, offline_environment
-from python_web_service_boilerplate.core.common_models import Deleted
+from python_web_service_boilerplate.core.common_models import LIVE_ROWS, Deleted
 
 
 class StartupLog(SQLModel, table=True):
@@ -46,17 +46,27 @@ class StartupLog(SQLModel, table=True):
     startup_time: datetime = Field(default_factory=datetime.now, description="When the application started")
     shutdown_time: datetime | None = Field(default=None, description="When the application shut down")
 
-    # Common audit fields
+    # Common audit fields, bulk inserts fill them client-side too (see `bulk_insert()`)
     created_by: str = Field(max_length=64, default_factory=get_login_user, description="Created by")
-    created_at: datetime = Field(default_factory=datetime.now, description="Creation timestamp")
+    created_at: datetime = Field(
+        default_factory=datetime.now,
+        sa_column_kwargs={"default": None, "server_default": func.now()},
+        description="Creation timestamp",
+    )
     updated_by: str | None = Field(max_length=64, default_factory=get_login_user, description="Last updated by")
     updated_at: datetime | None = Field(
-        default_factory=datetime.now, sa_column_kwargs={"onupdate": func.now()}, description="Last update timestamp"
+        default_factory=datetime.now,
+        sa_column_kwargs={"default": None, "server_default": func.now(), "onupdate": func.now()},
+        description="Last update timestamp",
+    )
+    deleted: Deleted = Field(
+        default=Deleted.N, sa_column_kwargs={"server_default": Deleted.N.name}, description="Deletion flag"
     )
-    deleted: Deleted = Field(default=Deleted.N, description="Deletion flag")
 
-    # Add indexes for common queries
-    __table_args__ = (Index("ix_startup_logs_startup_time", "startup_time"),)
+    # Add indexes for common queries, partial indexes on live rows
+    __table_args__ = (
+        Index("ix_startup_log_startup_time_live", "startup_time", postgresql_where=LIVE_ROWS, sqlite_where=LIVE_ROWS),
+    )
 
     def __str__(self) -> str:
         """String representation of the StartupLog instance."""
@@ -10,6 +10,7 @@ from sqlmodel import and_
 
 from python_web_service_boilerplate.common.common_function import get_module_name
 from python_web_service_boilerplate.configuration.database import (
+    DatabasePool,
     async_db_context,
 )
 from python_web_service_boilerplate.core.startup_log.models import StartupLog
@@ -18,7 +19,7 @@ from python_web_service_boilerplate.core.startup_log.models import StartupLog
 async def save_startup_log(startup_log: StartupLog) -> StartupLog:
     async with async_db_context() as db:
         db.add(startup_log)
-        await db.commit()
+        await db.flush()
         await db.refresh(startup_log)  # Refresh to get the generated ID
         logger.info(f"Startup log saved: {startup_log}")
     return startup_log
@@ -31,13 +32,13 @@ async def update_shutdown_time(startup_log: StartupLog | None) -> None:
     async with async_db_context() as db:
         startup_log.shutdown_time = datetime.now()
         db.add(startup_log)
-        await db.commit()
+        await db.flush()
         logger.info(f"Updated shutdown time for startup log ID {startup_log.id}: {startup_log.shutdown_time}")
 
 
 async def retain_startup_log() -> None:
     a_week_ago = arrow.now("local").shift(days=-7).floor("day").naive
-    async with async_db_context() as session:
+    async with async_db_context(pool=DatabasePool.BACKGROUND) as session:
         await session.execute(delete(StartupLog).where(and_(StartupLog.startup_time < a_week_ago)))
     # the affected_rows is always 1 no matter how many rows were deleted
     logger.debug(
@@ -47,8 +48,10 @@ async def retain_startup_log() -> None:
 
 
 async def stream_all_startup_logs() -> AsyncGenerator[StartupLog, None]:
-    async with async_db_context() as session:
+    # Streaming outlives the request handler, thus a dedicated session of the stream pool, which cannot starve the
+    # short queries of other requests
+    async with async_db_context(pool=DatabasePool.STREAM) as session:
         result = await session.stream_scalars(select(StartupLog))
         async for log in result:
-            logger.info(f"Retrieved startup logs, id: {log.id}")
+            logger.debug("Retrieved startup logs, id: {}", log.id)
             yield log
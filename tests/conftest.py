@@ -64,6 +64,10 @@ def auto_profile(request: Any) -> Generator[Any, Any, None]:
 
     https://pyinstrument.readthedocs.io/en/latest/guide.html#profile-pytest-tests
     """
+    if "soak" in request.keywords:
+        # The samples of a long run would be counted as retained memory
+        yield
+        return
     profile_root = PROJECT_ROOT_PATH / "build/.profiles"
     logger.info("Starting to profile Pytest unit tests...")
     # Turn profiling on
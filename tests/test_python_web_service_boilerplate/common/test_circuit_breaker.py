@@ -0,0 +1,82 @@
+from dataclasses import dataclass
+
+import pytest
+
+from python_web_service_boilerplate.common.circuit_breaker import (
+    CircuitBreaker,
+    CircuitBreakerOpenError,
+    CircuitBreakerState,
+)
+
+
+@dataclass
+class FakeClock:
+    now: float = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_circuit_breaker_opens_after_threshold() -> None:
+    breaker = CircuitBreaker("test", failure_threshold=3, recovery_timeout=10, clock=FakeClock())
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state is CircuitBreakerState.CLOSED
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state is CircuitBreakerState.OPEN
+    with pytest.raises(CircuitBreakerOpenError) as exc_info:
+        breaker.before_call()
+    assert exc_info.value.retry_after == 10
+    assert breaker.snapshot()["rejected_total"] == 1
+
+
+def test_circuit_breaker_success_resets_failures() -> None:
+    breaker = CircuitBreaker("test", failure_threshold=2, clock=FakeClock())
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state is CircuitBreakerState.CLOSED
+
+
+def test_circuit_breaker_half_open_probe() -> None:
+    clock = FakeClock()
+    breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=10, clock=clock)
+    breaker.record_failure()
+    assert breaker.state is CircuitBreakerState.OPEN
+    clock.now = 10
+    assert breaker.state is CircuitBreakerState.HALF_OPEN
+    # Only one probe call is let through
+    breaker.before_call()
+    with pytest.raises(CircuitBreakerOpenError):
+        breaker.before_call()
+    # A failed probe opens the breaker again
+    breaker.record_failure()
+    assert breaker.state is CircuitBreakerState.OPEN
+    clock.now = 20
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state is CircuitBreakerState.CLOSED
+    assert breaker.snapshot()["opened_total"] == 2
+
+
+def test_circuit_breaker_ignores_late_success_while_open() -> None:
+    breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=10, clock=FakeClock())
+    breaker.record_failure()
+    breaker.record_success()
+    assert breaker.state is CircuitBreakerState.OPEN
+
+
+def test_circuit_breaker_release_probe_keeps_half_open() -> None:
+    clock = FakeClock()
+    breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=10, clock=clock)
+    breaker.record_failure()
+    clock.now = 10
+    breaker.before_call()
+    with pytest.raises(CircuitBreakerOpenError):
+        breaker.before_call()
+    breaker.release_probe()
+    assert breaker.state is CircuitBreakerState.HALF_OPEN
+    # The probe slot is free again
+    breaker.before_call()
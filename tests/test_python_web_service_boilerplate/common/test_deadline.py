@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import asyncio
+from http import HTTPStatus
+
+from fastapi import FastAPI
+from starlette.testclient import TestClient
+
+from python_web_service_boilerplate.common.deadline import (
+    deadline_scope,
+    get_deadline,
+    get_deadline_exceeded_counts,
+    get_remaining_time,
+    request_deadline,
+)
+from python_web_service_boilerplate.common.middleware import DeadlineMiddleware
+
+deadline_app = FastAPI()
+deadline_app.add_middleware(DeadlineMiddleware)
+
+
+@deadline_app.get("/slow")
+@request_deadline(0.1)
+async def slow() -> dict[str, str]:
+    await asyncio.sleep(5)
+    return {"message": "too late"}
+
+
+@deadline_app.get("/remaining")
+@request_deadline(10)
+async def remaining() -> dict[str, float | None]:
+    return {"remaining": get_remaining_time()}
+
+
+@deadline_app.get("/unlimited")
+@request_deadline(None)
+async def unlimited() -> dict[str, float | None]:
+    return {"remaining": get_remaining_time()}
+
+
+def test_deadline_scope_can_only_shorten() -> None:
+    assert get_deadline() is None
+    with deadline_scope(1) as outer:
+        with deadline_scope(10) as inner:
+            assert inner == outer
+        with deadline_scope(None) as kept:
+            assert kept == outer
+        with deadline_scope(0.5) as shortened:
+            assert shortened is not None
+            assert outer is not None
+            assert shortened < outer
+    assert get_deadline() is None
+
+
+def test_handler_is_cancelled_after_deadline() -> None:
+    before = get_deadline_exceeded_counts().get("GET /slow", 0)
+    with TestClient(deadline_app) as client:
+        response = client.get("/slow")
+    assert response.status_code == HTTPStatus.GATEWAY_TIMEOUT.value
+    assert get_deadline_exceeded_counts()["GET /slow"] == before + 1
+
+
+def test_route_deadline_and_header_override() -> None:
+    with TestClient(deadline_app) as client:
+        route_deadline = client.get("/remaining").json()["remaining"]
+        assert 9 < route_deadline <= 10
+        # The header can only shorten the deadline
+        assert client.get("/remaining", headers={"X-Request-Timeout": "2"}).json()["remaining"] <= 2
+        assert 9 < client.get("/remaining", headers={"X-Request-Timeout": "60"}).json()["remaining"] <= 10
+        assert 9 < client.get("/remaining", headers={"X-Request-Timeout": "invalid"}).json()["remaining"] <= 10
+        assert client.get("/unlimited").json()["remaining"] is None
+        assert client.get("/unlimited", headers={"X-Request-Timeout": "2"}).json()["remaining"] <= 2
@@ -0,0 +1,40 @@
+import random
+
+import pytest
+
+from python_web_service_boilerplate.common.function_stats import FunctionStatsRegistry, QuantileSketch
+
+
+def test_quantile_sketch_relative_accuracy() -> None:
+    values = [random.lognormvariate(-5, 1.5) for _ in range(10_000)]
+    sketch = QuantileSketch()
+    for value in values:
+        sketch.add(value)
+    values.sort()
+    for q in (0.5, 0.9, 0.99):
+        exact = values[int(q * (len(values) - 1))]
+        assert sketch.percentile(q) == pytest.approx(exact, rel=0.02)
+    assert QuantileSketch().percentile(0.5) == 0.0
+
+
+def test_registry_top_functions_and_log_sampling() -> None:
+    registry = FunctionStatsRegistry(log_every=2)
+    logged = [registry.record("module.fast", "elapsed", 0.001) for _ in range(4)]
+    assert logged == [True, False, True, False]
+    registry.record("module.slow", "elapsed", 1.0, failed=True)
+    registry.record("module.slow", "memory", 1024)
+    top = registry.top(metric="elapsed")
+    assert [stats["function"] for stats in top] == ["module.slow", "module.fast"]
+    assert top[0]["errors"] == 1
+    fast = top[1]
+    assert fast["count"] == 4
+    assert fast["total"] == pytest.approx(0.004)
+    assert fast["min"] == fast["max"] == pytest.approx(0.001)
+    assert fast["p99"] == pytest.approx(0.001, rel=0.01)
+    assert [stats["function"] for stats in registry.top(metric="elapsed", sort="count")] == [
+        "module.fast",
+        "module.slow",
+    ]
+    assert registry.top(1, metric="memory")[0]["total"] == 1024
+    registry.reset()
+    assert registry.top() == []
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import tracemalloc
+
+import pytest
+
+from python_web_service_boilerplate.common.leak_detector import LeakDetector, growing
+from python_web_service_boilerplate.common.profiling import function_stats, mem_profile
+from python_web_service_boilerplate.configuration.application import settings
+
+
+class Leaked:
+    pass
+
+
+_leaked: list[Leaked] = []
+
+
+def leak(count: int) -> None:
+    _leaked.extend(Leaked() for _ in range(count))
+
+
+def test_growing() -> None:
+    counts = [{"leak": 1, "noise": 5}, {"leak": 2, "noise": 6, "new": 1}, {"leak": 4, "noise": 6, "new": 2}]
+    assert growing(counts, limit=10) == [
+        {"name": "leak", "values": [1, 2, 4], "growth": 3},
+        {"name": "new", "values": [0, 1, 2], "growth": 2},
+    ]
+    assert growing(counts, limit=1) == [{"name": "leak", "values": [1, 2, 4], "growth": 3}]
+    assert growing(counts[:1], limit=10) == []
+
+
+def test_leak_is_reported() -> None:
+    detector = LeakDetector(intervals=3)
+    assert not tracemalloc.is_tracing()
+    try:
+        # The first census starts tracing, the allocations are compared from the second one on
+        for _ in range(5):
+            assert detector.report()["types"] == []
+            leak(100)
+            detector.census()
+        report = detector.report()
+    finally:
+        detector.stop_tracing()
+        _leaked.clear()
+    assert report["censuses"] == 5
+    leaked_type = next(growth for growth in report["types"] if growth["name"] == f"{__name__}.Leaked")
+    assert leaked_type["growth"] == 300
+    assert any("test_leak_detector.py:" in growth["name"] for growth in report["allocations"])
+    assert detector.report()["censuses"] == 0
+
+
+def test_detector_and_mem_profile_share_tracemalloc(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings.profiling, "memory_sample_rate", 1.0)
+    detector = LeakDetector(intervals=1)
+
+    @mem_profile(mode="tracemalloc")
+    def stop_detector() -> None:
+        leak(10)
+        detector.stop_tracing()
+
+    function_stats.reset()
+    try:
+        detector.census()
+        # A sampled call doesn't stop tracing under the detector
+        mem_profile(mode="tracemalloc")(leak)(10)
+        assert tracemalloc.is_tracing()
+        # Nor does the detector stop tracing under a sampled call
+        stop_detector()
+        assert [stats["count"] for stats in function_stats.top(metric="memory")] == [1, 1]
+        assert not tracemalloc.is_tracing()
+    finally:
+        detector.stop_tracing()
+        _leaked.clear()
+        function_stats.reset()
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import gzip
+import random
+from pathlib import Path
+
+from loguru import logger
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from python_web_service_boilerplate.common.log_index import INDEX_SUFFIX, compress_and_index, search_trace
+
+_LINES = 50_000
+_LINE = (
+    "2026-10-18 12:00:{second:02d}.000 | INFO     | 42 | MainThread      | Trace={trace_id} | app.main:1 - {message}\n"
+)
+
+
+def _write_log(path: Path) -> None:
+    random.seed(0)
+    with path.open("w", encoding="utf-8") as file:
+        for i in range(_LINES):
+            trace_id = f"{random.randrange(5000):032x}" if i % 10 else ""
+            file.write(_LINE.format(second=i % 60, trace_id=trace_id, message=f"Record {i}"))
+            if i == _LINES // 2:
+                file.write(_LINE.format(second=0, trace_id="failed", message="Request failed"))
+                file.write("Traceback (most recent call last):\nZeroDivisionError: division by zero\n")
+
+
+def _scan_compressed(path: Path, trace_id: str) -> list[str]:
+    needle = f" | Trace={trace_id} | "
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        return [line.rstrip("\n") for line in file if needle in line]
+
+
+def test_compress_and_index(tmp_path: Path) -> None:
+    log_path = tmp_path / "app.vm.2026-10-18_00-00-00_000000.log"
+    _write_log(log_path)
+    original = log_path.read_bytes()
+    compress_and_index(str(log_path))
+    gzip_path = tmp_path / f"{log_path.name}.gz"
+    assert not log_path.exists()
+    assert (tmp_path / f"{gzip_path.name}{INDEX_SUFFIX}").exists()
+    # Still a valid gzip file for `zcat`
+    assert gzip.decompress(gzip_path.read_bytes()) == original
+
+    trace_id = f"{42:032x}"
+    records = search_trace(tmp_path, trace_id)
+    assert records
+    assert records == _scan_compressed(gzip_path, trace_id)
+    # The lines of the traceback belong to the record
+    assert search_trace(tmp_path, "failed") == [
+        _LINE.format(second=0, trace_id="failed", message="Request failed")
+        + "Traceback (most recent call last):\nZeroDivisionError: division by zero"
+    ]
+    assert search_trace(tmp_path, "unknown") == []
+
+
+def test_search_active_log_file(tmp_path: Path) -> None:
+    log_path = tmp_path / "app.vm.2026-10-18_00-00-00_000000.log"
+    _write_log(log_path)
+    active_path = tmp_path / "app.vm.2026-10-18_12-00-00_000000.log"
+    active_path.write_text(_LINE.format(second=1, trace_id="failed", message="Retried"), encoding="utf-8")
+    compress_and_index(str(log_path))
+    records = search_trace(tmp_path, "failed")
+    # Oldest first
+    assert len(records) == 2
+    assert records[1].endswith("Retried")
+
+
+def test_indexed_search_benchmark(benchmark: BenchmarkFixture, tmp_path: Path) -> None:
+    log_path = tmp_path / "app.vm.2026-10-18_00-00-00_000000.log"
+    _write_log(log_path)
+    compress_and_index(str(log_path))
+    benchmark(search_trace, tmp_path, f"{42:032x}")
+    # No statistics with `--benchmark-disable`
+    if benchmark.enabled:
+        logger.info(f"Indexed search: {benchmark.stats.stats.mean * 1000:.2f}ms")
+
+
+def test_scan_compressed_benchmark(benchmark: BenchmarkFixture, tmp_path: Path) -> None:
+    log_path = tmp_path / "app.vm.2026-10-18_00-00-00_000000.log"
+    _write_log(log_path)
+    compress_and_index(str(log_path))
+    benchmark(_scan_compressed, tmp_path / f"{log_path.name}.gz", f"{42:032x}")
+    # No statistics with `--benchmark-disable`
+    if benchmark.enabled:
+        logger.info(f"Scanning compressed log file: {benchmark.stats.stats.mean * 1000:.2f}ms")
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import time
+from collections.abc import Generator
+
+import pytest
+from loguru import logger
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from python_web_service_boilerplate.common.log_level import LogLevelController, LogSampling
+
+_MODULE = __name__
+
+
+@pytest.fixture
+def controller() -> LogLevelController:
+    return LogLevelController("INFO")
+
+
+@pytest.fixture
+def messages(controller: LogLevelController) -> Generator[list[str], None, None]:
+    collected: list[str] = []
+    # Added at TRACE, but records only pass through the controller
+    handler_id = logger.add(
+        lambda message: collected.append(message.record["message"]),
+        level="TRACE",
+        filter=lambda record: "log_level_test" in record["extra"] and controller(record),
+    )
+    yield collected
+    logger.remove(handler_id)
+
+
+def test_module_level_overrides_global_level(controller: LogLevelController, messages: list[str]) -> None:
+    bound = logger.bind(log_level_test=True)
+    bound.debug("hidden")
+    # The most specific module wins
+    controller.set_level("DEBUG", _MODULE.rpartition(".")[0])
+    controller.set_level("WARNING", "test_python_web_service_boilerplate")
+    bound.debug("shown")
+    assert controller.floor == "DEBUG"
+    controller.reset_level(_MODULE.rpartition(".")[0])
+    bound.info("hidden by the parent module")
+    bound.warning("warning")
+    assert messages == ["shown", "warning"]
+    assert controller.levels() == {"": "INFO", "test_python_web_service_boilerplate": "WARNING"}
+    with pytest.raises(ValueError, match="not exist"):
+        controller.set_level("VERBOSE")
+
+
+def test_listener_is_called_when_floor_changes(controller: LogLevelController) -> None:
+    floors: list[str] = []
+    controller.add_listener(floors.append)
+    controller.set_level("DEBUG", _MODULE)
+    controller.set_level("TRACE", _MODULE)
+    # The floor stays TRACE
+    controller.set_level("ERROR")
+    controller.reset_level(_MODULE)
+    assert floors == ["DEBUG", "TRACE", "ERROR"]
+
+
+def test_sampling_one_in_n_per_call_site(controller: LogLevelController, messages: list[str]) -> None:
+    controller.set_sampling(_MODULE, LogSampling(every=10))
+    bound = logger.bind(log_level_test=True)
+    for i in range(100):
+        bound.info("site A {}", i)
+        bound.info("site B {}", i)
+    # Warnings are never sampled
+    for i in range(5):
+        bound.warning("warning {}", i)
+    assert len([message for message in messages if message.startswith("site A")]) == 10
+    assert len([message for message in messages if message.startswith("site B")]) == 10
+    assert len([message for message in messages if message.startswith("warning")]) == 5
+    assert controller.statistics() == {_MODULE: 180}
+
+
+def test_sampling_per_second(controller: LogLevelController, messages: list[str]) -> None:
+    controller.set_sampling(_MODULE, LogSampling(per_second=5))
+    bound = logger.bind(log_level_test=True)
+    start = time.monotonic()
+    while time.monotonic() - start < 0.5:
+        bound.info("flood")
+    # 5 records of the initial bucket, plus about 2.5 records refilled in 0.5 seconds
+    assert 5 <= len(messages) <= 9
+    controller.set_sampling(_MODULE, None)
+    messages.clear()
+    for _ in range(10):
+        bound.info("flood")
+    assert len(messages) == 10
+
+
+def test_sampling_decision_is_shared_by_sinks(controller: LogLevelController, messages: list[str]) -> None:
+    second_sink: list[str] = []
+    handler_id = logger.add(
+        lambda message: second_sink.append(message.record["message"]),
+        level="TRACE",
+        filter=lambda record: "log_level_test" in record["extra"] and controller(record),
+    )
+    controller.set_sampling(_MODULE, LogSampling(every=2))
+    try:
+        for i in range(10):
+            logger.bind(log_level_test=True).info(f"record {i}")
+    finally:
+        logger.remove(handler_id)
+    assert messages == second_sink == [f"record {i}" for i in range(0, 10, 2)]
+
+
+def test_disabled_log_call_benchmark(benchmark: BenchmarkFixture) -> None:
+    # Below the level of all sinks, loguru returns before creating the record and formatting the message
+    payload = {"key": "value" * 100}
+
+    def log_disabled() -> None:
+        for _ in range(1000):
+            logger.trace("Disabled record: {}", payload)
+
+    benchmark(log_disabled)
+    # No statistics with `--benchmark-disable`
+    if benchmark.enabled:
+        logger.info(f"Disabled log call: {benchmark.stats.stats.mean / 1000 * 1e9:.0f}ns")
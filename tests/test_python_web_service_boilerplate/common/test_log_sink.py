@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import io
+import os
+import time
+from collections.abc import Callable
+from typing import TYPE_CHECKING
+
+import orjson
+from loguru import logger
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from python_web_service_boilerplate.common.log_sink import BatchedJsonSink, json_format
+from python_web_service_boilerplate.configuration.loguru import _message_format, trace_id_filter
+
+if TYPE_CHECKING:
+    from loguru import Record
+
+_RECORDS = 20_000
+
+
+def test_batched_json_sink_serializes_records() -> None:
+    stream = io.BytesIO()
+    sink = BatchedJsonSink(stream, flush_interval=60)
+    # TRACE records only reach the sink under test, not the application's sinks
+    handler_id = logger.add(
+        sink, level="TRACE", format=json_format, filter=lambda record: "sink_test" in record["extra"]
+    )
+    try:
+        sink_logger = logger.bind(sink_test=True, trace_id="abc123")
+        sink_logger.trace("Hello {}", "JSON")
+        try:
+            _ = 1 / 0
+        except ZeroDivisionError:
+            sink_logger.opt(exception=True).trace("Failed")
+    finally:
+        logger.remove(handler_id)
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 2
+    record = orjson.loads(lines[0])
+    assert record["message"] == "Hello JSON"
+    assert record["level"] == "TRACE"
+    assert record["trace_id"] == "abc123"
+    assert record["extra"] == {"sink_test": True}
+    assert "ZeroDivisionError" in orjson.loads(lines[1])["exception"]
+    assert sink.statistics()["written"] == 2
+
+
+def test_batched_json_sink_drops_records_when_full() -> None:
+    stream = io.BytesIO()
+    # The writer thread neither wakes up by interval nor by batch size
+    sink = BatchedJsonSink(stream, buffer_size=10, batch_size=100, flush_interval=60)
+    handler_id = logger.add(
+        sink, level="TRACE", format=json_format, filter=lambda record: "sink_test" in record["extra"]
+    )
+    try:
+        for i in range(15):
+            logger.bind(sink_test=True).trace(f"Record {i}")
+        assert sink.statistics()["dropped"] == 5
+    finally:
+        logger.remove(handler_id)
+    assert len(stream.getvalue().splitlines()) == 10
+
+
+def _benchmark_sink(
+    benchmark: BenchmarkFixture, add_sink: Callable[[io.BufferedWriter], tuple[int, Callable[[], None]]]
+) -> None:
+    """Log records until all are written, the time spent in the logging calls alone is recorded as well."""
+    with open(os.devnull, "wb") as devnull:  # noqa: PTH123
+        handler_id, flush = add_sink(devnull)
+        sink_logger = logger.bind(benchmark=True)
+        caller_times: list[float] = []
+
+        def log_records() -> None:
+            start = time.perf_counter()
+            for i in range(_RECORDS):
+                sink_logger.trace("Benchmark record {}", i)
+            caller_times.append(time.perf_counter() - start)
+            flush()
+
+        try:
+            benchmark.pedantic(log_records, rounds=3, iterations=1)
+        finally:
+            logger.remove(handler_id)
+    if not benchmark.enabled:
+        # No statistics with `--benchmark-disable`
+        return
+    benchmark.extra_info["records_per_second"] = _RECORDS / benchmark.stats.stats.mean
+    benchmark.extra_info["caller_records_per_second"] = _RECORDS * len(caller_times) / sum(caller_times)
+    logger.info(
+        f"{benchmark.name}: {benchmark.extra_info['records_per_second']:.0f} records/sec written, "
+        f"{benchmark.extra_info['caller_records_per_second']:.0f} records/sec in the logging calls"
+    )
+
+
+def _is_benchmark(record: Record) -> bool:
+    return "benchmark" in record["extra"]
+
+
+def test_text_sink_benchmark(benchmark: BenchmarkFixture) -> None:
+    def add_sink(stream: io.BufferedWriter) -> tuple[int, Callable[[], None]]:
+        text_stream = io.TextIOWrapper(stream, write_through=True)
+        handler_id = logger.add(
+            text_stream,
+            level="TRACE",
+            format=_message_format,
+            filter=lambda record: _is_benchmark(record) and trace_id_filter(record),
+        )
+        return handler_id, text_stream.flush
+
+    _benchmark_sink(benchmark, add_sink)
+
+
+def test_json_sink_benchmark(benchmark: BenchmarkFixture) -> None:
+    def add_sink(stream: io.BufferedWriter) -> tuple[int, Callable[[], None]]:
+        sink = BatchedJsonSink(stream, buffer_size=_RECORDS)
+        handler_id = logger.add(
+            sink,
+            level="TRACE",
+            format=json_format,
+            filter=lambda record: _is_benchmark(record) and trace_id_filter(record),
+        )
+        return handler_id, sink.write_buffered
+
+    _benchmark_sink(benchmark, add_sink)
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+import pytest
+
+from python_web_service_boilerplate.common.loop_monitor import BlockingCallError, LoopLagMonitor, check_not_on_loop
+
+
+def block_the_loop(seconds: float) -> None:
+    time.sleep(seconds)
+
+
+@pytest.mark.asyncio
+async def test_blocking_call_is_named() -> None:
+    monitor = LoopLagMonitor(interval=0.01, threshold=0.05, buckets=(0.01, 0.1, 1.0))
+    monitor.start()
+    try:
+        await asyncio.sleep(0.05)
+        block_the_loop(0.3)
+        await asyncio.sleep(0.05)
+    finally:
+        monitor.stop()
+    locations = monitor.locations()
+    assert len(locations) == 1
+    location, count = next(iter(locations.items()))
+    assert location.endswith(" block_the_loop")
+    assert "test_loop_monitor.py:" in location
+    assert count == 1
+    counts, total = monitor.histogram()
+    # The lag of the blocked wake-up, between 0.1s and 1s
+    assert counts[2] == 1
+    assert total >= 0.2
+    statistics = monitor.statistics()
+    assert statistics["running"] is False
+    assert statistics["stalls"] == 1
+    assert statistics["max_lag"] >= 0.2
+
+
+def test_record() -> None:
+    monitor = LoopLagMonitor(buckets=(0.01, 0.1))
+    for lag in (0.0, 0.01, 0.05, 2.0):
+        monitor.record(lag)
+    counts, total = monitor.histogram()
+    assert counts == [2, 1, 1]
+    assert total == pytest.approx(2.06)
+
+
+@pytest.mark.asyncio
+async def test_check_not_on_loop() -> None:
+    with pytest.raises(BlockingCallError, match="Synchronous database session blocks the event loop"):
+        check_not_on_loop("Synchronous database session")
+    # Off the loop, in a thread pool
+    await asyncio.to_thread(check_not_on_loop, "Synchronous database session")
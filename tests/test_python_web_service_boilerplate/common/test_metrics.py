@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import os
+import threading
+from pathlib import Path
+
+import orjson
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from python_web_service_boilerplate.common.metrics import (
+    MetricsRegistry,
+    MetricsSpool,
+    Sample,
+    histogram_samples,
+    render_prometheus,
+    statistics_samples,
+)
+
+ROUTE = "GET /api/v1/users/{user_id}"
+
+
+def test_registry_merges_threads() -> None:
+    registry = MetricsRegistry((0.1, 1.0))
+    registry.request_started(ROUTE)
+    registry.request_finished(ROUTE, 200, 0.05)
+
+    def record_in_thread() -> None:
+        registry.request_started(ROUTE)
+        registry.request_finished(ROUTE, 404, 0.5)
+        registry.request_started(ROUTE)
+        registry.request_finished(ROUTE, 500, 5.0)
+
+    thread = threading.Thread(target=record_in_thread)
+    thread.start()
+    thread.join()
+    registry.request_started(ROUTE)
+    assert registry.snapshot() == {
+        ROUTE: {"requests": {"2xx": 1, "4xx": 1, "5xx": 1}, "buckets": [1, 1, 1], "sum": 5.55, "in_flight": 1}
+    }
+
+
+def test_render_prometheus() -> None:
+    registry = MetricsRegistry((0.1, 1.0))
+    registry.request_started(ROUTE)
+    registry.request_finished(ROUTE, 200, 0.05)
+    registry.request_started(ROUTE)
+    registry.request_finished(ROUTE, 200, 0.5)
+    text = render_prometheus(
+        registry.snapshot(),
+        registry.buckets,
+        [
+            Sample("db_pool_checked_out", 2, {"pool": "oltp"}),
+            *statistics_samples("log_sink", {"dropped": 3, "buffered": 1}, counters=("dropped",)),
+            *statistics_samples("db_circuit_breaker", {"failures_total": 4}),
+        ],
+    )
+    lines = text.splitlines()
+    assert f'http_requests_total{{route="{ROUTE}",status="2xx"}} 2' in lines
+    assert f'http_request_duration_seconds_bucket{{route="{ROUTE}",le="0.1"}} 1' in lines
+    assert f'http_request_duration_seconds_bucket{{route="{ROUTE}",le="1.0"}} 2' in lines
+    assert f'http_request_duration_seconds_bucket{{route="{ROUTE}",le="+Inf"}} 2' in lines
+    assert f'http_request_duration_seconds_count{{route="{ROUTE}"}} 2' in lines
+    assert f'http_requests_in_flight{{route="{ROUTE}"}} 0' in lines
+    assert 'db_pool_checked_out{pool="oltp"} 2' in lines
+    assert "log_sink_dropped 3" in lines
+    assert "# TYPE db_pool_checked_out gauge" in lines
+    assert "# TYPE log_sink_dropped counter" in lines
+    assert "# TYPE log_sink_buffered gauge" in lines
+    assert "# TYPE db_circuit_breaker_failures_total counter" in lines
+    assert text.endswith("\n")
+
+
+def test_render_histogram_samples() -> None:
+    text = render_prometheus({}, (), histogram_samples("event_loop_lag_seconds", (0.01, 0.1), [3, 1, 0], 0.06))
+    lines = text.splitlines()
+    family = lines[lines.index("# TYPE event_loop_lag_seconds histogram") + 1 :]
+    assert family == [
+        'event_loop_lag_seconds_bucket{le="0.01"} 3',
+        'event_loop_lag_seconds_bucket{le="0.1"} 4',
+        'event_loop_lag_seconds_bucket{le="+Inf"} 4',
+        "event_loop_lag_seconds_sum 0.06",
+        "event_loop_lag_seconds_count 4",
+    ]
+    assert not any(line.startswith("# TYPE event_loop_lag_seconds_") for line in lines)
+
+
+def test_spool_merges_workers(tmp_path: Path) -> None:
+    worker = MetricsRegistry((0.1,))
+    worker.request_started(ROUTE)
+    worker.request_finished(ROUTE, 200, 0.05)
+    # The file of another worker process
+    other_worker = {ROUTE: {"requests": {"5xx": 1}, "buckets": [0, 1], "sum": 0.2, "in_flight": 1}}
+    (tmp_path / "1.json").write_bytes(
+        orjson.dumps({"routes": other_worker, "samples": [["log_sink_dropped", 1, {"pid": "1"}, "counter"]]})
+    )
+    # The file of a stopped worker
+    stopped_worker = tmp_path / "2.json"
+    stopped_worker.write_bytes(orjson.dumps({"routes": other_worker, "samples": []}))
+    os.utime(stopped_worker, (0, 0))
+    spool = MetricsSpool(tmp_path, worker, lambda: [Sample("log_sink_dropped", 2, kind="counter")], interval=60)
+    try:
+        snapshot, samples = spool.merge()
+    finally:
+        spool.stop()
+    assert snapshot == {
+        ROUTE: {"requests": {"2xx": 1, "5xx": 1}, "buckets": [1, 1], "sum": 0.25, "in_flight": 1},
+    }
+    assert sorted(samples) == [
+        Sample("log_sink_dropped", 1, {"pid": "1"}, "counter"),
+        Sample("log_sink_dropped", 2, {"pid": str(os.getpid())}, "counter"),
+    ]
+    assert not stopped_worker.exists()
+    assert [path.name for path in tmp_path.iterdir()] == ["1.json"]
+
+
+def test_record_request_benchmark(benchmark: BenchmarkFixture) -> None:
+    registry = MetricsRegistry((0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+
+    def record_request() -> None:
+        registry.request_started(ROUTE)
+        registry.request_finished(ROUTE, 200, 0.042)
+
+    benchmark(record_request)
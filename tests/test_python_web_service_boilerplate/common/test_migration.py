@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import contextlib
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from loguru import logger
+from pytest_mock import MockerFixture
+from sqlalchemy import Connection, Engine, create_engine, inspect, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import OperationalError
+
+from python_web_service_boilerplate.common.migration import (
+    backfill_in_batches,
+    create_index_concurrently,
+    lock_timeout,
+)
+
+_ROWS = 20_000
+
+
+def _seed(db_file: Path) -> Engine:
+    engine = create_engine(f"sqlite:///{db_file}", connect_args={"timeout": 5})
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            "CREATE TABLE user (id INTEGER PRIMARY KEY, email VARCHAR(256) NOT NULL, locale VARCHAR(16))"
+        )
+        connection.execute(
+            text("INSERT INTO user (email) VALUES (:email)"),
+            [{"email": f"user_{i}@test.com"} for i in range(_ROWS)],
+        )
+    return engine
+
+
+def test_writes_continue_during_backfill(tmp_path: Path) -> None:
+    engine = _seed(tmp_path / "backfill.db")
+    backfill_done = threading.Event()
+    write_latencies: list[float] = []
+
+    def write_continuously() -> None:
+        with engine.connect() as connection:
+            i = 0
+            while not backfill_done.is_set():
+                start = time.perf_counter()
+                with connection.begin():
+                    connection.execute(
+                        text("INSERT INTO user (email, locale) VALUES (:email, 'de_DE')"), {"email": f"new_{i}"}
+                    )
+                write_latencies.append(time.perf_counter() - start)
+                i += 1
+                time.sleep(0.001)
+
+    writer = threading.Thread(target=write_continuously)
+    writer.start()
+    try:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            updated = backfill_in_batches(
+                connection, "user", {"locale": "en_US"}, where="locale IS NULL", batch_size=1000, throttle=0.005
+            )
+    finally:
+        backfill_done.set()
+        writer.join()
+    logger.info(f"Writes during backfill: {len(write_latencies)}, max latency: {max(write_latencies) * 1000:.1f}ms")
+    assert updated == _ROWS
+    # Every batch is committed on its own, so the application's writes are interleaved instead of blocked
+    assert len(write_latencies) > 10
+    assert max(write_latencies) < 1
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT count(*) FROM user WHERE locale IS NULL")).scalar_one() == 0
+        # The application's rows are not overwritten
+        assert connection.execute(text("SELECT count(*) FROM user WHERE locale = 'de_DE'")).scalar_one() == len(
+            write_latencies
+        )
+    engine.dispose()
+
+
+def test_lock_timeout_fails_fast(tmp_path: Path) -> None:
+    engine = _seed(tmp_path / "lock_timeout.db")
+    with engine.connect() as blocker, engine.connect() as migration:
+        # A long transaction of the application holds the write lock
+        blocker.exec_driver_sql("BEGIN IMMEDIATE")
+        start = time.perf_counter()
+        with lock_timeout("100ms", migration), pytest.raises(OperationalError, match="locked"):
+            migration.exec_driver_sql("ALTER TABLE user ADD COLUMN nickname VARCHAR(64)")
+        assert time.perf_counter() - start < 1
+        blocker.rollback()
+        # The previous busy timeout is restored
+        assert migration.exec_driver_sql("PRAGMA busy_timeout").scalar_one() == 5000
+    engine.dispose()
+
+
+@pytest.mark.parametrize("fail", [False, True])
+def test_lock_timeout_is_restored_on_postgresql(mocker: MockerFixture, *, fail: bool) -> None:
+    connection = mocker.MagicMock(spec=Connection)
+    connection.dialect = postgresql.dialect()
+    connection.exec_driver_sql.return_value.scalar_one.return_value = "1s"
+    with pytest.raises(RuntimeError) if fail else contextlib.nullcontext(), lock_timeout("100ms", connection):
+        connection.exec_driver_sql.assert_called_with("SET LOCAL lock_timeout = '100ms'")
+        if fail:
+            raise RuntimeError("DDL failed")
+    statement, parameters = connection.execute.call_args.args
+    assert "set_config('lock_timeout', :value, true)" in str(statement)
+    assert parameters == {"value": "1s"}
+
+
+def test_create_index_concurrently(tmp_path: Path) -> None:
+    engine = _seed(tmp_path / "index.db")
+    with engine.begin() as connection, Operations.context(MigrationContext.configure(connection)):
+        create_index_concurrently("ix_user_email", "user", ["email"])
+        # Idempotent, a failed migration can be retried
+        create_index_concurrently("ix_user_email", "user", ["email"])
+    index_names = {index["name"] for index in inspect(engine).get_indexes("user")}
+    assert "ix_user_email" in index_names
+    engine.dispose()
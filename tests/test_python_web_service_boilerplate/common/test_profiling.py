@@ -1,13 +1,18 @@
 import asyncio
+import time
+import tracemalloc
 from time import sleep
 
 import pytest
+from pytest_benchmark.fixture import BenchmarkFixture
 
 from python_web_service_boilerplate.common.profiling import (
     cpu_profile,
     elapsed_time,
+    function_stats,
     mem_profile,
 )
+from python_web_service_boilerplate.configuration.application import settings
 
 
 @mem_profile()
@@ -64,3 +69,122 @@ async def test_async_time_consuming_function_when_input_contains_exception() ->
         await async_time_consuming_function("exception")
     assert exc_info is not None
     assert exc_info.value is not None
+
+
+@elapsed_time()
+def add(a: int, b: int) -> int:
+    return a + b
+
+
+def test_elapsed_time_is_recorded_unless_disabled() -> None:
+    function = f"{add.__module__}.{add.__qualname__}"
+    function_stats.reset()
+    assert add(1, 2) == 3
+    assert [stats["function"] for stats in function_stats.top()] == [function]
+    function_stats.enabled = False
+    try:
+        assert add(1, 2) == 3
+    finally:
+        function_stats.enabled = True
+    assert function_stats.top()[0]["count"] == 1
+
+
+def test_elapsed_time_benchmark(benchmark: BenchmarkFixture) -> None:
+    benchmark(add, 1, 2)
+
+
+def test_elapsed_time_disabled_benchmark(benchmark: BenchmarkFixture) -> None:
+    function_stats.enabled = False
+    try:
+        benchmark(add, 1, 2)
+    finally:
+        function_stats.enabled = True
+
+
+_retained: list[bytes] = []
+
+
+@mem_profile(mode="tracemalloc")
+def allocate(size: int) -> None:
+    _retained.append(bytes(size))
+
+
+def test_mem_profile_with_tracemalloc(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings.profiling, "memory_sample_rate", 1.0)
+    function = f"{allocate.__module__}.{allocate.__qualname__}"
+    function_stats.reset()
+    allocate(1024 * 1024)
+    allocate(1024 * 1024)
+    _retained.clear()
+    stats = function_stats.top(metric="memory")[0]
+    assert stats["function"] == function
+    assert stats["count"] == 2
+    assert stats["min"] >= 1024 * 1024
+    top_allocation = stats["allocations"][0]
+    assert top_allocation["line"].startswith(__file__)
+    assert top_allocation["size"] >= 2 * 1024 * 1024
+    assert not tracemalloc.is_tracing()
+
+    monkeypatch.setattr(settings.profiling, "memory_sample_rate", 0.0)
+    allocate(1024)
+    assert function_stats.top(metric="memory")[0]["count"] == 2
+
+
+def test_mem_profile_measuring_error_does_not_fail_the_call(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings.profiling, "memory_sample_rate", 1.0)
+    function_stats.reset()
+    take_snapshot = tracemalloc.take_snapshot
+
+    def fail_after_call() -> tracemalloc.Snapshot:
+        if _retained:
+            raise RuntimeError("injected fault")
+        return take_snapshot()
+
+    monkeypatch.setattr(tracemalloc, "take_snapshot", fail_after_call)
+    allocate(1024)
+    _retained.clear()
+    assert function_stats.top(metric="memory") == []
+    # The call is counted as finished, thus tracing stopped
+    assert not tracemalloc.is_tracing()
+    monkeypatch.undo()
+    allocate(1024)
+    _retained.clear()
+    assert not tracemalloc.is_tracing()
+
+
+def _burn_cpu(seconds: float) -> None:
+    # Until the thread used the CPU for `seconds`, whatever the other threads are doing on a busy machine
+    deadline = time.thread_time() + seconds
+    while time.thread_time() < deadline:
+        pass
+
+
+@cpu_profile()
+def cpu_bound() -> None:
+    _burn_cpu(0.2)
+
+
+@cpu_profile()
+async def io_bound() -> None:
+    await asyncio.sleep(0.2)
+
+
+def test_cpu_profile_of_cpu_bound_function() -> None:
+    function_stats.reset()
+    cpu_bound()
+    assert function_stats.top(metric="cpu")[0]["total"] >= 0.15
+    assert function_stats.top(metric="cpu_ratio")[0]["total"] > 0.75
+
+
+@pytest.mark.asyncio
+async def test_cpu_profile_of_io_bound_function_ignores_other_tasks() -> None:
+    function_stats.reset()
+
+    async def busy_task() -> None:
+        await asyncio.sleep(0.05)
+        # Blocks the event loop while `io_bound()` awaits
+        _burn_cpu(0.1)
+
+    await asyncio.gather(io_bound(), busy_task())
+    assert function_stats.top(metric="cpu")[0]["total"] < 0.05
+    assert function_stats.top(metric="cpu_ratio")[0]["total"] < 0.25
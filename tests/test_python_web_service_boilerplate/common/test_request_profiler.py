@@ -0,0 +1,39 @@
+import contextvars
+import time
+from pathlib import Path
+
+import orjson
+import pytest
+
+from python_web_service_boilerplate.common import request_profiler
+from python_web_service_boilerplate.configuration.application import settings
+
+
+def _profile(name: str) -> Path:
+    profiler = request_profiler.create_profiler()
+    profiler.start()
+    deadline = time.perf_counter() + 0.05
+    while time.perf_counter() < deadline:
+        pass
+    profiler.stop()
+    return request_profiler.save_profile(profiler, name)
+
+
+def test_save_speedscope_profiles_and_keep_newest(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(request_profiler, "get_data_dir", lambda _sub_path: tmp_path)
+    monkeypatch.setattr(settings.profiling, "request_format", "speedscope")
+    monkeypatch.setattr(settings.profiling, "request_max_files", 2)
+    other_file = tmp_path / "README.md"
+    other_file.write_text("Not a profile")
+    names = [request_profiler.profile_name(f"trace/{number}") for number in range(3)]
+    assert names[0].endswith("_trace_0.speedscope.json")
+    for name in names:
+        # Outside the context of the `auto_profile` fixture, pyinstrument allows one profiler per context
+        path = contextvars.Context().run(_profile, name)
+        assert orjson.loads(path.read_bytes())["$schema"].startswith("https://www.speedscope.app")
+    assert [profile["name"] for profile in request_profiler.list_profiles()] == names[:0:-1]
+    assert request_profiler.get_profile(names[2]) == tmp_path / names[2]
+    assert request_profiler.get_profile(names[0]) is None
+    assert request_profiler.get_profile("../.env") is None
+    # Retention only deletes profiles
+    assert other_file.exists()
@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import psutil
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from python_web_service_boilerplate.common.resource_series import RESOURCE_FIELDS, ResourceSeries, sample_process
+
+
+def test_sample_process() -> None:
+    sample = sample_process(psutil.Process())
+    assert sample["rss"] > 0
+    assert sample["cpu_time"] > 0
+    assert sample["open_fds"] > 0
+    assert sample["threads"] >= 1
+    assert sample["gc_collections"] >= 0
+    assert set(sample) <= set(RESOURCE_FIELDS)
+
+
+def test_ring_buffer() -> None:
+    series = ResourceSeries(capacity=3)
+    assert series.series() == {field: [] for field in RESOURCE_FIELDS}
+    assert series.mean(2) == {}
+    for timestamp in range(1, 6):
+        series.append({"timestamp": timestamp, "rss": timestamp * 10})
+    assert len(series) == 3
+    # The oldest samples are overwritten
+    assert series.series()["timestamp"] == [3, 4, 5]
+    assert series.series(since=4)["rss"] == [40, 50]
+    # Missing fields are stored as 0
+    assert series.series()["threads"] == [0, 0, 0]
+    assert series.mean(2)["rss"] == 45
+    assert series.mean(10)["rss"] == 40
+
+
+def test_sample_process_benchmark(benchmark: BenchmarkFixture) -> None:
+    process = psutil.Process()
+    benchmark(sample_process, process)
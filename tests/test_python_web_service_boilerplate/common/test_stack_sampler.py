@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import threading
+import time
+
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from python_web_service_boilerplate.common.stack_sampler import TRUNCATED_STACK, StackSampler
+
+
+def busy_wait(stopped: threading.Event) -> None:
+    while not stopped.is_set():
+        time.sleep(0.001)
+
+
+def run_busy_threads(sampler: StackSampler, count: int = 1) -> None:
+    stopped = threading.Event()
+    threads = [threading.Thread(target=busy_wait, args=(stopped,), name=f"busy-thread-{i}") for i in range(count)]
+    for thread in threads:
+        thread.start()
+    try:
+        sampler.sample()
+    finally:
+        stopped.set()
+        for thread in threads:
+            thread.join()
+
+
+def test_sample() -> None:
+    sampler = StackSampler()
+    run_busy_threads(sampler)
+    lines = sampler.collapsed().splitlines()
+    busy_stack = next(line for line in lines if line.startswith("busy-thread-0;"))
+    stack, count = busy_stack.rsplit(" ", 1)
+    assert count == "1"
+    assert "busy_wait (test_stack_sampler.py:" in stack
+    # The outermost frame first
+    assert stack.index("_bootstrap") < stack.index("busy_wait")
+    # The calling thread is not sampled
+    assert not any("run_busy_threads" in line for line in lines)
+    assert sampler.statistics()["samples"] == 1
+
+
+def test_windows_are_rotated_and_bounded() -> None:
+    sampler = StackSampler(window=0.0, max_windows=2)
+    for _ in range(5):
+        run_busy_threads(sampler)
+    statistics = sampler.statistics()
+    # The 2 rotated windows and the current one
+    assert statistics["windows"] == 3
+    assert statistics["samples"] == 3
+    assert sampler.collapsed(windows=1).count("busy-thread-0;") == 1
+
+    sampler = StackSampler(max_stacks=1)
+    run_busy_threads(sampler, count=2)
+    assert sampler.statistics()["stacks"] == 2
+    assert f"{TRUNCATED_STACK} " in sampler.collapsed()
+
+
+def test_start_and_stop() -> None:
+    sampler = StackSampler(rate=200)
+    sampler.start()
+    sampler.start()
+    assert sampler.is_running
+    time.sleep(0.1)
+    sampler.stop()
+    sampler.stop()
+    statistics = sampler.statistics()
+    assert statistics["running"] is False
+    assert statistics["samples"] > 0
+    assert 0 <= statistics["overhead"] < 1
+
+
+def test_sample_benchmark(benchmark: BenchmarkFixture) -> None:
+    """The CPU time of a sample; the overhead at 19 Hz is 19 times that per second."""
+    sampler = StackSampler()
+    benchmark(sampler.sample)
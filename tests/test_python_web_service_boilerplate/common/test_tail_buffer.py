@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Generator
+from http import HTTPStatus
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from loguru import logger
+from pytest_mock import MockerFixture
+from starlette.testclient import TestClient
+
+from python_web_service_boilerplate.common import middleware
+from python_web_service_boilerplate.common.log_level import LogLevelController
+from python_web_service_boilerplate.common.middleware import TraceIDMiddleware
+from python_web_service_boilerplate.common.tail_buffer import TAIL_BUFFERED, TailBuffer
+from python_web_service_boilerplate.configuration import loguru as loguru_configuration
+from python_web_service_boilerplate.configuration.application import settings
+
+tail_app = FastAPI()
+tail_app.add_middleware(TraceIDMiddleware)
+
+
+@tail_app.get("/ok")
+async def ok() -> dict[str, str]:
+    logger.debug("tail test: ok")
+    return {"status": "ok"}
+
+
+@tail_app.get("/error")
+async def error() -> JSONResponse:
+    logger.debug("tail test: error")
+    return JSONResponse(status_code=HTTPStatus.INTERNAL_SERVER_ERROR.value, content={"status": "error"})
+
+
+@tail_app.get("/slow")
+async def slow() -> dict[str, str]:
+    logger.debug("tail test: slow")
+    await asyncio.sleep(0.2)
+    return {"status": "slow"}
+
+
+@pytest.fixture
+def tail_buffer(mocker: MockerFixture) -> Generator[TailBuffer, None, None]:
+    tail_buffer = TailBuffer(max_records_per_trace=100, max_bytes=1024 * 1024)
+    mocker.patch.object(loguru_configuration, "tail_buffer", tail_buffer)
+    mocker.patch.object(middleware, "tail_buffer", tail_buffer)
+    mocker.patch.object(settings, "log_tail_latency_threshold", 0.1)
+    # DEBUG records are buffered only below the log level, whatever `LOG_LEVEL` is
+    mocker.patch.object(loguru_configuration, "log_levels", LogLevelController("INFO"))
+    handler_id = logger.add(
+        tail_buffer.capture,
+        level="DEBUG",
+        format=lambda _record: "{message}",
+        filter=loguru_configuration.tail_buffer_filter,
+    )
+    yield tail_buffer
+    logger.remove(handler_id)
+
+
+@pytest.fixture
+def written(tail_buffer: TailBuffer) -> Generator[list[str], None, None]:
+    messages: list[str] = []
+    # Like the application's sinks, records below INFO are only written by the tail buffer
+    handler_id = logger.add(
+        lambda message: messages.append(message.record["message"]),
+        level="DEBUG",
+        filter=lambda record: record["message"].startswith("tail test")
+        and (TAIL_BUFFERED in record["extra"] or record["level"].no >= logger.level("INFO").no),
+    )
+    yield messages
+    logger.remove(handler_id)
+
+
+def test_records_of_good_requests_are_discarded(tail_buffer: TailBuffer, written: list[str]) -> None:
+    with TestClient(tail_app) as client:
+        assert client.get("/ok").status_code == HTTPStatus.OK.value
+    assert written == []
+    assert tail_buffer.statistics()["discarded_traces"] == 1
+    assert tail_buffer.statistics()["buffered_bytes"] == 0
+
+
+def test_records_of_failed_and_slow_requests_are_flushed(tail_buffer: TailBuffer, written: list[str]) -> None:
+    with TestClient(tail_app) as client:
+        response = client.get("/error")
+        assert client.get("/slow").status_code == HTTPStatus.OK.value
+    assert written == ["tail test: error", "tail test: slow"]
+    assert tail_buffer.statistics()["flushed_traces"] == 2
+    assert tail_buffer.statistics()["buffered_traces"] == 0
+    assert response.headers[TraceIDMiddleware.TRACE_ID_HEADER]
+
+
+def test_buffer_limits() -> None:
+    tail_buffer = TailBuffer(max_records_per_trace=3, max_bytes=2560)
+    flushed: list[str] = []
+    handler_ids = [
+        logger.add(tail_buffer.capture, level="TRACE", filter=lambda record: "tail_test" in record["extra"]),
+        logger.add(
+            lambda message: flushed.append(message.record["message"]),
+            level="TRACE",
+            filter=lambda record: "tail_test" in record["extra"] and TAIL_BUFFERED in record["extra"],
+        ),
+    ]
+    try:
+        tail_buffer.start("a")
+        tail_buffer.start("b")
+        for i in range(5):
+            logger.bind(tail_test=True, trace_id="a").trace("a {}", i)
+        # All traces hold at most 2.5KB, 4 records of about 0.5KB
+        for i in range(5):
+            logger.bind(tail_test=True, trace_id="b").trace("b {}", i)
+        # Records of unknown traces are ignored
+        logger.bind(tail_test=True, trace_id="c").trace("c")
+        statistics = tail_buffer.statistics()
+        assert statistics["buffered_traces"] == 2
+        assert statistics["buffered_bytes"] <= statistics["max_bytes"]
+        assert statistics["dropped_records"] == 2 + 4
+        tail_buffer.flush("a")
+        tail_buffer.flush("b")
+    finally:
+        for handler_id in handler_ids:
+            logger.remove(handler_id)
+    # The oldest records of a trace are dropped
+    assert flushed == ["a 2", "a 3", "a 4", "b 0"]
+    assert tail_buffer.statistics()["buffered_bytes"] == 0
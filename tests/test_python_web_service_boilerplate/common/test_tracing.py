@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from collections.abc import Generator
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+
+import orjson
+import pytest
+from fastapi import FastAPI
+from pytest_benchmark.fixture import BenchmarkFixture
+from sqlalchemy import create_engine
+from starlette.testclient import TestClient
+
+from python_web_service_boilerplate.common.asynchronization import async_function
+from python_web_service_boilerplate.common.middleware import DeadlineMiddleware, TraceIDMiddleware
+from python_web_service_boilerplate.common.span_export import (
+    BatchSpanProcessor,
+    OtlpHttpExporter,
+    OtlpJsonFileExporter,
+)
+from python_web_service_boilerplate.common.trace import get_trace_id
+from python_web_service_boilerplate.common.tracing import (
+    Span,
+    SpanContext,
+    SpanKind,
+    parse_traceparent,
+    set_span_processor,
+    should_sample,
+    start_server_span,
+    start_span,
+    to_trace_id,
+)
+from python_web_service_boilerplate.configuration import tracing
+from python_web_service_boilerplate.configuration.application import settings
+
+TRACE_ID = "0af7651916cd43dd8448eb211c80319c"
+PARENT_SPAN_ID = "b7ad6b7169203331"
+
+
+class CollectingProcessor:
+    def __init__(self) -> None:
+        """Collect the ended spans in memory."""
+        self.spans: list[Span] = []
+
+    def on_end(self, span: Span) -> None:
+        self.spans.append(span)
+
+
+@pytest.fixture
+def processor() -> Generator[CollectingProcessor, None, None]:
+    collecting = CollectingProcessor()
+    set_span_processor(collecting)
+    yield collecting
+    set_span_processor(tracing.span_processor)
+
+
+@async_function
+def blocking_work() -> str:
+    return "done"
+
+
+tracing_app = FastAPI()
+tracing_app.add_middleware(DeadlineMiddleware)
+tracing_app.add_middleware(TraceIDMiddleware)
+
+
+@tracing_app.get("/work")
+async def work() -> dict[str, str]:
+    return {"result": await asyncio.wrap_future(blocking_work())}
+
+
+@tracing_app.get("/trace_id")
+async def current_trace_id() -> dict[str, str | None]:
+    return {"trace_id": get_trace_id()}
+
+
+def test_parse_traceparent() -> None:
+    parent = parse_traceparent(f"00-{TRACE_ID}-{PARENT_SPAN_ID}-01", "vendor=value")
+    assert parent is not None
+    assert parent.trace_id == TRACE_ID
+    assert parent.span_id == PARENT_SPAN_ID
+    assert parent.sampled is True
+    assert parent.trace_state == "vendor=value"
+    assert parent.traceparent() == f"00-{TRACE_ID}-{PARENT_SPAN_ID}-01"
+    unsampled = parse_traceparent(f"00-{TRACE_ID}-{PARENT_SPAN_ID}-00")
+    assert unsampled is not None
+    assert unsampled.sampled is False
+    for invalid in (None, "", "garbage", f"ff-{TRACE_ID}-{PARENT_SPAN_ID}-01", f"00-{'0' * 32}-{PARENT_SPAN_ID}-01"):
+        assert parse_traceparent(invalid) is None
+
+
+def test_should_sample_is_deterministic() -> None:
+    assert should_sample(TRACE_ID, 1.0) is True
+    assert should_sample(TRACE_ID, 0.0) is False
+    decisions = {should_sample(TRACE_ID, 0.5) for _ in range(10)}
+    assert len(decisions) == 1
+
+
+def test_unsampled_request_creates_no_spans(processor: CollectingProcessor) -> None:
+    with start_server_span("GET /", TRACE_ID, None, 0.0) as server_span, start_span("child") as child:
+        assert child is None
+    assert server_span.context.sampled is False
+    assert processor.spans == []
+
+
+def test_traceparent_propagation(processor: CollectingProcessor) -> None:
+    with TestClient(tracing_app) as client:
+        response = client.get(
+            "/work", headers={"traceparent": f"00-{TRACE_ID}-{PARENT_SPAN_ID}-01", "tracestate": "vendor=value"}
+        )
+    assert response.status_code == HTTPStatus.OK.value
+    assert response.headers["X-Trace-ID"] == TRACE_ID
+    assert response.headers["tracestate"] == "vendor=value"
+    server_context = parse_traceparent(response.headers["traceparent"])
+    assert server_context is not None
+    assert server_context.trace_id == TRACE_ID
+    assert server_context.sampled is True
+    server_span = next(span for span in processor.spans if span.kind == SpanKind.SERVER)
+    handler_span = next(span for span in processor.spans if span.attributes.get("http.route") == "GET /work")
+    thread_pool_span = next(span for span in processor.spans if span.name == "thread_pool blocking_work")
+    assert len(processor.spans) == 3
+    assert server_span.context.span_id == server_context.span_id
+    assert server_span.parent_span_id == PARENT_SPAN_ID
+    assert server_span.attributes["http.status_code"] == HTTPStatus.OK.value
+    assert handler_span.parent_span_id == server_span.context.span_id
+    assert thread_pool_span.parent_span_id == handler_span.context.span_id
+    assert {span.context.trace_id for span in processor.spans} == {TRACE_ID}
+
+
+def test_x_trace_id_is_shared_by_logs_and_spans(
+    processor: CollectingProcessor, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings.tracing, "sample_rate", 1.0)
+    with TestClient(tracing_app) as client:
+        response = client.get("/trace_id", headers={"X-Trace-ID": "request-42"})
+        trace_id = response.json()["trace_id"]
+        assert client.get("/trace_id", headers={"X-Trace-ID": "request-42"}).json()["trace_id"] == trace_id
+    assert trace_id == to_trace_id("request-42")
+    assert response.headers["X-Trace-ID"] == trace_id
+    assert processor.spans[0].context.trace_id == trace_id
+    # A UUID keeps its hex digits
+    assert to_trace_id("0AF76519-16CD-43DD-8448-EB211C80319C") == TRACE_ID
+
+
+def test_unsampled_traceparent_is_followed(processor: CollectingProcessor) -> None:
+    with TestClient(tracing_app) as client:
+        response = client.get("/work", headers={"traceparent": f"00-{TRACE_ID}-{PARENT_SPAN_ID}-00"})
+    assert response.headers["traceparent"].endswith("-00")
+    assert processor.spans == []
+
+
+def test_statement_spans(processor: CollectingProcessor) -> None:
+    engine = create_engine("sqlite://")
+    with start_server_span("job", TRACE_ID, None, 1.0) as server_span, engine.connect() as connection:
+        connection.exec_driver_sql("SELECT 1")
+    engine.dispose()
+    statement_span = next(span for span in processor.spans if span.name == "db.query")
+    assert statement_span.kind == SpanKind.CLIENT
+    assert statement_span.parent_span_id == server_span.context.span_id
+    assert statement_span.attributes == {"db.system": "sqlite", "db.statement": "SELECT 1"}
+    assert statement_span.end_time_ns >= statement_span.start_time_ns
+
+
+def test_file_exporter(tmp_path: Path) -> None:
+    path = tmp_path / "spans.jsonl"
+    batch_processor = BatchSpanProcessor(OtlpJsonFileExporter(path, "pytest"), batch_size=2, schedule_delay=0.1)
+    set_span_processor(batch_processor)
+    try:
+        with start_server_span("job", TRACE_ID, None, 1.0), start_span("step", attributes={"step.number": 1}):
+            pass
+    finally:
+        set_span_processor(tracing.span_processor)
+        batch_processor.shutdown()
+    assert batch_processor.statistics() == {"queued": 0, "exported": 2, "dropped": 0, "failed": 0}
+    spans = [
+        span
+        for line in path.read_bytes().splitlines()
+        for span in orjson.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    ]
+    assert {span["name"] for span in spans} == {"job", "step"}
+    step = next(span for span in spans if span["name"] == "step")
+    assert step["traceId"] == TRACE_ID
+    assert step["attributes"] == [{"key": "step.number", "value": {"intValue": "1"}}]
+
+
+def test_file_exporter_rotation(tmp_path: Path) -> None:
+    path = tmp_path / "spans.jsonl"
+    # Every batch exceeds the size, thus rotates the file
+    exporter = OtlpJsonFileExporter(path, "pytest", max_bytes=1, backups=2)
+    for span_id in ("1", "2", "3", "4"):
+        exporter.export([Span(span_id, SpanContext(TRACE_ID, span_id.zfill(16), sampled=True), None)])
+
+    def exported(file: Path) -> list[str]:
+        return [
+            span["name"]
+            for line in file.read_bytes().splitlines()
+            for span in orjson.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        ]
+
+    assert exported(path) == ["4"]
+    assert exported(tmp_path / "spans.jsonl.1") == ["3"]
+    assert exported(tmp_path / "spans.jsonl.2") == ["2"]
+    assert sorted(file.name for file in tmp_path.iterdir()) == ["spans.jsonl", "spans.jsonl.1", "spans.jsonl.2"]
+
+
+def test_http_exporter() -> None:
+    received: list[bytes] = []
+
+    class CollectorStandIn(BaseHTTPRequestHandler):
+        def do_POST(self) -> None:
+            received.append(self.rfile.read(int(self.headers["Content-Length"])))
+            self.send_response(HTTPStatus.OK.value)
+            self.end_headers()
+
+        def log_message(self, *_args: object) -> None:
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), CollectorStandIn)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        exporter = OtlpHttpExporter(f"http://127.0.0.1:{server.server_port}/v1/traces", "pytest")
+        with start_server_span("job", TRACE_ID, None, 1.0) as span:
+            pass
+        exporter.export([span])
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert len(received) == 1
+    assert orjson.loads(received[0])["resourceSpans"][0]["scopeSpans"][0]["spans"][0]["name"] == "job"
+
+
+def test_unsampled_start_span_benchmark(benchmark: BenchmarkFixture) -> None:
+    def start_unsampled_span() -> None:
+        with start_span("child"):
+            pass
+
+    with start_server_span("GET /", TRACE_ID, None, 0.0):
+        benchmark(start_unsampled_span)
@@ -0,0 +1,437 @@
+import asyncio
+import errno
+import sqlite3
+import time
+from collections.abc import Generator
+from contextlib import AsyncExitStack, contextmanager, suppress
+from dataclasses import dataclass
+from http import HTTPStatus
+from pathlib import Path
+from typing import Any
+
+import pytest
+from faker import Faker
+from loguru import logger
+from pytest_benchmark.fixture import BenchmarkFixture
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.util import await_only
+from sqlmodel import select
+from starlette.testclient import TestClient
+
+from python_web_service_boilerplate.common.circuit_breaker import CircuitBreakerState
+from python_web_service_boilerplate.common.deadline import deadline_scope
+from python_web_service_boilerplate.common.loop_monitor import BlockingCallError
+from python_web_service_boilerplate.configuration.application import settings
+from python_web_service_boilerplate.configuration.database import (
+    ASYNC_DATABASE_URL,
+    INCLUDE_DELETED,
+    DatabasePool,
+    _check_schema_version,
+    async_db_context,
+    async_engine,
+    db_circuit_breaker,
+    db_context,
+    get_pool_statistics,
+    get_schema_heads,
+    get_sync_engine,
+    is_transient_error,
+    request_session_scope,
+    validate_idle_connections,
+)
+from python_web_service_boilerplate.core.auth.models import User
+from python_web_service_boilerplate.core.auth.repository import get_user_by_username
+from python_web_service_boilerplate.core.common_models import Deleted
+from python_web_service_boilerplate.core.common_repository import bulk_insert, bulk_soft_delete
+
+
+def test_get_sync_engine_is_cached() -> None:
+    assert get_sync_engine() is get_sync_engine()
+
+
+def test_get_sync_engine_uses_small_pool() -> None:
+    pool = get_sync_engine().pool
+    assert pool.size() == settings.database.sync_pool_size  # type: ignore[attr-defined]
+
+
+def test_db_context() -> None:
+    with db_context() as session:
+        result = session.execute(text("SELECT 1;"))
+        assert result.scalar_one() == 1
+
+
+def test_get_schema_heads() -> None:
+    heads = get_schema_heads()
+    logger.info(f"Schema heads: {heads}")
+    assert len(heads) == 1
+
+
+@pytest.mark.asyncio
+async def test_check_schema_version(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'schema_version.db'}")
+    try:
+        async with engine.connect() as connection:
+            # Not migrated at all
+            with pytest.raises(RuntimeError, match="Schema version mismatch"):
+                await _check_schema_version(connection)
+            monkeypatch.setattr(settings.database, "schema_version_strict", False)
+            await _check_schema_version(connection)
+            monkeypatch.setattr(settings.database, "schema_version_strict", True)
+            await connection.execute(text("CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL)"))
+            await connection.execute(text("INSERT INTO alembic_version VALUES ('3057e681742b')"))
+            with pytest.raises(RuntimeError, match="3057e681742b"):
+                await _check_schema_version(connection)
+            await connection.execute(
+                text("UPDATE alembic_version SET version_num = :head"), {"head": next(iter(get_schema_heads()))}
+            )
+            await _check_schema_version(connection)
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_async_db_context_shares_request_session() -> None:
+    async with request_session_scope() as request_session:
+        async with async_db_context() as session1, async_db_context() as session2:
+            assert session1 is session2
+            assert request_session.session is session1
+        async with async_db_context(dedicated=True) as dedicated_session:
+            assert dedicated_session is not session1
+        await request_session.release(commit=True)
+        # Released request session is not reused
+        async with async_db_context() as session3:
+            assert session3 is not session1
+    assert request_session.session is None
+
+
+@pytest.mark.asyncio
+async def test_soft_deleted_rows_are_filtered() -> None:
+    username = f"soft_deleted_{Faker().uuid4()[:8]}"
+    row = {"username": username, "password": "password", "email": f"{username}@test.com", "full_name": username}
+    await bulk_insert(User, [{**row, "scopes": "user:read"}])
+    assert len((await get_user_by_username(username)).all()) == 1
+    async with async_db_context() as session:
+        user = (await session.exec(select(User).where(User.username == username))).one()
+    await bulk_soft_delete(User, [user.id])
+    assert (await get_user_by_username(username)).all() == []
+    async with async_db_context() as session:
+        statement = select(User).where(User.username == username).execution_options(**{INCLUDE_DELETED: True})
+        deleted_user = (await session.exec(statement)).one()
+        assert deleted_user.deleted == Deleted.Y
+
+
+@pytest.mark.asyncio
+async def test_stream_pool_exhaustion_does_not_block_other_pools() -> None:
+    capacity = settings.database.stream_pool_size + settings.database.stream_max_overflow
+    async with AsyncExitStack() as stack:
+        # Stream viewers hold all connections of the stream pool
+        for _ in range(capacity):
+            session = await stack.enter_async_context(async_db_context(pool=DatabasePool.STREAM))
+            await session.connection()
+        assert get_pool_statistics()[DatabasePool.STREAM.value]["checked_out"] == capacity
+        # Another stream waits for a connection
+        with pytest.raises(TimeoutError):
+            async with asyncio.timeout(0.5), async_db_context(pool=DatabasePool.STREAM) as session:
+                await session.connection()
+        # Logins and background jobs are not affected
+        async with asyncio.timeout(0.5):
+            (await get_user_by_username("pytest_user")).all()
+            async with async_db_context(pool=DatabasePool.BACKGROUND) as session:
+                assert (await session.exec(text("SELECT 1"))).scalar_one() == 1  # type: ignore[call-overload]
+    assert get_pool_statistics()[DatabasePool.STREAM.value]["checked_out"] == 0
+
+
+def test_register_user_checks_out_one_connection(test_client: TestClient) -> None:
+    checkouts: list[Any] = []
+
+    def on_checkout(*args: Any) -> None:
+        checkouts.append(args)
+
+    faker = Faker()
+    event.listen(async_engine.sync_engine, "checkout", on_checkout)
+    try:
+        response = test_client.post(
+            url="/api/v1/users",
+            json={
+                "username": faker.user_name() + faker.uuid4()[:8],
+                "password": faker.password(),
+                "email": faker.email(),
+                "full_name": faker.name(),
+            },
+        )
+    finally:
+        event.remove(async_engine.sync_engine, "checkout", on_checkout)
+    logger.info(f"Pool checkouts per user registration: {len(checkouts)}")
+    assert response.status_code == HTTPStatus.OK.value
+    # Before the request-scoped session: one checkout per repository call (2)
+    assert len(checkouts) == 1
+
+
+@dataclass
+class FaultInjector:
+    """Fail the next `remaining` statements of the async engine with a connection-level error."""
+
+    remaining: int
+    injected: int = 0
+
+    def __call__(self, *args: Any) -> None:
+        if self.remaining > 0:
+            self.remaining -= 1
+            self.injected += 1
+            raise OperationalError("SELECT", {}, ConnectionResetError("injected fault"))
+
+
+@contextmanager
+def inject_faults(remaining: int) -> Generator[FaultInjector, None, None]:
+    injector = FaultInjector(remaining)
+    event.listen(async_engine.sync_engine, "before_cursor_execute", injector)
+    try:
+        yield injector
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", injector)
+        db_circuit_breaker.reset()
+
+
+@pytest.mark.asyncio
+async def test_idempotent_read_retries_transient_errors() -> None:
+    with inject_faults(settings.database.retry_attempts - 1) as injector:
+        result = await get_user_by_username("pytest_user")
+        result.all()
+    assert injector.injected == settings.database.retry_attempts - 1
+
+
+@pytest.mark.asyncio
+async def test_idempotent_read_gives_up_after_retry_attempts() -> None:
+    with inject_faults(settings.database.retry_attempts) as injector, pytest.raises(OperationalError):
+        await get_user_by_username("pytest_user")
+    assert injector.injected == settings.database.retry_attempts
+
+
+def test_circuit_breaker_fails_fast_and_reports_health(test_client: TestClient) -> None:
+    threshold = settings.database.circuit_breaker_failure_threshold
+    with inject_faults(threshold * settings.database.retry_attempts) as injector:
+        # Every retry attempt counts as a failure
+        while db_circuit_breaker.state is CircuitBreakerState.CLOSED and injector.injected < threshold:
+            # TestClient re-raises server errors instead of returning 500
+            with suppress(OperationalError):
+                test_client.post("/api/v1/token", auth=("pytest_user", "pytest"))
+        assert db_circuit_breaker.state is CircuitBreakerState.OPEN
+        injected = injector.injected
+        assert injected == threshold
+        # Fail fast, the database is not hit anymore
+        response = test_client.post("/api/v1/token", auth=("pytest_user", "pytest"))
+        assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE.value
+        assert "Retry-After" in response.headers
+        assert injector.injected == injected
+        health = test_client.get("/health").json()
+        logger.info(f"Health: {health}")
+        assert health["status"] == "DOWN"
+        assert health["database"]["circuit_breaker"]["state"] == CircuitBreakerState.OPEN.value
+    assert test_client.get("/health").json()["status"] == "UP"
+
+
+# Counting to 100 million takes several seconds on SQLite
+_SLOW_QUERY = text(
+    "WITH RECURSIVE counter(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM counter WHERE x < 100000000) "
+    "SELECT count(*) FROM counter"
+)
+
+
+@pytest.mark.asyncio
+async def test_deadline_interrupts_statement() -> None:
+    failures_total = db_circuit_breaker.snapshot()["failures_total"]
+    start = time.monotonic()
+    with deadline_scope(0.2), pytest.raises(OperationalError, match="interrupted"):
+        async with async_db_context() as session:
+            await session.exec(_SLOW_QUERY)  # type: ignore[call-overload]
+    elapsed = time.monotonic() - start
+    logger.info(f"Statement interrupted after {elapsed:.3f}s")
+    assert elapsed < 1
+    # Exceeding the deadline is not a database failure
+    assert db_circuit_breaker.snapshot()["failures_total"] == failures_total
+    # The next transaction of the connection without deadline is not interrupted
+    async with async_db_context() as session:
+        assert (await session.exec(text("SELECT 1"))).scalar_one() == 1  # type: ignore[call-overload]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_call_keeps_breaker_half_open(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(db_circuit_breaker, "recovery_timeout", 0)
+    try:
+        for _ in range(db_circuit_breaker.failure_threshold):
+            db_circuit_breaker.record_failure()
+        assert db_circuit_breaker.state is CircuitBreakerState.HALF_OPEN
+        entered = asyncio.Event()
+
+        async def hang() -> None:
+            async with async_db_context():
+                entered.set()
+                await asyncio.sleep(10)
+
+        task = asyncio.create_task(hang())
+        await entered.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # Neither closed by a success nor reopened by a failure, and the probe slot is free again
+        assert db_circuit_breaker.state is CircuitBreakerState.HALF_OPEN
+        async with async_db_context() as session:
+            assert (await session.exec(text("SELECT 1"))).scalar_one() == 1  # type: ignore[call-overload]
+        assert db_circuit_breaker.state is CircuitBreakerState.CLOSED
+    finally:
+        db_circuit_breaker.reset()
+
+
+def test_connection_errors_past_deadline_are_transient() -> None:
+    with deadline_scope(0):
+        assert is_transient_error(OperationalError("SELECT", {}, ConnectionResetError("injected fault")))
+        assert not is_transient_error(OperationalError("SELECT", {}, Exception("interrupted")))
+
+
+class _DriverError(Exception):
+    def __init__(self, sqlstate: str) -> None:
+        """Create a driver error with its SQLSTATE, like asyncpg and psycopg do."""
+        super().__init__(sqlstate)
+        self.sqlstate = sqlstate
+
+
+def test_only_connection_errors_are_transient() -> None:
+    for transient in (
+        OperationalError("SELECT", {}, _DriverError("08006")),
+        OperationalError("SELECT", {}, _DriverError("57P01")),
+        OperationalError("SELECT", {}, OSError(errno.EHOSTUNREACH, "No route to host")),
+        ConnectionRefusedError(),
+        TimeoutError(),
+    ):
+        assert is_transient_error(transient), transient
+    for not_transient in (
+        OperationalError("SELECT", {}, sqlite3.OperationalError("no such table: user")),
+        OperationalError("SELECT", {}, sqlite3.OperationalError("database is locked")),
+        OperationalError("SELECT", {}, _DriverError("57014")),
+        OperationalError("SELECT", {}, _DriverError("23505")),
+        FileNotFoundError(),
+    ):
+        assert not is_transient_error(not_transient), not_transient
+
+
+@pytest.mark.asyncio
+async def test_cancelled_connect_counts_as_failure() -> None:
+    def hang(*_args: Any) -> None:
+        await_only(asyncio.sleep(10))
+
+    # A new connection is opened, by the driver hanging like an unreachable database
+    await async_engine.dispose()
+    event.listen(async_engine.sync_engine, "do_connect", hang)
+    failures_total = db_circuit_breaker.snapshot()["failures_total"]
+    try:
+        with pytest.raises(TimeoutError):
+            async with asyncio.timeout(0.05), async_db_context(dedicated=True):
+                pass
+        assert db_circuit_breaker.snapshot()["failures_total"] == failures_total + 1
+    finally:
+        event.remove(async_engine.sync_engine, "do_connect", hang)
+        db_circuit_breaker.reset()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_wait_for_exhausted_pool_is_no_failure() -> None:
+    failures_total = db_circuit_breaker.snapshot()["failures_total"]
+    pool = DatabasePool.BACKGROUND
+    async with AsyncExitStack() as stack:
+        connections = settings.database.background_pool_size + settings.database.background_max_overflow
+        for _ in range(connections):
+            await stack.enter_async_context(async_db_context(pool=pool))
+        # Waiting for a connection of the pool, not for the database
+        with pytest.raises(TimeoutError):
+            async with asyncio.timeout(0.05), async_db_context(pool=pool):
+                pass
+    assert db_circuit_breaker.snapshot()["failures_total"] == failures_total
+    assert db_circuit_breaker.state is CircuitBreakerState.CLOSED
+
+
+async def _kill_idle_connection(engine: AsyncEngine) -> None:
+    """Close the driver connection while it's idle in the pool, like a database failover would."""
+    async with engine.connect() as connection:
+        raw_connection = await connection.get_raw_connection()
+        driver_connection = raw_connection.driver_connection
+    await driver_connection.close()  # type: ignore[union-attr]
+
+
+@pytest.mark.asyncio
+async def test_validate_idle_connections(tmp_path: Path) -> None:
+    # LIFO like the configured pools, so the dead connection is the next one checked out
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'validation.db'}", pool_pre_ping=False, pool_use_lifo=True
+    )
+    validate_idle_connections(engine, max_idle=0)
+    try:
+        async with engine.connect() as connection1, engine.connect() as connection2:
+            await connection1.exec_driver_sql("SELECT 1")
+            await connection2.exec_driver_sql("SELECT 1")
+        await _kill_idle_connection(engine)
+        # The dead connection is replaced at checkout, while the other one stays idle in the pool
+        async with engine.connect() as connection:
+            assert engine.pool.checkedin() == 1  # type: ignore[attr-defined]
+            assert (await connection.exec_driver_sql("SELECT 1")).scalar_one() == 1
+        assert engine.pool.checkedin() == 2  # type: ignore[attr-defined]
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_idempotent_read_retries_dead_connection() -> None:
+    await _kill_idle_connection(async_engine)
+    failures_total = db_circuit_breaker.snapshot()["failures_total"]
+    try:
+        # The pool is LIFO, the dead connection is checked out first
+        assert len((await get_user_by_username("pytest_user")).all()) == 1
+        assert db_circuit_breaker.snapshot()["failures_total"] == failures_total + 1
+    finally:
+        db_circuit_breaker.reset()
+
+
+def _login_latency_benchmark(benchmark: BenchmarkFixture, *, pool_pre_ping: bool) -> None:
+    """Benchmark the query behind a login, on the configured database."""
+    engine = create_async_engine(ASYNC_DATABASE_URL, pool_pre_ping=pool_pre_ping)
+    if not pool_pre_ping:
+        validate_idle_connections(engine, settings.database.pool_validation_interval)
+    statement = select(User).where(User.username == "pytest_user")
+
+    async def login_query() -> None:
+        async with engine.connect() as connection:
+            (await connection.execute(statement)).all()
+
+    loop = asyncio.new_event_loop()
+    try:
+        benchmark.pedantic(lambda: loop.run_until_complete(login_query()), rounds=500, warmup_rounds=10)
+        loop.run_until_complete(engine.dispose())
+    finally:
+        loop.close()
+    # No statistics with `--benchmark-disable`
+    if not benchmark.enabled:
+        return
+    sorted_data = benchmark.stats.stats.sorted_data
+    benchmark.extra_info["p50_ms"] = sorted_data[len(sorted_data) // 2] * 1000
+    benchmark.extra_info["p99_ms"] = sorted_data[int(len(sorted_data) * 0.99)] * 1000
+    logger.info(
+        f"Login query latency, pool_pre_ping={pool_pre_ping}: p50 {benchmark.extra_info['p50_ms']:.3f}ms, "
+        f"p99 {benchmark.extra_info['p99_ms']:.3f}ms"
+    )
+
+
+def test_login_latency_with_pre_ping_benchmark(benchmark: BenchmarkFixture) -> None:
+    _login_latency_benchmark(benchmark, pool_pre_ping=True)
+
+
+def test_login_latency_with_idle_validation_benchmark(benchmark: BenchmarkFixture) -> None:
+    _login_latency_benchmark(benchmark, pool_pre_ping=False)
+
+
+@pytest.mark.asyncio
+async def test_db_context_on_event_loop_raises_in_strict_mode(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings.loop_monitor, "strict", True)
+    with pytest.raises(BlockingCallError), db_context():
+        pass
+    # Off the event loop, it is fine
+    await asyncio.to_thread(test_db_context)
@@ -1,10 +1,14 @@
+import logging
 from pathlib import Path
 
+import arrow
 import pytest
 from loguru import logger
+from pytest_benchmark.fixture import BenchmarkFixture
 from pytest_mock import MockerFixture
 
 from python_web_service_boilerplate.configuration.loguru import (
+    InterceptHandler,
     configure,
     retain_log_files,
 )
@@ -30,3 +34,65 @@ def test_retain_log_files(mocker: MockerFixture) -> None:
     patch = mocker.patch("pathlib.Path.glob", return_value=(element for element in path_list))
     retain_log_files()
     patch.assert_called()
+
+
+def test_retain_log_files_with_indexes(mocker: MockerFixture, tmp_path: Path) -> None:
+    old_files = [
+        tmp_path / "python_web_service_boilerplate.vm.2023-05-01_08-42-03_086829.log.gz",
+        tmp_path / "python_web_service_boilerplate.vm.2023-05-01_08-42-03_086829.log.gz.idx",
+    ]
+    recent_file = tmp_path / f"python_web_service_boilerplate.vm.{arrow.now('local'):YYYY-MM-DD_HH-mm-ss_SSSSSS}.log"
+    for path in [*old_files, recent_file]:
+        path.touch()
+    mocker.patch("python_web_service_boilerplate.configuration.loguru._logs_directory_path", tmp_path)
+    retain_log_files()
+    assert not any(path.exists() for path in old_files)
+    assert recent_file.exists()
+
+
+_BRIDGE_RECORDS = 10_000
+
+
+def _benchmark_bridge(benchmark: BenchmarkFixture, level: int, logger_level: int) -> list[str]:
+    stdlib_logger = logging.getLogger("bridge_benchmark")
+    stdlib_logger.setLevel(logger_level)
+    # Like the intercepted loggers, but the level of the handler does not follow the sinks
+    stdlib_logger.handlers = [InterceptHandler()]
+    stdlib_logger.propagate = False
+    callers: list[str] = []
+    # Only the records of the benchmark reach the sink
+    handler_id = logger.add(
+        lambda message: callers.append(f"{message.record['name']}.{message.record['function']}"),
+        level="TRACE",
+        filter=lambda record: record["message"].startswith("bridge_benchmark ->"),
+    )
+
+    def log_records() -> None:
+        for i in range(_BRIDGE_RECORDS):
+            stdlib_logger.log(level, "SELECT %s", i)
+
+    try:
+        benchmark.pedantic(log_records, rounds=5, iterations=1)
+    finally:
+        logger.remove(handler_id)
+        stdlib_logger.setLevel(logging.NOTSET)
+    # No statistics with `--benchmark-disable`
+    if benchmark.enabled:
+        benchmark.extra_info["records_per_second"] = _BRIDGE_RECORDS / benchmark.stats.stats.mean
+        logger.info(f"{benchmark.name}: {benchmark.extra_info['records_per_second']:.0f} records/sec")
+    return callers
+
+
+def test_intercept_handler_benchmark(benchmark: BenchmarkFixture) -> None:
+    # Below INFO, written by the sink of the benchmark only
+    callers = _benchmark_bridge(benchmark, logging.DEBUG, logging.DEBUG)
+    # A single run with `--benchmark-disable`
+    assert len(callers) == _BRIDGE_RECORDS * (5 if benchmark.enabled else 1)
+    # The location of the caller, not of the logging module
+    assert callers[0] == f"{__name__}.log_records"
+
+
+def test_intercept_handler_filtered_benchmark(benchmark: BenchmarkFixture) -> None:
+    # Below the level of all sinks, dropped by standard logging before the record is created
+    callers = _benchmark_bridge(benchmark, logging.DEBUG, logging.INFO)
+    assert callers == []
@@ -0,0 +1,184 @@
+import contextvars
+import os
+import time
+import uuid
+from http import HTTPStatus
+
+import pytest
+from fastapi_cloud_cli.commands.login import TokenResponse
+from loguru import logger
+from starlette.testclient import TestClient
+
+from python_web_service_boilerplate.__main__ import app
+from python_web_service_boilerplate.common import request_profiler
+from python_web_service_boilerplate.configuration.application import settings
+from python_web_service_boilerplate.configuration.loguru import log_levels
+from python_web_service_boilerplate.configuration.resources import sample_resources
+
+_AUTH_MODULE = "python_web_service_boilerplate.core.auth"
+
+
+def test_update_log_level(test_client: TestClient, pytest_user_token: TokenResponse) -> None:
+    headers = {"Authorization": f"Bearer {pytest_user_token.access_token}"}
+    response = test_client.put(
+        "/api/v1/admin/log_levels", json={"module": _AUTH_MODULE, "level": "TRACE"}, headers=headers
+    )
+    logger.info(f"Log levels response: {response}, {response.text}")
+    assert response.status_code == HTTPStatus.OK.value
+    assert response.json()["levels"][_AUTH_MODULE] == "TRACE"
+    assert log_levels.floor == "TRACE"
+    assert log_levels.is_enabled(f"{_AUTH_MODULE}.decorators", logger.level("DEBUG").no)
+    # The other modules follow the global level, INFO unless overridden by `LOG_LEVEL`
+    debug_enabled = logger.level(log_levels.levels()[""]).no <= logger.level("DEBUG").no
+    assert log_levels.is_enabled("python_web_service_boilerplate.core.startup_log", logger.level("DEBUG").no) == (
+        debug_enabled
+    )
+
+    response = test_client.put("/api/v1/admin/log_levels", json={"module": _AUTH_MODULE}, headers=headers)
+    assert response.status_code == HTTPStatus.OK.value
+    assert _AUTH_MODULE not in response.json()["levels"]
+    assert log_levels.floor == log_levels.levels()[""]
+    # The global level cannot be reset
+    response = test_client.put("/api/v1/admin/log_levels", json={}, headers=headers)
+    assert response.status_code == HTTPStatus.BAD_REQUEST.value
+
+
+def test_update_log_sampling(test_client: TestClient, pytest_user_token: TokenResponse) -> None:
+    headers = {"Authorization": f"Bearer {pytest_user_token.access_token}"}
+    response = test_client.put(
+        "/api/v1/admin/log_sampling", json={"module": _AUTH_MODULE, "per_second": 10}, headers=headers
+    )
+    assert response.status_code == HTTPStatus.OK.value
+    assert response.json()["samplings"][_AUTH_MODULE] == {"every": None, "per_second": 10}
+
+    response = test_client.put("/api/v1/admin/log_sampling", json={"module": _AUTH_MODULE}, headers=headers)
+    assert response.json()["samplings"] == {}
+    response = test_client.put("/api/v1/admin/log_sampling", json={"module": _AUTH_MODULE, "every": 0}, headers=headers)
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY.value
+
+
+def test_log_levels_require_admin(test_client: TestClient) -> None:
+    response = test_client.get("/api/v1/admin/log_levels")
+    assert response.status_code == HTTPStatus.UNAUTHORIZED.value
+
+
+def test_get_trace_logs(test_client: TestClient, pytest_user_token: TokenResponse) -> None:
+    headers = {"Authorization": f"Bearer {pytest_user_token.access_token}"}
+    trace_id = uuid.uuid4().hex
+    test_client.get("/health", headers={"X-Trace-ID": trace_id})
+    # The file sink writes in a background thread
+    logger.complete()
+    response = test_client.get(f"/api/v1/admin/logs/{trace_id}", headers=headers)
+    assert response.status_code == HTTPStatus.OK.value
+    records = response.json()["records"]
+    assert any("Request started: GET /health" in record for record in records)
+    assert all(f"Trace={trace_id}" in record for record in records)
+
+
+def test_function_stats(test_client: TestClient, pytest_user_token: TokenResponse) -> None:
+    headers = {"Authorization": f"Bearer {pytest_user_token.access_token}"}
+    # `verify_token()` is decorated with `@elapsed_time()`
+    test_client.get("/hello", headers=headers)
+    response = test_client.get("/api/v1/admin/function_stats", params={"sort": "count"}, headers=headers)
+    assert response.status_code == HTTPStatus.OK.value
+    assert response.json()["enabled"] is True
+    functions = {stats["function"]: stats for stats in response.json()["functions"]}
+    verify_token = functions["python_web_service_boilerplate.core.auth.service.verify_token"]
+    assert verify_token["count"] >= 1
+    assert verify_token["max"] >= verify_token["p50"] > 0
+
+    response = test_client.put("/api/v1/admin/function_stats", json={"enabled": False}, headers=headers)
+    assert response.json()["enabled"] is False
+    response = test_client.delete("/api/v1/admin/function_stats", headers=headers)
+    assert response.json()["functions"] == []
+    test_client.get("/hello", headers=headers)
+    assert test_client.get("/api/v1/admin/function_stats", headers=headers).json()["functions"] == []
+    test_client.put("/api/v1/admin/function_stats", json={"enabled": True}, headers=headers)
+
+
+def test_profile_request(test_client: TestClient, pytest_user_token: TokenResponse) -> None:
+    headers = {"Authorization": f"Bearer {pytest_user_token.access_token}"}
+    trace_id = uuid.uuid4().hex
+    # Outside the context of the `auto_profile` fixture, pyinstrument allows one profiler per context
+    response = contextvars.Context().run(
+        TestClient(app).get, "/hello", headers={**headers, "X-Profile": "1", "X-Trace-ID": trace_id}
+    )
+    assert response.status_code == HTTPStatus.OK.value
+    name = response.headers["X-Profile"]
+    assert trace_id in name
+
+    response = test_client.get("/api/v1/admin/profiles", headers=headers)
+    assert response.json()["available"] is True
+    assert name in [profile["name"] for profile in response.json()["profiles"]]
+    response = test_client.get(f"/api/v1/admin/profiles/{name}", headers=headers)
+    assert response.status_code == HTTPStatus.OK.value
+    assert response.headers["content-type"].startswith("text/html")
+    assert "pyinstrument" in response.text
+    response = test_client.get("/api/v1/admin/profiles/..%2F.env", headers=headers)
+    assert response.status_code == HTTPStatus.NOT_FOUND.value
+
+
+def test_profile_request_survives_save_error(
+    test_client: TestClient, pytest_user_token: TokenResponse, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def fail(*_args: object) -> None:
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(request_profiler, "save_profile", fail)
+    headers = {"Authorization": f"Bearer {pytest_user_token.access_token}", "X-Profile": "1"}
+    response = contextvars.Context().run(TestClient(app).get, "/hello", headers=headers)
+    assert response.status_code == HTTPStatus.OK.value
+    assert "X-Profile" in response.headers
+
+
+def test_profile_request_requires_admin(test_client: TestClient) -> None:
+    # Without a token, the header is ignored
+    response = test_client.get("/health", headers={"X-Profile": "1"})
+    assert response.status_code == HTTPStatus.OK.value
+    assert "X-Profile" not in response.headers
+
+
+def test_stack_sampler(test_client: TestClient, pytest_user_token: TokenResponse) -> None:
+    headers = {"Authorization": f"Bearer {pytest_user_token.access_token}"}
+    response = test_client.put("/api/v1/admin/stack_sampler", json={"running": True}, headers=headers)
+    assert response.json()["running"] is True
+    time.sleep(0.2)
+    response = test_client.put("/api/v1/admin/stack_sampler", json={"running": False}, headers=headers)
+    assert response.json()["running"] is False
+    assert response.json()["samples"] > 0
+    response = test_client.get("/api/v1/admin/stack_sampler", headers=headers)
+    assert response.status_code == HTTPStatus.OK.value
+    response = test_client.get("/api/v1/admin/stack_samples", params={"windows": 1}, headers=headers)
+    assert response.headers["content-type"].startswith("text/plain")
+    stack, count = response.text.splitlines()[0].rsplit(" ", 1)
+    assert ";" in stack
+    assert int(count) > 0
+    assert test_client.get("/api/v1/admin/stack_samples").status_code == HTTPStatus.UNAUTHORIZED.value
+
+
+def test_resources(test_client: TestClient, pytest_user_token: TokenResponse, monkeypatch: pytest.MonkeyPatch) -> None:
+    headers = {"Authorization": f"Bearer {pytest_user_token.access_token}"}
+    monkeypatch.setattr(settings.resources, "persist_every", 1)
+    sample_resources()
+    response = test_client.get("/api/v1/admin/resources", headers=headers)
+    assert response.status_code == HTTPStatus.OK.value
+    series = response.json()["series"]
+    assert series["rss"][-1] > 0
+    assert len(series["timestamp"]) == len(series["thread_pool_queue"])
+    response = test_client.get("/api/v1/admin/resources", params={"persisted": True}, headers=headers)
+    series = response.json()["series"]
+    assert series["pid"][-1] == os.getpid()
+    assert series["rss"][-1] > 0
+
+
+def test_leak_detector(test_client: TestClient, pytest_user_token: TokenResponse) -> None:
+    headers = {"Authorization": f"Bearer {pytest_user_token.access_token}"}
+    response = test_client.put("/api/v1/admin/leak_detector", json={"running": True, "interval": 3600}, headers=headers)
+    assert response.json()["interval"] == 3600
+    response = test_client.post("/api/v1/admin/leak_detector/census", headers=headers)
+    assert response.json()["censuses"] >= 1
+    response = test_client.get("/api/v1/admin/leak_detector", headers=headers)
+    assert response.status_code == HTTPStatus.OK.value
+    assert response.json()["intervals"] == settings.leak_detector.intervals
+    response = test_client.put("/api/v1/admin/leak_detector", json={"running": False}, headers=headers)
+    assert response.json()["interval"] is None
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from loguru import logger
+from pytest_benchmark.fixture import BenchmarkFixture
+from sqlalchemy import Column, Engine, Index, Integer, MetaData, String, Table, create_engine, insert, select, text
+
+from python_web_service_boilerplate.core.common_models import LIVE_ROWS, Deleted
+
+_ROWS = 50_000
+# Most rows are soft-deleted, one of 20 is live
+_LIVE_EVERY = 20
+
+
+def _create_table(db_file: Path, *, partial: bool) -> tuple[Engine, Table, int]:
+    """Create a user-like table where most rows are deleted, return the number of pages of the email index."""
+    engine = create_engine(f"sqlite:///{db_file}")
+    table = Table(
+        "user",
+        MetaData(),
+        Column("id", Integer, primary_key=True),
+        Column("email", String(256)),
+        Column("deleted", String(1)),
+    )
+    rows = [
+        {"email": f"user_{i}@test.com", "deleted": Deleted.N.name if i % _LIVE_EVERY == 0 else Deleted.Y.name}
+        for i in range(_ROWS)
+    ]
+    with engine.begin() as connection:
+        table.create(connection)
+        connection.execute(insert(table), rows)
+        pages_before = connection.execute(text("PRAGMA page_count")).scalar_one()
+        index = (
+            Index("ix_user_email_live", table.c.email, sqlite_where=LIVE_ROWS)
+            if partial
+            else Index("ix_user_email", table.c.email)
+        )
+        index.create(connection)
+        pages = connection.execute(text("PRAGMA page_count")).scalar_one() - pages_before
+    return engine, table, pages
+
+
+def _benchmark_lookup(benchmark: BenchmarkFixture, db_file: Path, *, partial: bool) -> None:
+    engine, table, pages = _create_table(db_file, partial=partial)
+    statement = select(table.c.id).where(table.c.email == "user_40000@test.com", table.c.deleted == Deleted.N.name)
+    with engine.connect() as connection:
+        sql = statement.compile(engine, compile_kwargs={"literal_binds": True})
+        plan = connection.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+        # The partial index is only usable if the query repeats its WHERE clause
+        assert "ix_user_email" in str(plan)
+        result = benchmark(lambda: connection.execute(statement).scalar_one())
+    assert result == 40001
+    benchmark.extra_info["index_pages"] = pages
+    logger.info(f"{'Partial' if partial else 'Full'} email index: {pages} pages")
+    engine.dispose()
+
+
+def test_full_index_lookup_benchmark(benchmark: BenchmarkFixture, tmp_path: Path) -> None:
+    _benchmark_lookup(benchmark, tmp_path / "full_index.db", partial=False)
+
+
+def test_partial_index_lookup_benchmark(benchmark: BenchmarkFixture, tmp_path: Path) -> None:
+    _benchmark_lookup(benchmark, tmp_path / "partial_index.db", partial=True)
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncGenerator
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, cast
+
+import pytest
+from loguru import logger
+from pytest_benchmark.fixture import BenchmarkFixture
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from python_web_service_boilerplate.configuration.database import INCLUDE_DELETED
+from python_web_service_boilerplate.core.auth.models import User
+from python_web_service_boilerplate.core.common_models import Deleted
+from python_web_service_boilerplate.core.common_repository import bulk_insert, bulk_soft_delete, bulk_upsert
+
+_ROWS = 500
+
+
+def _user_rows(count: int, prefix: str = "bulk") -> list[dict[str, str]]:
+    return [
+        {
+            "username": f"{prefix}_{i}",
+            "password": "password",
+            "email": f"{prefix}_{i}@test.com",
+            "full_name": f"{prefix} {i}",
+            "scopes": "user:read",
+        }
+        for i in range(count)
+    ]
+
+
+async def _session_factory(db_file: Path) -> async_sessionmaker[AsyncSession]:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_file}", poolclass=NullPool)
+    async with engine.begin() as connection:
+        await connection.run_sync(SQLModel.metadata.drop_all)
+        await connection.run_sync(SQLModel.metadata.create_all)
+    return async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+
+async def _count_users(session: AsyncSession, deleted: Deleted | None = None) -> int:
+    statement = select(func.count()).select_from(User).execution_options(**{INCLUDE_DELETED: True})
+    if deleted:
+        statement = statement.where(User.deleted == deleted)
+    return (await session.exec(statement)).one()
+
+
+@pytest.mark.asyncio
+async def test_bulk_insert(tmp_path: Path) -> None:
+    session_local = await _session_factory(tmp_path / "bulk.db")
+    async with session_local() as session:
+        inserted = await bulk_insert(User, _user_rows(25), chunk_size=10, session=session)
+        await session.commit()
+        assert inserted == 25
+        assert await _count_users(session, Deleted.N) == 25
+        user = (await session.exec(select(User).where(User.username == "bulk_0"))).one()
+        # The local time, like the rows inserted one by one, not the UTC server-side default
+        assert abs(user.created_at - datetime.now()) < timedelta(minutes=1)
+        assert user.updated_at == user.created_at
+        assert user.created_by
+
+
+@pytest.mark.asyncio
+async def test_bulk_insert_from_async_iterable(tmp_path: Path) -> None:
+    async def rows() -> AsyncGenerator[User, None]:
+        for row in _user_rows(7, "async"):
+            yield User.model_validate(row)
+
+    session_local = await _session_factory(tmp_path / "bulk.db")
+    async with session_local() as session:
+        assert await bulk_insert(User, rows(), chunk_size=3, session=session) == 7
+        await session.commit()
+        assert await _count_users(session) == 7
+
+
+@pytest.mark.asyncio
+async def test_bulk_upsert(tmp_path: Path) -> None:
+    session_local = await _session_factory(tmp_path / "bulk.db")
+    async with session_local() as session:
+        await bulk_insert(User, _user_rows(5), session=session)
+        changed = [{**row, "full_name": "changed"} for row in _user_rows(8)]
+        assert await bulk_upsert(User, changed, conflict_columns=["username"], session=session) == 8
+        await session.commit()
+        assert await _count_users(session) == 8
+        full_names = (await session.exec(select(User.full_name).distinct())).all()
+        assert full_names == ["changed"]
+
+
+@pytest.mark.asyncio
+async def test_bulk_soft_delete(tmp_path: Path) -> None:
+    session_local = await _session_factory(tmp_path / "bulk.db")
+    async with session_local() as session:
+        await bulk_insert(User, _user_rows(10), session=session)
+        ids = (await session.exec(select(User.id).limit(4))).all()
+        assert await bulk_soft_delete(User, ids, chunk_size=3, session=session) == 4
+        # Already deleted rows are not counted twice
+        assert await bulk_soft_delete(User, ids, session=session) == 0
+        await session.commit()
+        assert await _count_users(session, Deleted.Y) == 4
+        # Usernames are unique among live users only, see the partial unique index
+        assert await bulk_insert(User, _user_rows(4), session=session) == 4
+        await session.commit()
+        assert await _count_users(session, Deleted.N) == 10
+
+
+class _FakeAsyncpgConnection:
+    """The COPY API of an asyncpg connection, recording the copied records."""
+
+    def __init__(self) -> None:
+        self.in_transaction = False
+        self.copies: list[tuple[str, list[str], list[tuple[Any, ...]]]] = []
+
+    def is_in_transaction(self) -> bool:
+        return self.in_transaction
+
+    async def copy_records_to_table(
+        self, table_name: str, *, records: list[tuple[Any, ...]], columns: list[str], schema_name: str | None
+    ) -> None:
+        assert self.in_transaction, "COPY must join the transaction of the session"
+        self.copies.append((table_name, columns, records))
+
+
+@dataclass
+class _FakeConnection:
+    driver_connection: _FakeAsyncpgConnection
+    dialect: Any = field(default_factory=postgresql.dialect)
+
+    async def get_raw_connection(self) -> _FakeConnection:
+        return self
+
+    async def exec_driver_sql(self, _statement: str) -> None:
+        self.driver_connection.in_transaction = True
+
+
+@dataclass
+class _FakeSession:
+    connection_: _FakeConnection
+
+    async def connection(self) -> _FakeConnection:
+        return self.connection_
+
+
+@pytest.mark.asyncio
+async def test_bulk_insert_with_copy() -> None:
+    driver_connection = _FakeAsyncpgConnection()
+    session = cast("AsyncSession", _FakeSession(_FakeConnection(driver_connection)))
+    assert await bulk_insert(User, _user_rows(5), chunk_size=2, session=session) == 5
+    assert [len(records) for _table, _columns, records in driver_connection.copies] == [2, 2, 1]
+    table_name, columns, records = driver_connection.copies[0]
+    assert table_name == User.__tablename__
+    assert records[0][columns.index("username")] == "bulk_0"
+    assert records[0][columns.index("created_by")]
+
+
+async def _insert_per_row(db_file: Path) -> None:
+    session_local = await _session_factory(db_file)
+    for row in _user_rows(_ROWS):
+        async with session_local() as session:
+            session.add(User.model_validate(row))
+            await session.commit()
+
+
+async def _insert_in_bulk(db_file: Path) -> None:
+    session_local = await _session_factory(db_file)
+    async with session_local() as session:
+        await bulk_insert(User, _user_rows(_ROWS), session=session)
+        await session.commit()
+
+
+def test_insert_per_row_benchmark(benchmark: BenchmarkFixture, tmp_path: Path) -> None:
+    benchmark.pedantic(lambda: asyncio.run(_insert_per_row(tmp_path / "per_row.db")), rounds=1, iterations=1)
+    # No statistics with `--benchmark-disable`
+    if benchmark.enabled:
+        benchmark.extra_info["rows_per_second"] = _ROWS / benchmark.stats.stats.mean
+        logger.info(f"Per-row insert: {benchmark.extra_info['rows_per_second']:.0f} rows/sec")
+
+
+def test_bulk_insert_benchmark(benchmark: BenchmarkFixture, tmp_path: Path) -> None:
+    benchmark.pedantic(lambda: asyncio.run(_insert_in_bulk(tmp_path / "bulk.db")), rounds=3, iterations=1)
+    # No statistics with `--benchmark-disable`
+    if benchmark.enabled:
+        benchmark.extra_info["rows_per_second"] = _ROWS / benchmark.stats.stats.mean
+        logger.info(f"Bulk insert: {benchmark.extra_info['rows_per_second']:.0f} rows/sec")
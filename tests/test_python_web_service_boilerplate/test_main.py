@@ -55,3 +55,16 @@ def test_hello_with_invalid_token_with_expired_date(test_client: TestClient, pyt
     logger.info(f"Hello response: {response}, {response.json()}")
     assert response.status_code == HTTPStatus.UNAUTHORIZED.value
     assert "Invalid token: expired" in response.text
+
+
+def test_metrics(test_client: TestClient) -> None:
+    test_client.get("/hello")
+    response = test_client.get("/metrics")
+    assert response.status_code == HTTPStatus.OK.value
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'http_requests_total{route="GET /hello",status="4xx"}' in response.text
+    assert 'http_request_duration_seconds_bucket{route="GET /hello",le="+Inf"}' in response.text
+    assert 'http_requests_in_flight{route="GET /metrics"} 1' in response.text
+    assert "db_circuit_breaker_open 0" in response.text
+    assert "# TYPE event_loop_lag_seconds histogram" in response.text
+    assert 'event_loop_lag_seconds_bucket{le="+Inf"}' in response.text
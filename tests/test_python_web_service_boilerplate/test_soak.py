@@ -0,0 +1,87 @@
+"""
+Soak test: drive the app for `SOAK_DURATION` seconds, fail if the retained memory grows beyond `SOAK_MAX_GROWTH_MB`.
+
+The retained memory is the memory traced by tracemalloc, started by the first census of the leak detector; the growth
+of the resident memory (RSS), which the allocator doesn't necessarily give back, is only reported.
+
+Usage:
+>>> SOAK_DURATION=600 pytest -m soak tests/test_python_web_service_boilerplate/test_soak.py
+"""
+
+from __future__ import annotations
+
+import gc
+import os
+import time
+import tracemalloc
+from http import HTTPStatus
+
+import psutil
+import pytest
+from loguru import logger
+from starlette.testclient import TestClient
+
+from python_web_service_boilerplate.common.leak_detector import LeakDetector
+from python_web_service_boilerplate.core.auth.schemas import UserRegistration
+
+SOAK_DURATION = float(os.getenv("SOAK_DURATION", "0"))
+SOAK_MAX_GROWTH = float(os.getenv("SOAK_MAX_GROWTH_MB", "32")) * 1024 * 1024
+# The censuses of the leak detector over the run, reported if the memory grew too much
+_CENSUS_INTERVALS = 5
+# The share of the run warming up (caches, pools, lazy imports) before the baseline is measured
+_WARM_UP_RATIO = 0.1
+
+
+def _retained_memory() -> tuple[int, int]:
+    """Get the traced bytes, and the resident memory of the process."""
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0], psutil.Process().memory_info().rss
+
+
+def _drive(test_client: TestClient, user: UserRegistration) -> None:
+    """Log in, say hello and stream the startup logs, as a client would."""
+    response = test_client.post("/api/v1/token", auth=(user.username, user.password))
+    assert response.status_code == HTTPStatus.OK.value
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    assert test_client.get("/hello", headers=headers).status_code == HTTPStatus.OK.value
+    with test_client.stream("GET", "/api/v1/startup_logs/stream", headers=headers) as response:
+        assert response.status_code == HTTPStatus.OK.value
+        for _ in response.iter_lines():
+            pass
+
+
+@pytest.mark.soak
+@pytest.mark.skipif(SOAK_DURATION <= 0, reason="Set SOAK_DURATION (seconds) to run the soak test")
+def test_soak(test_client: TestClient, pytest_user: UserRegistration) -> None:
+    warm_up_until = time.monotonic() + SOAK_DURATION * _WARM_UP_RATIO
+    while time.monotonic() < warm_up_until:
+        _drive(test_client, pytest_user)
+
+    detector = LeakDetector(intervals=_CENSUS_INTERVALS)
+    census_interval = SOAK_DURATION * (1 - _WARM_UP_RATIO) / _CENSUS_INTERVALS
+    iterations = 0
+    try:
+        # The first census starts tracing the allocations, the baseline follows it, as does the first census with
+        # allocations
+        detector.census()
+        baseline, baseline_rss = _retained_memory()
+        detector.census()
+        for _ in range(_CENSUS_INTERVALS):
+            until = time.monotonic() + census_interval
+            while time.monotonic() < until:
+                _drive(test_client, pytest_user)
+                iterations += 1
+            detector.census()
+        report = detector.report()
+        traced, rss = _retained_memory()
+    finally:
+        detector.stop_tracing()
+    growth = traced - baseline
+    logger.info(
+        f"Soak test: {iterations} iterations, retained memory growth: {growth / 1024 / 1024:.1f} MB, "
+        f"RSS growth: {(rss - baseline_rss) / 1024 / 1024:.1f} MB"
+    )
+    assert growth <= SOAK_MAX_GROWTH, (
+        f"Retained memory grew by {growth / 1024 / 1024:.1f} MB over {iterations} iterations, "
+        f"growing types: {report['types']}, growing allocations: {report['allocations']}"
+    )